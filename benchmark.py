@@ -0,0 +1,731 @@
+# benchmark.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Any, Callable, List
+from config import Config
+from deep_analyzer import DeepFigmaAnalyzer
+from layout_inference import infer_layout, LAYOUT_TOLERANCE
+from token_clustering import cluster_colors, snap_values
+from synthetic_figma import SyntheticFigmaGenerator
+from node_table import json_default
+from pruning import PruningPolicy
+from frame_splitter import FrameSplitter
+from frame_store import FRAME_STORES, LooseFrameStore
+from serializer import JsonSerializer, BACKENDS
+from style_table import pack_styles
+
+class LegacyRecursiveAnalyzer(DeepFigmaAnalyzer):
+    """
+    Прежняя рекурсивная реализация обхода - эталон для сравнения в бенчмарке
+    (один кадр Python на ноду и обрезка поддеревьев глубже 20 уровней)
+    """
+    
+    def _analyze_element_completely(self, node: Dict[str, Any], element_id: str, depth: int) -> Dict[str, Any]:
+        if depth > 20:
+            return {"error": "max_depth_exceeded"}
+        
+        self.element_counter += 1
+        element_number = self.element_counter
+        
+        bounding_box = node.get("absoluteBoundingBox", {})
+        styles = self._extract_complete_styles(node)
+        
+        element_data = {
+            "id": f"{element_id}-{element_number}",
+            "original_id": node.get("id", ""),
+            "name": node.get("name", ""),
+            "type": node.get("type", ""),
+            "depth": depth,
+            "size": {
+                "width": bounding_box.get("width", 0),
+                "height": bounding_box.get("height", 0)
+            },
+            "position": {
+                "x": bounding_box.get("x", 0),
+                "y": bounding_box.get("y", 0)
+            },
+            "layout": {
+                "mode": node.get("layoutMode", "NONE"),
+                "spacing": node.get("itemSpacing", 0),
+                "padding": {
+                    "left": node.get("paddingLeft", 0),
+                    "right": node.get("paddingRight", 0),
+                    "top": node.get("paddingTop", 0),
+                    "bottom": node.get("paddingBottom", 0)
+                },
+                "constraints": node.get("constraints", {})
+            },
+            "styles": styles,
+            "content": self._extract_complete_content(node),
+            "effects": self._extract_effects(node),
+            "visibility": node.get("visible", True),
+            "locked": node.get("locked", False),
+            "children": []
+        }
+        
+        if depth <= 3:
+            indent = "  " * depth
+            print(f"{indent}📦 {element_data['name']} ({element_data['type']}) - {element_data['size']['width']}×{element_data['size']['height']}")
+        
+        for child in node.get("children", []):
+            child_analysis = self._analyze_element_completely(child, f"{element_id}-{element_number}", depth + 1)
+            element_data["children"].append(child_analysis)
+        
+        return element_data
+
+class LegacyMultiPassAnalyzer(DeepFigmaAnalyzer):
+    """
+    Прежний многопроходный вариант статистики - эталон для сравнения в бенчмарке:
+    копия каждого элемента в плоский список all_elements и отдельный проход по нему
+    """
+    
+    def _collect_statistics(self):
+        elements = []
+        stack = [self.analysis_result["target_node"]]
+        while stack:
+            current = stack.pop()
+            element_flat = current.copy()
+            element_flat.pop("children", None)
+            elements.append(element_flat)
+            stack.extend(reversed(current.get("children", [])))
+        self.analysis_result["all_elements"] = elements
+        
+        type_counts = {}
+        for element in elements:
+            elem_type = element.get("type", "unknown")
+            type_counts[elem_type] = type_counts.get(elem_type, 0) + 1
+        
+        self.analysis_result["statistics"] = {
+            "total_elements": len(elements),
+            "type_counts": type_counts,
+            "total_colors": len(self.analysis_result["design_tokens"]["colors"]),
+            "total_typography_styles": len(self.analysis_result["design_tokens"]["typography"]),
+            "max_depth": max([elem.get("depth", 0) for elem in elements]) if elements else 0
+        }
+
+def measure(func: Callable[[], Any], repeats: int) -> float:
+    """
+    Лучшее время из repeats запусков (секунды), вывод функции подавляется
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+    return best
+
+def measure_memory(func: Callable[[], Any]) -> tuple:
+    """
+    Пиковая и удерживаемая результатом память (МБ) по tracemalloc
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    del result
+    return peak / 1024 / 1024, retained / 1024 / 1024
+
+def synthetic_target(nodes: int, depth: int, fan_out: int, seed: int) -> Dict[str, Any]:
+    """
+    Целевой фрейм синтетического документа (то, что анализатор получает от /nodes)
+    """
+    generator = SyntheticFigmaGenerator(node_count=nodes, max_depth=depth, fan_out=fan_out, seed=seed)
+    document = generator.generate("1:1")
+    return document["document"]["children"][0]["children"][0]
+
+def deep_chain(length: int) -> Dict[str, Any]:
+    """
+    Цепочка вложенных фреймов заданной длины (проверка отсутствия лимита глубины)
+    """
+    root = {"id": "0:1", "name": "Frame 0", "type": "FRAME", "children": []}
+    node = root
+    for i in range(1, length):
+        child = {"id": f"0:{i + 1}", "name": f"Frame {i}", "type": "FRAME", "children": []}
+        node["children"].append(child)
+        node = child
+    return root
+
+def count_elements(element: Dict[str, Any]) -> int:
+    count = 0
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        if "error" not in current:
+            count += 1
+        stack.extend(current.get("children", []))
+    return count
+
+def bench_traversal(args):
+    """
+    Итеративный обход против прежнего рекурсивного на больших деревьях
+    """
+    def traverse(analyzer_class, node):
+        def run():
+            analyzer = analyzer_class()
+            analyzer.pruning = PruningPolicy()  # Прежний обход ничего не отсекал - сравниваем на том же дереве
+            return analyzer._analyze_element_completely(node, "root", 0)
+        return run
+    
+    rows: List[tuple] = []
+    for depth in args.depths:
+        node = synthetic_target(args.nodes, depth, args.fan_out, args.seed)
+        legacy = measure(traverse(LegacyRecursiveAnalyzer, node), args.repeats)
+        iterative = measure(traverse(DeepFigmaAnalyzer, node), args.repeats)
+        rows.append((f"{args.nodes} нод, глубина {depth}", legacy, iterative))
+    
+    print(f"{'Дерево':<28} {'рекурсия, с':>12} {'стек, с':>10} {'ускорение':>10}")
+    for name, legacy, iterative in rows:
+        print(f"{name:<28} {legacy:>12.3f} {iterative:>10.3f} {legacy / iterative:>9.2f}x")
+    
+    # Глубокая цепочка: рекурсия обрезает ее на 20 уровнях, стек проходит целиком
+    chain = deep_chain(args.chain)
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy_count = count_elements(LegacyRecursiveAnalyzer()._analyze_element_completely(chain, "root", 0))
+        iterative_count = count_elements(DeepFigmaAnalyzer()._analyze_element_completely(chain, "root", 0))
+    print(f"\nЦепочка из {args.chain} вложенных фреймов (лимит рекурсии Python: {sys.getrecursionlimit()}):")
+    print(f"   рекурсия: {legacy_count} элементов, стек: {iterative_count} элементов")
+
+def bench_analysis(args):
+    """
+    Однопроходный анализ (дерево + статистика + токены) против прежнего многопроходного
+    """
+    node = synthetic_target(args.nodes, args.depth, args.fan_out, args.seed)
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": node}}}}
+    
+    def analyze(analyzer_class):
+        def run():
+            return analyzer_class().analyze_completely(figma_data)
+        return run
+    
+    legacy = measure(analyze(LegacyMultiPassAnalyzer), args.repeats)
+    fused = measure(analyze(DeepFigmaAnalyzer), args.repeats)
+    legacy_peak, legacy_retained = measure_memory(analyze(LegacyMultiPassAnalyzer))
+    fused_peak, fused_retained = measure_memory(analyze(DeepFigmaAnalyzer))
+    
+    print(f"Анализ {args.nodes} нод (глубина {args.depth}):")
+    print(f"{'':<16} {'время, с':>10} {'пик, МБ':>10} {'результат, МБ':>14}")
+    print(f"{'многопроходный':<16} {legacy:>10.3f} {legacy_peak:>10.1f} {legacy_retained:>14.1f}")
+    print(f"{'однопроходный':<16} {fused:>10.3f} {fused_peak:>10.1f} {fused_retained:>14.1f}")
+
+def bench_table(args):
+    """
+    Компактная колоночная NodeTable против вложенных словарей
+    """
+    node = synthetic_target(args.nodes, args.depth, args.fan_out, args.seed)
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": node}}}}
+    
+    def analyze(compact):
+        def run():
+            return DeepFigmaAnalyzer(compact=compact).analyze_completely(figma_data)
+        return run
+    
+    dict_time = measure(analyze(False), args.repeats)
+    table_time = measure(analyze(True), args.repeats)
+    _, dict_retained = measure_memory(analyze(False))
+    _, table_retained = measure_memory(analyze(True))
+    
+    print(f"Анализ {args.nodes} нод (глубина {args.depth}):")
+    print(f"{'':<12} {'время, с':>10} {'результат, МБ':>14}")
+    print(f"{'словари':<12} {dict_time:>10.3f} {dict_retained:>14.1f}")
+    print(f"{'NodeTable':<12} {table_time:>10.3f} {table_retained:>14.1f}")
+    print(f"Экономия памяти: {dict_retained / table_retained:.1f}x")
+
+def bench_parallel(args):
+    """
+    Параллельный анализ родительских фреймов против последовательного
+    """
+    pages = [synthetic_target(args.nodes // args.pages, args.depth, args.fan_out, args.seed + i)
+             for i in range(args.pages)]
+    root = {"id": "0:1", "name": "Pages", "type": "FRAME", "children": pages}
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": root}}}}
+    
+    def analyze(workers):
+        def run():
+            return DeepFigmaAnalyzer(workers=workers).analyze_completely(figma_data)
+        return run
+    
+    print(f"Анализ {args.nodes} нод в {args.pages} родительских фреймах (ядер: {os.cpu_count()}):")
+    serial = measure(analyze(1), args.repeats)
+    print(f"   1 процесс: {serial:.3f} с")
+    for workers in args.workers:
+        parallel = measure(analyze(workers), args.repeats)
+        print(f"   {workers} процессов: {parallel:.3f} с ({serial / parallel:.2f}x)")
+
+def flat_frame(children: int, arrangement: str, seed: int) -> Dict[str, Any]:
+    """
+    Фрейм без auto-layout с children детьми: сетка ("grid") или случайная россыпь ("scatter")
+    """
+    rng = random.Random(seed)
+    columns = max(1, int(children ** 0.5))
+    nodes = []
+    for i in range(children):
+        if arrangement == "grid":
+            x, y = (i % columns) * 60, (i // columns) * 60
+        else:
+            x, y = rng.uniform(0, columns * 60), rng.uniform(0, columns * 60)
+        nodes.append({"id": f"2:{i + 1}", "name": f"Item {i}", "type": "RECTANGLE",
+                      "absoluteBoundingBox": {"x": x, "y": y, "width": 48, "height": 48}})
+    return {"id": "2:0", "name": "Flat", "type": "FRAME", "layoutMode": "NONE",
+            "absoluteBoundingBox": {"x": 0, "y": 0, "width": columns * 60, "height": columns * 60},
+            "children": nodes}
+
+def pairwise_overlaps(frame: Dict[str, Any]) -> int:
+    """
+    Наивный поиск пересечений - сравнение всех пар детей (эталон для пространственной сетки)
+    """
+    boxes = [child["absoluteBoundingBox"] for child in frame["children"]]
+    count = 0
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            if (a["x"] < b["x"] + b["width"] - LAYOUT_TOLERANCE and b["x"] < a["x"] + a["width"] - LAYOUT_TOLERANCE
+                    and a["y"] < b["y"] + b["height"] - LAYOUT_TOLERANCE and b["y"] < a["y"] + a["height"] - LAYOUT_TOLERANCE):
+                count += 1
+    return count
+
+def bench_layout(args):
+    """
+    Восстановление раскладки фреймов без auto-layout: сетка против попарного сравнения
+    """
+    print(f"{'Фрейм':<26} {'раскладка':>10} {'пересечений':>12} {'индекс, с':>10} {'все пары, с':>12}")
+    for children in args.children:
+        for arrangement in ("grid", "scatter"):
+            frame = flat_frame(children, arrangement, args.seed)
+            inferred = infer_layout(frame, frame["children"])
+            indexed = measure(lambda: infer_layout(frame, frame["children"]), args.repeats)
+            pairwise = measure(lambda: pairwise_overlaps(frame), 1) if children <= args.pairwise_limit else float("nan")
+            print(f"{f'{children} детей, {arrangement}':<26} {inferred['type']:>10} {inferred['overlaps']:>12} "
+                  f"{indexed:>10.3f} {pairwise:>12.3f}")
+    
+    # Во что обходится восстановление раскладки при полном анализе
+    node = synthetic_target(args.nodes, 8, 6, args.seed)
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": node}}}}
+    
+    def analyze(inference):
+        def run():
+            analyzer = DeepFigmaAnalyzer()
+            analyzer.layout_inference = inference
+            return analyzer.analyze_completely(figma_data)
+        return run
+    
+    without = measure(analyze(False), args.repeats)
+    with_inference = measure(analyze(True), args.repeats)
+    print(f"\nАнализ {args.nodes} нод: без восстановления {without:.3f} с, с восстановлением {with_inference:.3f} с")
+
+def noisy_tokens(count: int, palette_size: int, seed: int) -> tuple:
+    """
+    Сырые токены "как из макета": цвета палитры с небольшим шумом (и полупрозрачные варианты)
+    и отступы с дробными хвостами вроде 15.999
+    """
+    rng = random.Random(seed)
+    palette = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(palette_size)]
+    colors = set()
+    while len(colors) < count:
+        r, g, b = (min(255, max(0, channel + rng.randint(-6, 6))) for channel in rng.choice(palette))
+        alpha = rng.choice((1, 1, 1, 0.5))
+        colors.add(f"#{r:02x}{g:02x}{b:02x}" if alpha == 1 else f"rgba({r}, {g}, {b}, {alpha})")
+    spacing = {rng.choice((4, 8, 12, 16, 24, 32, 48, 64)) + rng.uniform(-0.5, 0.5) for _ in range(count)}
+    return colors, spacing
+
+def bench_tokens(args):
+    """
+    Кластеризация цветов и привязка отступов к сетке на больших наборах сырых значений
+    """
+    print(f"{'Сырых значений':<16} {'цветов':>8} {'токенов':>8} {'цвета, с':>10} {'отступов':>9} {'токенов':>8} {'отступы, с':>11}")
+    for count in args.values:
+        colors, spacing = noisy_tokens(count, args.palette, args.seed)
+        colors_time = measure(lambda: cluster_colors(colors, Config.COLOR_MERGE_DISTANCE), args.repeats)
+        spacing_time = measure(lambda: snap_values(spacing, Config.SPACING_BASE), args.repeats)
+        color_tokens, _ = cluster_colors(colors, Config.COLOR_MERGE_DISTANCE)
+        spacing_tokens, _ = snap_values(spacing, Config.SPACING_BASE)
+        print(f"{count:<16} {len(colors):>8} {len(color_tokens):>8} {colors_time:>10.3f} "
+              f"{len(spacing):>9} {len(spacing_tokens):>8} {spacing_time:>11.3f}")
+
+def component_document(nodes: int, instance_ratio: float, component_size: int, seed: int) -> Dict[str, Any]:
+    """
+    Синтетический файл "на дизайн-системе": большая доля экземпляров компонентов,
+    у части экземпляров переопределен текст
+    """
+    generator = SyntheticFigmaGenerator(node_count=nodes, max_depth=8, fan_out=6, instance_ratio=instance_ratio,
+                                        component_size=component_size, seed=seed)
+    document = generator.generate(Config.FIGMA_NODE_ID)
+    rng = random.Random(seed)
+    stack = [document["document"]]
+    while stack:
+        node = stack.pop()
+        if node.get("type") == "INSTANCE" and rng.random() < 0.5:
+            for child in node["children"]:
+                if child["type"] == "TEXT":
+                    child["characters"] = f"Текст {rng.randrange(1000)}"
+                    break
+        stack.extend(node.get("children", []))
+    return document
+
+def bench_components(args):
+    """
+    Анализ с разрешением компонентов (мастер один раз, экземпляры - ссылки) против анализа
+    каждого экземпляра целиком: время, число элементов и объем JSON результата
+    """
+    document = component_document(args.nodes, args.instance_ratio, args.component_size, args.seed)
+    target = document["document"]["children"][0]["children"][0]
+    figma_data = {"full_file": document,
+                  "specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": target,
+                                                                      "components": document["components"]}}}}
+    
+    def analyze(resolve):
+        def run():
+            analyzer = DeepFigmaAnalyzer()
+            analyzer.resolve_components = resolve
+            return analyzer.analyze_completely(figma_data)
+        return run
+    
+    print(f"Анализ {args.nodes} нод, доля экземпляров {args.instance_ratio}, нод в компоненте {args.component_size}:")
+    print(f"{'':<18} {'время, с':>10} {'элементов':>10} {'JSON, МБ':>10}")
+    for label, resolve in (("каждый экземпляр", False), ("компоненты", True)):
+        elapsed = measure(analyze(resolve), args.repeats)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = analyze(resolve)()
+        size = len(json.dumps({"target_node": result["target_node"], "components": result["components"]},
+                              ensure_ascii=False, default=json_default)) / 1024 / 1024
+        print(f"{label:<18} {elapsed:>10.3f} {result['statistics']['total_elements']:>10} {size:>10.1f}")
+    statistics = result["statistics"]
+    print(f"Компонентов: {statistics['components']}, экземпляров: {statistics['component_instances']}, "
+          f"элементов заменено ссылками: {statistics['instance_elements']}")
+
+def bench_lazy(args):
+    """
+    Ленивый анализ (разбор фрейма по обращению) против полного анализа всего макета
+    """
+    pages = [synthetic_target(args.nodes // args.pages, args.depth, args.fan_out, args.seed + i)
+             for i in range(args.pages)]
+    root = {"id": "0:1", "name": "Pages", "type": "FRAME", "children": pages}
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": root}}}}
+    
+    def analyze(lazy, frames=0):
+        def run():
+            result = DeepFigmaAnalyzer(lazy=lazy).analyze_completely(figma_data)
+            for child in result["target_node"]["children"][:frames]:
+                child.materialize()
+            return result
+        return run
+    
+    print(f"Анализ {args.nodes} нод в {args.pages} родительских фреймах:")
+    eager = measure(analyze(False), args.repeats)
+    print(f"   полный анализ: {eager:.3f} с")
+    for frames in args.frames:
+        frames = min(frames, args.pages)
+        lazy = measure(analyze(True, frames), args.repeats)
+        print(f"   ленивый, разобрано фреймов {frames}: {lazy:.3f} с ({eager / lazy:.1f}x)")
+
+def icon_document(nodes: int, icon_ratio: float, icon_size: int, hidden_ratio: float, seed: int) -> Dict[str, Any]:
+    """
+    Целевой фрейм "как в реальном макете": у части фреймов иконка (группа из icon_size векторов),
+    часть нод скрыта (visible: false)
+    """
+    target = synthetic_target(nodes, 8, 6, seed)
+    rng = random.Random(seed)
+    icons = 0
+    stack = [target]
+    while stack:
+        node = stack.pop()
+        for child in node.get("children", []):
+            if rng.random() < hidden_ratio:
+                child["visible"] = False
+            stack.append(child)
+        if node["type"] == "FRAME" and rng.random() < icon_ratio:
+            icons += 1
+            box = {"x": 0.0, "y": 0.0, "width": 24.0, "height": 24.0}
+            node["children"].append({
+                "id": f"icon:{icons}", "name": "Icon", "type": "GROUP", "absoluteBoundingBox": box,
+                "children": [{"id": f"icon:{icons}:{i}", "name": "Vector", "type": "VECTOR",
+                              "absoluteBoundingBox": box, "fills": [], "strokes": []} for i in range(icon_size)]
+            })
+    return target
+
+def hidden_override_document() -> Dict[str, Any]:
+    """
+    Мастер кнопки со скрытой иконкой и экземпляр, который иконку показывает
+    """
+    box = {"x": 0.0, "y": 0.0, "width": 100.0, "height": 40.0}
+    
+    def button(node_id, node_type, icon_visible, text, **extra):
+        return dict({"id": node_id, "name": "Button", "type": node_type, "absoluteBoundingBox": box, "children": [
+            {"id": f"{node_id}:1", "name": "Icon", "type": "RECTANGLE", "visible": icon_visible, "absoluteBoundingBox": box},
+            {"id": f"{node_id}:2", "name": "Label", "type": "TEXT", "characters": text, "absoluteBoundingBox": box}
+        ]}, **extra)
+    
+    root = {"id": "0:1", "name": "Page", "type": "FRAME", "absoluteBoundingBox": box, "children": [
+        button("1:1", "COMPONENT", False, "OK"),
+        button("2:1", "INSTANCE", True, "Cancel", componentId="1:1")
+    ]}
+    return {"full_file": {"document": root},
+            "specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": root, "components": {"1:1": {"name": "Button"}}}}}}
+
+def bench_pruning(args):
+    """
+    Анализ с отсечением (скрытые ноды, иконки одним листом) против анализа каждой ноды
+    """
+    target = icon_document(args.nodes, args.icon_ratio, args.icon_size, args.hidden_ratio, args.seed)
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": target}}}}
+    
+    def analyze(pruning, data=figma_data):
+        def run():
+            analyzer = DeepFigmaAnalyzer()
+            analyzer.pruning = pruning
+            analyzer.master_pruning = pruning.for_masters()
+            return analyzer.analyze_completely(data)
+        return run
+    
+    print(f"Анализ {args.nodes} нод + иконки по {args.icon_size} векторов, скрыто {args.hidden_ratio:.0%} нод:")
+    print(f"{'':<14} {'время, с':>10} {'элементов':>10} {'JSON, МБ':>10}")
+    policies = (("все ноды", PruningPolicy()), ("с отсечением", PruningPolicy(hidden=True, icons=True)))
+    for label, pruning in policies:
+        elapsed = measure(analyze(pruning), args.repeats)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = analyze(pruning)()
+        size = len(json.dumps(result["target_node"], ensure_ascii=False, default=json_default)) / 1024 / 1024
+        print(f"{label:<14} {elapsed:>10.3f} {result['statistics']['total_elements']:>10} {size:>10.1f}")
+    print(f"Отсечено: {result['statistics']['pruning']}")
+    
+    # Скрытый в мастере ребенок, которого экземпляр делает видимым, отсечением не теряется
+    overrides = []
+    for _, pruning in policies:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = analyze(pruning, hidden_override_document())()
+        instance = next(child for child in result["target_node"]["children"] if child.get("component_id"))
+        overrides.append(([{key: value for key, value in override.items() if key != "id"} for override in instance["overrides"]],
+                          [child["name"] for child in result["components"][0]["children"]]))
+    print(f"Переопределения экземпляра со скрытым в мастере ребенком совпадают: {overrides[0] == overrides[1]} "
+          f"{overrides[1][0]}")
+
+def bench_split(args):
+    """
+    Разделение родительских фреймов на части по лимиту элементов против фрейма целиком
+    """
+    pages = [synthetic_target(args.nodes // args.pages, args.depth, args.fan_out, args.seed + i)
+             for i in range(args.pages)]
+    for page in pages:
+        page["type"] = "FRAME"  # Родительские фреймы первого уровня
+    root = {"id": "0:1", "name": "Pages", "type": "FRAME", "children": pages}
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": root}}}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        analysis = DeepFigmaAnalyzer().analyze_completely(figma_data)
+    
+    print(f"Разделение {args.nodes} нод в {args.pages} родительских фреймах:")
+    print(f"{'лимит':<10} {'время, с':>10} {'фреймов':>8} {'макс. элементов':>16} {'макс. файл, КБ':>15}")
+    for limit in args.limits:
+        with tempfile.TemporaryDirectory() as output_dir:
+            Config.OUTPUT_DIR = output_dir
+            splitter = FrameSplitter()
+            splitter.store = LooseFrameStore(output_dir)  # Размер файла каждого фрейма
+            splitter.max_elements = limit or sys.maxsize  # 0 - без лимита, как в конфиге
+            
+            def run():
+                return splitter.split_into_frames(analysis)
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = measure(run, args.repeats)
+                frames_data = run()
+            largest = max(os.path.getsize(os.path.join(output_dir, frame["file"]))
+                          for frame in frames_data["parent_frames"])
+        biggest = max(frame["total_elements"] for frame in frames_data["parent_frames"])
+        print(f"{limit or 'нет':<10} {elapsed:>10.3f} {len(frames_data['parent_frames']):>8} "
+              f"{biggest:>16} {largest / 1024:>15.1f}")
+
+def bench_store(args):
+    """
+    Все фреймы в одном файле с индексом смещений (mmap) против файла на каждый фрейм:
+    запись при разделении, чтение каждого фрейма по ID в случайном порядке, файлов на диске
+    """
+    pages = [synthetic_target(args.nodes // args.pages, args.depth, args.fan_out, args.seed + i)
+             for i in range(args.pages)]
+    for page in pages:
+        page["type"] = "FRAME"
+    root = {"id": "0:1", "name": "Pages", "type": "FRAME", "children": pages}
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": root}}}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        analysis = DeepFigmaAnalyzer().analyze_completely(figma_data)
+    
+    print(f"Хранение фреймов {args.nodes} нод (лимит фрейма {args.limit} элементов):")
+    print(f"{'хранилище':<10} {'запись, с':>10} {'чтение, с':>10} {'фреймов':>8} {'файлов':>7} {'МБ':>6}")
+    for name, store_class in FRAME_STORES.items():
+        with tempfile.TemporaryDirectory() as output_dir:
+            Config.OUTPUT_DIR = output_dir
+            splitter = FrameSplitter()
+            splitter.store = store_class(output_dir)
+            splitter.max_elements = args.limit
+            written = measure(lambda: splitter.split_into_frames(analysis), args.repeats)
+            
+            frames = splitter.store.frames()
+            random.Random(args.seed).shuffle(frames)
+            
+            def read_all():
+                store = store_class(output_dir)  # Как новый процесс: индекс читается с диска
+                for frame in frames:
+                    store.read(frame["id"], frame["file"])
+            
+            read = measure(read_all, args.repeats)
+            paths = [os.path.join(folder, filename) for folder, _, filenames in os.walk(output_dir) for filename in filenames]
+            size = sum(os.path.getsize(path) for path in paths)
+        print(f"{name:<10} {written:>10.3f} {read:>10.3f} {len(frames):>8} {len(paths):>7} {size / 1024 / 1024:>6.1f}")
+
+def bench_serialize(args):
+    """
+    Запись полного анализа в JSON: прежний json.dump с отступами против компактного вывода
+    и быстрой библиотеки
+    """
+    target = synthetic_target(args.nodes, args.depth, args.fan_out, args.seed)
+    figma_data = {"specific_node": {"nodes": {Config.FIGMA_NODE_ID: {"document": target}}}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        analysis = DeepFigmaAnalyzer().analyze_completely(figma_data)
+    analysis = pack_styles(analysis, ("target_node", "full_hierarchy", "components"))  # Как в SmartPromptGenerator
+    
+    def legacy(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(analysis, f, indent=2, ensure_ascii=False, default=json_default)
+    
+    writers = [("json, отступы (прежний)", legacy)]
+    for backend in ("json", "orjson"):
+        if backend not in BACKENDS:
+            print(f"⚠️  {backend} не установлен - пропускаем")
+            continue
+        for pretty in (False, True):
+            label = f"{backend}, {'отступы' if pretty else 'компактно'}"
+            serializer = JsonSerializer(backend, pretty)
+            writers.append((label, lambda path, serializer=serializer: serializer.dump(analysis, path)))
+    
+    print(f"Запись анализа {args.nodes} нод в JSON:")
+    print(f"{'':<26} {'время, с':>10} {'МБ':>8} {'от прежнего':>12}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = os.path.join(output_dir, "analysis.json")
+        baseline = None
+        for label, write in writers:
+            elapsed = measure(lambda: write(path), args.repeats)
+            size = os.path.getsize(path)
+            baseline = baseline or (elapsed, size)
+            print(f"{label:<26} {elapsed:>10.3f} {size / 1024 / 1024:>8.1f} "
+                  f"{baseline[0] / elapsed:>5.1f}x, {size / baseline[1]:>4.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки анализатора Figma на синтетических документах")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    traversal = subparsers.add_parser("traversal", help="Итеративный обход против рекурсивного")
+    traversal.add_argument("--nodes", type=int, default=100000, help="Количество нод в дереве")
+    traversal.add_argument("--depths", type=int, nargs="+", default=[8, 16], help="Максимальные глубины деревьев")
+    traversal.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    traversal.add_argument("--chain", type=int, default=10000, help="Длина цепочки для проверки глубины")
+    traversal.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    traversal.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    traversal.set_defaults(func=bench_traversal)
+    
+    analysis = subparsers.add_parser("analysis", help="Однопроходный анализ против многопроходного")
+    analysis.add_argument("--nodes", type=int, default=100000, help="Количество нод в дереве")
+    analysis.add_argument("--depth", type=int, default=8, help="Максимальная глубина дерева")
+    analysis.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    analysis.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    analysis.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    analysis.set_defaults(func=bench_analysis)
+    
+    table = subparsers.add_parser("table", help="Колоночная NodeTable против вложенных словарей")
+    table.add_argument("--nodes", type=int, default=200000, help="Количество нод в дереве")
+    table.add_argument("--depth", type=int, default=8, help="Максимальная глубина дерева")
+    table.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    table.add_argument("--repeats", type=int, default=1, help="Повторов на замер (берется лучший)")
+    table.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    table.set_defaults(func=bench_table)
+    
+    parallel = subparsers.add_parser("parallel", help="Параллельный анализ фреймов против последовательного")
+    parallel.add_argument("--nodes", type=int, default=200000, help="Количество нод во всех фреймах")
+    parallel.add_argument("--pages", type=int, default=32, help="Количество родительских фреймов")
+    parallel.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8], help="Размеры пула процессов")
+    parallel.add_argument("--depth", type=int, default=8, help="Максимальная глубина фрейма")
+    parallel.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    parallel.add_argument("--repeats", type=int, default=1, help="Повторов на замер (берется лучший)")
+    parallel.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    parallel.set_defaults(func=bench_parallel)
+    
+    layout = subparsers.add_parser("layout", help="Восстановление раскладки фреймов без auto-layout")
+    layout.add_argument("--children", type=int, nargs="+", default=[1000, 5000, 20000], help="Количество детей во фрейме")
+    layout.add_argument("--pairwise-limit", type=int, default=5000, help="Больше детей - попарное сравнение не запускаем")
+    layout.add_argument("--nodes", type=int, default=50000, help="Количество нод для замера полного анализа")
+    layout.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    layout.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    layout.set_defaults(func=bench_layout)
+    
+    tokens = subparsers.add_parser("tokens", help="Кластеризация цветов и привязка отступов к сетке")
+    tokens.add_argument("--values", type=int, nargs="+", default=[1000, 10000, 100000], help="Сырых значений в наборе")
+    tokens.add_argument("--palette", type=int, default=40, help="Цветов в исходной палитре")
+    tokens.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    tokens.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    tokens.set_defaults(func=bench_tokens)
+    
+    components = subparsers.add_parser("components", help="Мастер-компоненты один раз против анализа каждого экземпляра")
+    components.add_argument("--nodes", type=int, default=50000, help="Количество нод в дереве")
+    components.add_argument("--instance-ratio", type=float, default=0.3, help="Доля INSTANCE нод")
+    components.add_argument("--component-size", type=int, default=20, help="Нод в одном компоненте")
+    components.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    components.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    components.set_defaults(func=bench_components)
+    
+    lazy = subparsers.add_parser("lazy", help="Ленивый анализ по обращению к фреймам против полного")
+    lazy.add_argument("--nodes", type=int, default=100000, help="Количество нод во всех фреймах")
+    lazy.add_argument("--pages", type=int, default=32, help="Количество родительских фреймов")
+    lazy.add_argument("--frames", type=int, nargs="+", default=[0, 1, 4, 32], help="Сколько фреймов разобрать")
+    lazy.add_argument("--depth", type=int, default=8, help="Максимальная глубина фрейма")
+    lazy.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    lazy.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    lazy.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    lazy.set_defaults(func=bench_lazy)
+    
+    pruning = subparsers.add_parser("pruning", help="Отсечение скрытых нод и иконок против анализа каждой ноды")
+    pruning.add_argument("--nodes", type=int, default=50000, help="Количество нод без иконок")
+    pruning.add_argument("--icon-ratio", type=float, default=0.5, help="Доля фреймов с иконкой")
+    pruning.add_argument("--icon-size", type=int, default=40, help="Векторов в одной иконке")
+    pruning.add_argument("--hidden-ratio", type=float, default=0.05, help="Доля скрытых нод")
+    pruning.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    pruning.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    pruning.set_defaults(func=bench_pruning)
+    
+    split = subparsers.add_parser("split", help="Разделение больших фреймов на части по лимиту элементов")
+    split.add_argument("--nodes", type=int, default=20000, help="Количество нод во всех фреймах")
+    split.add_argument("--pages", type=int, default=4, help="Количество родительских фреймов")
+    split.add_argument("--limits", type=int, nargs="+", default=[0, 200, 50], help="Лимиты элементов во фрейме (0 - без лимита)")
+    split.add_argument("--depth", type=int, default=8, help="Максимальная глубина фрейма")
+    split.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    split.add_argument("--repeats", type=int, default=1, help="Повторов на замер (берется лучший)")
+    split.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    split.set_defaults(func=bench_split)
+    
+    store = subparsers.add_parser("store", help="Фреймы в одном упакованном файле против файла на фрейм")
+    store.add_argument("--nodes", type=int, default=50000, help="Количество нод в дереве")
+    store.add_argument("--pages", type=int, default=10, help="Родительских фреймов первого уровня")
+    store.add_argument("--limit", type=int, default=50, help="Лимит элементов во фрейме (MAX_ELEMENTS_PER_FRAME)")
+    store.add_argument("--depth", type=int, default=8, help="Максимальная глубина дерева")
+    store.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    store.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    store.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    store.set_defaults(func=bench_store)
+    
+    serialize = subparsers.add_parser("serialize", help="Компактный JSON и быстрая библиотека против json.dump с отступами")
+    serialize.add_argument("--nodes", type=int, default=50000, help="Количество нод в дереве")
+    serialize.add_argument("--depth", type=int, default=8, help="Максимальная глубина дерева")
+    serialize.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    serialize.add_argument("--repeats", type=int, default=3, help="Повторов на замер (берется лучший)")
+    serialize.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    serialize.set_defaults(func=bench_serialize)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
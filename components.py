@@ -0,0 +1,55 @@
+# components.py
+from collections.abc import Mapping
+from typing import Dict, Any, List
+
+def collect_masters(document: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Мастер-компоненты полного файла Figma: ID -> нода COMPONENT
+    Внутрь компонентов не спускаемся - компонент не может лежать в другом компоненте
+    """
+    masters = {}
+    stack = [document] if document else []
+    while stack:  # Явный стек вместо рекурсии - глубина не ограничена
+        node = stack.pop()
+        if node.get("type") == "COMPONENT":
+            masters[node.get("id", "")] = node
+            continue
+        stack.extend(node.get("children") or ())
+    return masters
+
+def same_structure(master: Dict[str, Any], instance: Dict[str, Any]) -> bool:
+    """
+    У экземпляра то же дерево, что у мастера: те же типы нод и число детей на каждом
+    уровне, вложенные экземпляры ссылаются на те же компоненты. Подмененный вложенный
+    экземпляр (instance swap) меняет структуру - такой экземпляр анализируется целиком
+    Корни не сравниваются: у мастера тип COMPONENT, у экземпляра - INSTANCE
+    """
+    stack = [(master.get("children") or [], instance.get("children") or [])]
+    while stack:
+        master_children, instance_children = stack.pop()
+        if len(master_children) != len(instance_children):
+            return False
+        for master_child, instance_child in zip(master_children, instance_children):
+            if (master_child.get("type") != instance_child.get("type")
+                    or master_child.get("componentId") != instance_child.get("componentId")):
+                return False
+            if master_child.get("children") or instance_child.get("children"):
+                stack.append((master_child.get("children") or [], instance_child.get("children") or []))
+    return True
+
+def frame_components(components: Dict[str, Mapping], element: Mapping) -> List[Mapping]:
+    """
+    Мастер-компоненты, на которые ссылаются экземпляры поддерева, вместе с компонентами,
+    вложенными в сами мастера, - в порядке первой ссылки
+    components: ID компонента -> проанализированный мастер
+    """
+    used = {}
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        component_id = current.get("component_id")
+        if component_id is not None and component_id not in used and component_id in components:
+            used[component_id] = components[component_id]
+            stack.append(components[component_id])  # Экземпляры внутри мастера
+        stack.extend(reversed(current.get("children", [])))
+    return list(used.values())
@@ -17,14 +17,103 @@ class Config:
     
     # ID конкретной ноды (элемента) для анализа
     # В Figma API используется двоеточие, в URL - дефис, поэтому меняем
-    FIGMA_NODE_ID = "96:5321"  # Пример: "1619:4" вместо "1619-4"
+    FIGMA_NODE_ID = os.getenv('FIGMA_NODE_ID', "96:5321")  # Пример: "1619:4" вместо "1619-4"
+    
+    # Адрес Figma API - можно направить на локальный мок (figma_mock_server.py)
+    FIGMA_API_BASE_URL = os.getenv('FIGMA_API_BASE_URL', "https://api.figma.com/v1")
+    
+    # Настройки HTTP-транспорта для Figma API
+    # Одна сессия с пулом keep-alive соединений переиспользуется всеми клиентами процесса
+    FIGMA_HTTP_POOL_SIZE = int(os.getenv('FIGMA_HTTP_POOL_SIZE', '10'))  # Максимум соединений в пуле
+    FIGMA_HTTP_TIMEOUT = int(os.getenv('FIGMA_HTTP_TIMEOUT', '30'))       # Таймаут запроса в секундах
+    
+    # Пакетная загрузка нод и защита от лимитов Figma API
+    FIGMA_MAX_CONCURRENCY = int(os.getenv('FIGMA_MAX_CONCURRENCY', '4'))  # Параллельных запросов
+    FIGMA_MAX_URL_LENGTH = 2000          # Максимальная длина URL запроса /nodes?ids=...
+    FIGMA_MAX_IDS_PER_REQUEST = 50       # Максимум ID нод в одном запросе
+    FIGMA_RATE_LIMIT = float(os.getenv('FIGMA_RATE_LIMIT', '5'))  # Запросов в секунду (token bucket, 0 - без лимита)
+    FIGMA_RATE_BURST = int(os.getenv('FIGMA_RATE_BURST', '10'))   # Сколько запросов можно сделать разом
+    FIGMA_MAX_RETRIES = 5                # Повторов при 429 / 5xx / сетевых сбоях
+    FIGMA_BACKOFF_BASE = 1.0             # Первая задержка экспоненциального backoff (секунды)
+    FIGMA_BACKOFF_MAX = 60.0             # Максимальная задержка между повторами
+    
+    # Что именно скачиваем из Figma
+    # Полный файл (/files/{key}) нужен редко - по умолчанию берем только целевую ноду
+    FIGMA_FETCH_FULL_FILE = os.getenv('FIGMA_FETCH_FULL_FILE', 'false').lower() == 'true'
+    # Глубина поддерева ноды (None - все дерево целиком, как нужно анализатору)
+    FIGMA_NODE_DEPTH = int(os.getenv('FIGMA_NODE_DEPTH')) if os.getenv('FIGMA_NODE_DEPTH') else None
+    # Геометрия векторов ("paths" - с путями); None - без геометрии, ответ заметно меньше
+    FIGMA_GEOMETRY = os.getenv('FIGMA_GEOMETRY') or None
+    
+    # Потоковый режим для огромных документов: ответ пишется на диск и парсится по частям
+    FIGMA_STREAMING = os.getenv('FIGMA_STREAMING', 'false').lower() == 'true'
+    FIGMA_STREAM_CHUNK_SIZE = 1024 * 1024  # Размер куска при скачивании (1 МБ)
     
     # Настройки выходных файлов
     OUTPUT_DIR = "generated_code"  # Папка куда сохраняем результаты
     
+    # Дисковый кэш ответов Figma API (ключ учитывает версию файла)
+    FIGMA_CACHE_ENABLED = os.getenv('FIGMA_CACHE_ENABLED', 'true').lower() == 'true'
+    FIGMA_CACHE_DIR = os.path.join(OUTPUT_DIR, ".figma_cache")     # Где лежит кэш
+    FIGMA_CACHE_MAX_MB = int(os.getenv('FIGMA_CACHE_MAX_MB', '500'))  # Лимит размера (LRU-вытеснение)
+    # Сколько секунд доверять последней проверке версии без запроса к API (0 - проверять всегда)
+    FIGMA_CACHE_VERSION_TTL = int(os.getenv('FIGMA_CACHE_VERSION_TTL', '0'))
+    
+    # Инкрементальная обработка: при новой версии макета пересчитываются только
+    # изменившиеся родительские фреймы (по Merkle-хэшам поддеревьев)
+    INCREMENTAL_PROCESSING = os.getenv('INCREMENTAL_PROCESSING', 'true').lower() == 'true'
+    # Кэшируется анализ только поддеревьев от стольких элементов (мелкие быстрее разобрать заново)
+    INCREMENTAL_MIN_SUBTREE_ELEMENTS = int(os.getenv('INCREMENTAL_MIN_SUBTREE_ELEMENTS', '50'))
+    # Сколько макетов (file key + нода) помнит манифест; кэш поддеревьев давно не виденных удаляется
+    INCREMENTAL_MAX_TARGETS = int(os.getenv('INCREMENTAL_MAX_TARGETS', '16'))
+    
+    # Плоский индекс элементов ID -> элемент в анализаторе (нужен только для поиска по ID)
+    BUILD_ELEMENT_INDEX = os.getenv('BUILD_ELEMENT_INDEX', 'false').lower() == 'true'
+    # Компактное колоночное хранение результата анализа (NodeTable) вместо вложенных словарей
+    COMPACT_NODE_TABLE = os.getenv('COMPACT_NODE_TABLE', 'false').lower() == 'true'
+    # В JSON фреймов и полного анализа стили пишутся один раз в style_table, у элементов - только style_id
+    STYLE_TABLE_IN_JSON = os.getenv('STYLE_TABLE_IN_JSON', 'true').lower() == 'true'
+    # Чем писать JSON фреймов и анализа: auto (orjson, если установлен), orjson или json (стандартный модуль)
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto').lower()
+    # JSON с отступами для отладки (по умолчанию - компактно, без отступов и пробелов)
+    JSON_PRETTY = os.getenv('JSON_PRETTY', 'false').lower() == 'true'
+    # Где хранятся JSON фреймов: packed - один файл frames.<N>.jsonl с индексом смещений, files - по файлу на фрейм
+    FRAME_STORE = os.getenv('FRAME_STORE', 'packed').lower()
+    # Сколько процессов анализируют родительские фреймы параллельно (1 - последовательно, 0 - все ядра)
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '1'))
+    # Для фреймов без auto-layout восстанавливать раскладку детей (ряд/колонка/сетка, отступы, пересечения)
+    LAYOUT_INFERENCE = os.getenv('LAYOUT_INFERENCE', 'true').lower() == 'true'
+    # Группировать одинаковые по структуре поддеревья: в промптах шаблон + отличия экземпляров
+    DETECT_REPEATS = os.getenv('DETECT_REPEATS', 'true').lower() == 'true'
+    # Минимальный размер повторяющегося поддерева (элементов) - одиночные листья не группируем
+    REPEAT_MIN_ELEMENTS = int(os.getenv('REPEAT_MIN_ELEMENTS', '2'))
+    # В JSON фреймов и полного анализа копии шаблона пишутся ссылкой repeat_of
+    COLLAPSE_REPEATS_IN_JSON = os.getenv('COLLAPSE_REPEATS_IN_JSON', 'true').lower() == 'true'
+    # Объединять близкие цвета в один токен и привязывать отступы/скругления к сетке SPACING_BASE
+    TOKEN_CLUSTERING = os.getenv('TOKEN_CLUSTERING', 'true').lower() == 'true'
+    # Порог объединения цветов: ΔE в пространстве Lab (2.3 - порог заметной разницы)
+    COLOR_MERGE_DISTANCE = float(os.getenv('COLOR_MERGE_DISTANCE', '2.3'))
+    # Мастер-компонент анализируется один раз, экземпляры (INSTANCE) - ссылка на него плюс переопределения
+    COMPONENT_RESOLUTION = os.getenv('COMPONENT_RESOLUTION', 'true').lower() == 'true'
+    # Ленивый анализ: поддерево родительского фрейма разбирается при первом обращении к нему,
+    # счетчики, типы и токены - из быстрого предварительного прохода (для запросов к нескольким фреймам)
+    LAZY_ANALYSIS = os.getenv('LAZY_ANALYSIS', 'false').lower() == 'true'
+    # Ленивый анализ из командной строки: оригинальные ID фреймов (через запятую), которые разобрать сразу;
+    # остальные откладываются (сервер разбирает фрейм, когда пользователь его выбирает)
+    LAZY_FRAME_IDS = [i.strip() for i in os.getenv('LAZY_FRAME_IDS', '').split(',') if i.strip()]
+    
+    # Отсечение нод до анализа (скрытые слои, иконки из сотен векторов, лишние типы)
+    PRUNE_HIDDEN = os.getenv('PRUNE_HIDDEN', 'false').lower() == 'true'  # Не анализировать visible: false
+    PRUNE_ICONS = os.getenv('PRUNE_ICONS', 'false').lower() == 'true'    # Иконку из векторов - одним листом
+    # Списки типов через запятую: разрешенные (пусто - все) и запрещенные (отбрасываются с поддеревом)
+    PRUNE_ALLOW_TYPES = [t.strip() for t in os.getenv('PRUNE_ALLOW_TYPES', '').split(',') if t.strip()]
+    PRUNE_DENY_TYPES = [t.strip() for t in os.getenv('PRUNE_DENY_TYPES', '').split(',') if t.strip()]
+    # Лимит детей у одной ноды (0 - без лимита); остальные дети не анализируются
+    PRUNE_MAX_CHILDREN = int(os.getenv('PRUNE_MAX_CHILDREN', '0'))
+    
     # Настройки для разделения больших макетов
-    MAX_ELEMENTS_PER_FRAME = 200  # Если элементов больше - разбиваем на части
-    MIN_FRAME_CHILDREN = 2        # Минимальное количество детей для создания отдельного фрейма
+    MAX_ELEMENTS_PER_FRAME = int(os.getenv('MAX_ELEMENTS_PER_FRAME', '200'))  # Если элементов больше - разбиваем на части (0 - не разбиваем)
+    MIN_FRAME_CHILDREN = int(os.getenv('MIN_FRAME_CHILDREN', '2'))  # Минимальное количество детей для создания отдельного фрейма
     
     # Базовые значения для анализа (используются для нормализации)
     SPACING_BASE = 8  # Базовый шаг отступов (часто 8px система)
\ No newline at end of file
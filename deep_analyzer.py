@@ -1,94 +1,684 @@
 # deep_analyzer.py
+import contextlib
+import copy
+import gc
+import io
 import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, List, Set
 from config import Config
+from incremental import IncrementalManifest, compute_subtree_hash, combine_hash, compute_context_hash
+from node_table import NodeTable
+from style_table import StyleTable
+from design_tokens import TypographyRegistry, typography_token_name
+from layout_inference import infer_layout
+from repeats import find_repeats
+from token_clustering import cluster_colors, snap_values, token_map
+from components import collect_masters, same_structure
+from lazy_tree import LazyElement
+from pruning import PruningPolicy, empty_stats
+
+# Версия формата результата анализа: меняется, когда меняется то, что анализатор
+# кладет в элементы (кэш инкрементальной обработки от старой версии не используется)
+ANALYSIS_FORMAT_VERSION = "8"
+
+# Поддеревья глубже этого анализируются в основном процессе: pickle при передаче
+# между процессами рекурсивен и упирается в лимит рекурсии Python (~250 уровней элементов).
+# Учитываются и мастера компонентов, которые уходят в процесс пула вместе с поддеревом
+PARALLEL_MAX_SUBTREE_DEPTH = 200
 
 class DeepFigmaAnalyzer:
     """
     Глубокий анализатор Figma структур
-    Рекурсивно анализирует всю иерархию элементов и извлекает дизайн-токены
+    Анализирует всю иерархию элементов (без ограничения глубины) и извлекает дизайн-токены
+    Экземпляр хранит только настройки: каждый вызов analyze_completely работает со своим
+    рабочим состоянием (см. _new_run), поэтому один анализатор обслуживает сколько угодно
+    запусков подряд или из разных потоков
     """
     
-    def __init__(self):
+    def __init__(self, incremental: IncrementalManifest = None, compact: bool = None, workers: int = None,
+                 lazy: bool = None, keep_workers: bool = False):
+        # Ленивый режим: дети корня - прокси (LazyElement), поддерево разбирается при первом обращении
+        # Только словари, последовательно и без кэша поддеревьев (кэш хранит готовые поддеревья)
+        self.lazy = Config.LAZY_ANALYSIS if lazy is None else lazy
+        if self.lazy:
+            incremental, compact, workers = None, False, 1
+        
+        # Манифест инкрементальной обработки (None - анализируем все заново)
+        self.incremental = incremental
+        
+        # Восстановление раскладки детей у фреймов без auto-layout (layoutMode NONE)
+        self.layout_inference = Config.LAYOUT_INFERENCE
+        
+        # Экземпляры компонентов - ссылка на один раз проанализированный мастер плюс переопределения
+        self.resolve_components = Config.COMPONENT_RESOLUTION
+        
+        # Отсечение нод до анализа: скрытые, иконки, списки типов, лимит детей
+        self.pruning = PruningPolicy.from_config()
+        self.master_pruning = self.pruning.for_masters()  # В мастерах скрытые дети остаются (их включают экземпляры)
+        
+        if incremental is not None:
+            incremental.set_format(f"{ANALYSIS_FORMAT_VERSION}:layout={int(self.layout_inference)}"
+                                   f":components={int(self.resolve_components)}:prune={self.pruning.signature()}")
+        
+        # Поиск повторяющихся поддеревьев по структурному хэшу (карточки, строки, пункты меню)
+        self.detect_repeats = Config.DETECT_REPEATS
+        
+        # Объединение близких цветов и привязка отступов/скруглений к сетке SPACING_BASE
+        self.cluster_tokens = Config.TOKEN_CLUSTERING
+        
+        # Компактный режим: элементы хранятся в колоночной NodeTable, а потребители
+        # получают ленивые NodeView вместо вложенных словарей
+        self.compact = Config.COMPACT_NODE_TABLE if compact is None else compact
+        
+        # Параллельный режим: дети целевой ноды анализируются в пуле процессов (1 - последовательно)
+        # Компактный режим NodeTable всегда последовательный
+        workers = Config.ANALYSIS_WORKERS if workers is None else workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        
+        # Долгоживущий процесс (сервер): пул процессов создается один раз и переживает запуски
+        # (без этого каждый анализ заново поднимает интерпретаторы); закрывается в close()
+        self.keep_workers = keep_workers
+        self._worker_pool = None
+        self._worker_pool_lock = threading.Lock()
+        
+        self.log = print  # Куда писать ход анализа (run_pipeline подменяет на время запуска)
+        
+        self._reset_state()
+    
+    def _reset_state(self):
+        """
+        Рабочее состояние одного анализа: результат, счетчики, таблицы стилей и компонентов
+        Все контейнеры создаются заново (а не очищаются) - результат прошлого запуска,
+        который еще держит вызывающий код, не меняется
+        """
+        # Интернированные стили: одинаковые комбинации стилей разбираются один раз,
+        # элементы ссылаются на общую запись по style_id
+        self.style_table = StyleTable()
+        self.node_table = NodeTable(styles=self.style_table) if self.compact else None
+        
+        self.pruning_stats = empty_stats()      # Итог для statistics["pruning"]
+        self.prune_stats = self.pruning_stats   # Куда считать сейчас (None - проход, уже посчитанный другим)
+        
         # Структура для хранения результатов анализа
         self.analysis_result = {
             "target_node": {},       # Детальный анализ целевой ноды
             "full_hierarchy": [],    # Полная иерархия в виде дерева
-            "all_elements": [],      # Все элементы в плоском списке (для статистики)
             "design_tokens": {       # Извлеченные дизайн-токены (цвета, шрифты и т.д.)
                 "colors": set(),     # Множество уникальных цветов
-                "typography": [],    # Стили типографики
+                "typography": TypographyRegistry(),  # Уникальные стили типографики с частотой
                 "spacing": set(),    # Значения отступов
                 "border_radius": set()  # Значения скруглений
             },
             "layout_data": {},       # Данные о компоновке
+            "repeats": [],           # Группы одинаковых по структуре поддеревьев
+            "components": [],        # Мастер-компоненты, на которые ссылаются экземпляры
+            "token_map": {},         # Сырое значение (цвет, отступ, скругление) -> имя токена
             "statistics": {}         # Статистика анализа
         }
+        # Сырые токены копятся здесь; в analysis_result после анализа лежат уже именованные,
+        # поэтому поддеревья, разобранные позже (ленивый режим), итоговые токены не меняют
+        self.raw_tokens = self.analysis_result["design_tokens"]
         self.element_counter = 0  # Счетчик элементов для генерации ID
+        self.typography_registry = None  # Реестр типографики (частоты и ID нод) после анализа
+        
+        # Статистика собирается в том же проходе, что строит дерево
+        self.type_counts = {}     # Количество элементов по типам
+        self.max_depth = 0        # Максимальная вложенность
+        # Плоский индекс ID -> элемент (ссылки на те же словари, не копии); None - не строим
+        self.element_index = {} if Config.BUILD_ELEMENT_INDEX else None
+        self.log_depth = 3        # До какой глубины печатать элементы в лог
+        
+        # Компоненты: сырые мастера (нода COMPONENT из полного файла или первый встреченный
+        # экземпляр), проанализированные мастера и экземпляры, ждущие переопределений
+        self.component_meta = {}      # ID компонента -> key, name, description из ответа Figma
+        self.master_nodes = {}        # ID компонента -> сырая нода мастера
+        self.components = {}          # ID компонента -> проанализированный мастер
+        self.pending_instances = []   # (элемент или строка NodeTable, сырая нода экземпляра)
+        self.instance_elements = 0    # Элементов, замененных ссылками на мастера
     
     def analyze_completely(self, figma_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Главный метод - запускает полный анализ Figma структуры
         figma_data: данные от FigmaClient.get_full_structure()
+        Сам анализатор не меняется: анализ идет в отдельном рабочем состоянии (см. _new_run)
+        """
+        return self._new_run()._analyze(figma_data)
+    
+    def _new_run(self) -> "DeepFigmaAnalyzer":
+        """
+        Анализатор для одного запуска: те же настройки, свое рабочее состояние
+        Копия поверхностная - политика отсечения, манифест и пул процессов общие,
+        а результат и счетчики свои (ленивые элементы ссылаются именно на эту копию)
+        """
+        if self.keep_workers and self.workers > 1 and not self.compact and self._worker_pool is None:
+            with self._worker_pool_lock:
+                if self._worker_pool is None:
+                    self._worker_pool = ProcessPoolExecutor(max_workers=self.workers)
+        run = copy.copy(self)
+        run._reset_state()
+        return run
+    
+    def close(self):
         """
-        print("🔍 Запускаем ПОЛНЫЙ анализ структуры Figma...")
+        Останавливает долгоживущий пул процессов (keep_workers=True)
+        """
+        with self._worker_pool_lock:
+            if self._worker_pool is not None:
+                self._worker_pool.shutdown()
+                self._worker_pool = None
+    
+    def _analyze(self, figma_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Анализ в рабочем состоянии этого экземпляра (вызывается на копии из _new_run)
+        """
+        self.log("🔍 Запускаем ПОЛНЫЙ анализ структуры Figma...")
         
-        # Извлекаем данные конкретной ноды из ответа Figma API
-        specific_node_data = figma_data["specific_node"]["nodes"].get(Config.FIGMA_NODE_ID, {})
-        if not specific_node_data:
-            print("❌ Целевая нода не найдена в ответе Figma")
-            return self.analysis_result
+        # В потоковом режиме корень приходит без детей, а дети читаются по одному
+        node_stream = figma_data.get("node_stream")
+        node_id = figma_data.get("target_node_id") or Config.FIGMA_NODE_ID
+        
+        # Манифест хранит разделы по макетам - сравниваем с прошлым запуском этого же файла и ноды
+        if self.incremental is not None:
+            self.incremental.select_target(figma_data.get("file_key") or Config.FIGMA_FILE_KEY, node_id)
+        
+        if node_stream is not None:
+            target_document = node_stream.load_shell()
+            if not target_document:
+                self.log("❌ Целевая нода не найдена в ответе Figma")
+                return self.analysis_result
+        else:
+            # Извлекаем данные конкретной ноды из ответа Figma API
+            specific_node_data = figma_data["specific_node"]["nodes"].get(node_id, {})
+            if not specific_node_data:
+                self.log("❌ Целевая нода не найдена в ответе Figma")
+                return self.analysis_result
+            
+            # Получаем документ ноды (основные данные элемента)
+            target_document = specific_node_data.get("document", {})
+            self.component_meta = dict(specific_node_data.get("components") or {})
+        
+        # Мастера из полного файла (если его качали); остальные компоненты задаст первый экземпляр
+        full_file = figma_data.get("full_file")
+        if self.resolve_components and full_file:
+            self.component_meta = {**(full_file.get("components") or {}), **self.component_meta}
+            self.master_nodes = collect_masters(full_file.get("document"))
+        
+        # Корень анализируем без детей, а детей (будущие родительские фреймы) - по одному:
+        # в потоковом режиме они читаются из файла, в инкрементальном - берутся из кэша
+        if node_stream is not None:
+            root_children = node_stream.iter_children()
+        else:
+            root_children = target_document.get("children", [])
+            target_document = {key: value for key, value in target_document.items() if key != "children"}
+        root_children = self.pruning.filter_children(root_children, self.prune_stats)
+        
+        # Один проход строит дерево, статистику и дизайн-токены
+        self.log(f"🎯 Анализируем корневую ноду: {target_document.get('name', 'Unknown')}")
+        child_hashes = []  # Merkle-хэши поддеревьев детей корня
+        if self.node_table is not None:
+            root_row = self._analyze_into_table(target_document, -1, 0)
+            for child in root_children:
+                self._analyze_top_level_child(child, root_row, child_hashes)
+            self._resolve_instances()
+            self.node_table.freeze()
+            root_analysis = self.node_table.view(root_row)
+            if self.element_index is not None:
+                self.element_index = {element["id"]: element for element in self.iter_elements(root_analysis)}
+        elif self.lazy:
+            root_analysis = self._analyze_element_completely(target_document, "root", 0)
+            self._prescan_children(root_children, root_analysis)
+        elif self.workers > 1:
+            root_analysis = self._analyze_element_completely(target_document, "root", 0)
+            self._analyze_children_in_parallel(root_children, root_analysis, child_hashes)
+            self._resolve_instances()
+        else:
+            root_analysis = self._analyze_element_completely(target_document, "root", 0)
+            for child in root_children:
+                child_analysis = self._analyze_top_level_child(child, root_analysis["id"], child_hashes)
+                root_analysis["children"].append(child_analysis)
+            self._resolve_instances()
         
-        # Получаем документ ноды (основные данные элемента)
-        target_document = specific_node_data.get("document", {})
+        # Стили текста мастеров используются в каждом экземпляре - учитываем частоту
+        self._weight_component_typography()
         
-        # Запускаем рекурсивный анализ начиная с корневой ноды
-        print(f"🎯 Анализируем корневую ноду: {target_document.get('name', 'Unknown')}")
-        root_analysis = self._analyze_element_completely(target_document, "root", 0)
+        # Дети корня анализируются отдельно от него - раскладку корня восстанавливаем по ним
+        self._infer_root_layout(target_document, root_analysis)
         
         # Сохраняем результаты
         self.analysis_result["target_node"] = root_analysis
         self.analysis_result["full_hierarchy"] = root_analysis.get("children", [])
+        self.analysis_result["components"] = list(self.components.values())
         
-        # Преобразуем иерархию в плоский список для удобства
-        self._flatten_hierarchy(root_analysis)
+        self.analysis_result["lazy"] = self.lazy
+        
+        # Группируем одинаковые по структуре поддеревья (шаблон + отличия экземпляров)
+        # Ленивый режим таблицу всего макета не строит - повторы ищутся внутри фрейма при его разборе
+        if self.detect_repeats and not self.lazy:
+            self.analysis_result["repeats"] = find_repeats(root_analysis, Config.REPEAT_MIN_ELEMENTS)
         
         # Создаем финальные дизайн-токены (преобразуем множества в словари)
         self._create_final_design_tokens()
         
+        if self.incremental is not None:
+            layout_unchanged = self.incremental.record_root(combine_hash(target_document, child_hashes))
+            if layout_unchanged:
+                self.log("♻️  Макет не изменился с прошлого запуска")
+            self.analysis_result["layout_unchanged"] = layout_unchanged
+            # Токены всего макета есть в файле каждого фрейма: изменились - перезаписываем все фреймы
+            self.incremental.record_context(compute_context_hash(self.analysis_result["design_tokens"],
+                                                                 self.analysis_result["token_map"]))
+            # Фреймы, чьи файлы и промпты с прошлого запуска можно не перезаписывать
+            self.analysis_result["unchanged_frames"] = [
+                child.get("original_id", "") for child in root_analysis["children"]
+                if self.incremental.is_unchanged(child.get("original_id", ""))
+            ]
+        
         # Собираем статистику
         self._collect_statistics()
         
-        print(f"✅ Полный анализ завершен! Элементов: {self.analysis_result['statistics']['total_elements']}")
+        self.log(f"✅ Полный анализ завершен! Элементов: {self.analysis_result['statistics']['total_elements']}")
         return self.analysis_result
     
+    def _analyze_top_level_child(self, child: Dict[str, Any], parent_id, child_hashes: List[str]):
+        """
+        Анализирует прямого ребенка корня с учетом инкрементального режима:
+        если поддерево с таким Merkle-хэшем уже анализировалось - берем результат из кэша
+        parent_id: ID родителя (или номер строки родителя в NodeTable в компактном режиме)
+        """
+        if self.node_table is not None:
+            # Кэш поддеревьев хранит словари - в компактном режиме только отмечаем хэши
+            if self.incremental is not None:
+                subtree_hash = compute_subtree_hash(child)
+                child_hashes.append(subtree_hash)
+                self.incremental.record_frame(child.get("id", ""), subtree_hash, self.element_counter + 1)
+            return self._analyze_into_table(child, parent_id, 1)
+        
+        if self.incremental is None:
+            return self._analyze_element_completely(child, parent_id, 1)
+        
+        subtree_hash = compute_subtree_hash(child)
+        child_hashes.append(subtree_hash)
+        self.incremental.record_frame(child.get("id", ""), subtree_hash, self.element_counter + 1)
+        
+        size, _, instances, _ = self._measure_subtree(child)  # Отсеченное здесь уже посчитано
+        cached = self._load_cached_subtree(subtree_hash, instances)
+        if cached is not None:
+            self.log(f"  ♻️  {cached.get('name', '')} ({cached.get('type', '')}) - без изменений, берем из кэша")
+            return self._reuse_analyzed_subtree(cached, parent_id, instances)
+        
+        element_data = self._analyze_uncounted(child, parent_id)
+        self.incremental.store_subtree(subtree_hash, element_data, size)
+        return element_data
+    
+    def _analyze_children_in_parallel(self, root_children, root_analysis: Dict[str, Any], child_hashes: List[str]):
+        """
+        Анализирует детей корня в пуле процессов
+        Размер каждого поддерева считается заранее, поэтому номер его первого элемента
+        известен до анализа и ID совпадают с последовательным режимом. Результаты
+        сливаются строго по порядку детей: токены, счетчики и лог - как при обходе подряд
+        """
+        parent_id = root_analysis["id"]
+        jobs = []  # (ребенок, номер первого элемента, размер, future или None, хэш поддерева, экземпляры)
+        
+        self.log(f"⚡ Параллельный анализ родительских фреймов: {self.workers} процессов")
+        with _gc_paused(), self._process_pool() as pool:
+            for child in root_children:
+                # Обход в том же порядке, что анализ: мастера компонентов регистрируются так же,
+                # как при последовательном анализе, поэтому совпадают и ID, и ссылки экземпляров
+                size, depth, instances, masters = self._measure_subtree(child)
+                start = self.element_counter + 1
+                self.element_counter += size
+                
+                subtree_hash = None
+                if self.incremental is not None:
+                    subtree_hash = compute_subtree_hash(child)
+                    child_hashes.append(subtree_hash)
+                    self.incremental.record_frame(child.get("id", ""), subtree_hash, start)
+                    if self._load_cached_subtree(subtree_hash, instances) is not None:
+                        jobs.append((child, start, size, None, subtree_hash, instances))  # Возьмем из кэша при слиянии
+                        continue
+                
+                future = None
+                if depth <= PARALLEL_MAX_SUBTREE_DEPTH:
+                    future = pool.submit(_analyze_subtree_in_worker, child, parent_id, start, masters)
+                jobs.append((child, start, size, future, subtree_hash, instances))
+            
+            total = self.element_counter
+            for child, start, size, future, subtree_hash, instances in jobs:
+                self.element_counter = start - 1
+                cached = None
+                if future is None and subtree_hash is not None:
+                    cached = self._load_cached_subtree(subtree_hash, instances)
+                
+                if cached is not None:
+                    self.log(f"  ♻️  {cached.get('name', '')} ({cached.get('type', '')}) - без изменений, берем из кэша")
+                    element_data = self._reuse_analyzed_subtree(cached, parent_id, instances)
+                else:
+                    if future is not None:
+                        element_data = self._merge_worker_result(future.result(), instances)
+                    else:
+                        # Слишком глубокое поддерево - анализируем в этом процессе
+                        element_data = self._analyze_uncounted(child, parent_id)
+                    if subtree_hash is not None:
+                        self.incremental.store_subtree(subtree_hash, element_data, size)
+                
+                root_analysis["children"].append(element_data)
+        
+        self.element_counter = total
+    
+    def _process_pool(self):
+        """
+        Пул процессов на один анализ или долгоживущий (keep_workers) - его контекст не закрывает
+        """
+        if self._worker_pool is not None:
+            return contextlib.nullcontext(self._worker_pool)
+        return ProcessPoolExecutor(max_workers=self.workers)
+    
+    def _measure_subtree(self, node: Dict[str, Any]) -> tuple:
+        """
+        Количество будущих элементов, глубина сырого поддерева, экземпляры компонентов,
+        которые станут ссылками (в порядке анализа), и сырые мастера всех встреченных
+        компонентов - без анализа, только обход
+        Дети таких экземпляров элементами не станут, но в глубину (она нужна для pickle) входят,
+        как и глубина самих мастеров
+        """
+        size = 0
+        max_depth = 0
+        instances = []
+        masters = {}
+        stack = [(node, 0, True)]  # (нода, глубина, станет ли нода элементом)
+        while stack:
+            current, depth, counted = stack.pop()
+            if depth > max_depth:
+                max_depth = depth
+            children = current.get("children") or ()
+            if counted:
+                size += 1
+                if self._component_master(current) is not None:
+                    instances.append(current)
+                    counted = False
+                else:
+                    children = self.pruning.prune(current, self.prune_stats)[0]
+                if current.get("componentId") in self.master_nodes:
+                    masters[current["componentId"]] = self.master_nodes[current["componentId"]]
+            # В обратном порядке - прямой порядок обхода, как у анализа
+            for child in reversed(children):
+                stack.append((child, depth + 1, counted))
+        
+        for master in masters.values():
+            stack = [(master, 0)]
+            while stack:
+                current, depth = stack.pop()
+                if depth > max_depth:
+                    max_depth = depth
+                stack.extend((child, depth + 1) for child in current.get("children") or ())
+        return size, max_depth, instances, masters
+    
+    def _analyze_uncounted(self, node: Dict[str, Any], parent_id: str) -> Dict[str, Any]:
+        """
+        Анализ ребенка корня, отсеченные ноды которого уже учел _measure_subtree
+        """
+        saved, self.prune_stats = self.prune_stats, None
+        try:
+            return self._analyze_element_completely(node, parent_id, 1)
+        finally:
+            self.prune_stats = saved
+    
+    def _prescan_children(self, root_children, root_analysis: Dict[str, Any]):
+        """
+        Ленивый режим: вместо анализа детей корня - быстрый предварительный проход по каждому
+        Размер поддерева известен заранее, поэтому номер первого элемента (и все ID) совпадают
+        с полным анализом; дети корня становятся прокси LazyElement. Мастера компонентов
+        небольшие и нужны любому фрейму - они анализируются сразу
+        """
+        parent_id = root_analysis["id"]
+        instances = []  # Экземпляры, которые станут ссылками, в порядке анализа
+        for child in root_children:
+            summary = self._prescan_subtree(child, instances)
+            start = self.element_counter + 1
+            self.element_counter += summary["total_elements"]
+            root_analysis["children"].append(LazyElement(self, child, parent_id, start, summary))
+        
+        for node in instances:
+            master = self.components.get(node["componentId"])
+            if master is None:
+                master = self._analyze_component(node["componentId"])
+            master["component_info"]["instances"] += 1
+            self.instance_elements += master["component_info"]["elements"] - 1
+        self._resolve_instances()  # Экземпляры, вложенные в сами мастера
+    
+    def _prescan_subtree(self, node: Dict[str, Any], instances: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Предварительный проход ленивого режима: без построения элементов считает размер
+        поддерева, типы и глубину, а дизайн-токены собирает по тем же сырым полям, что
+        _extract_complete_styles (цвета и отступы - и внутри экземпляров: там бывают переопределения)
+        Экземпляры, которые станут ссылками на мастер, добавляются в instances
+        """
+        tokens = self.raw_tokens
+        type_counts = {}
+        size = 0
+        element_count = 0  # Детей-элементов у корня поддерева (у экземпляра-ссылки их нет)
+        stack = [(node, 1, True)]  # (нода, глубина, станет ли нода элементом)
+        while stack:
+            current, depth, counted = stack.pop()
+            get = current.get
+            if counted:
+                size += 1
+                node_type = get("type", "")
+                type_counts[node_type] = type_counts.get(node_type, 0) + 1
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                if self._component_master(current) is not None:
+                    instances.append(current)
+                    counted = False
+                    children = get("children")
+                else:
+                    children = self.pruning.prune(current, self.prune_stats)[0]
+                    if current is node:
+                        element_count = len(children)
+            else:
+                # Внутри экземпляра - отсечение как у мастера (отсеченное в мастере уже посчитано)
+                children = self.pruning.prune(current)[0]
+            
+            background = self._extract_color(get("fills"))
+            if background:
+                tokens["colors"].add(background)
+            border = self._extract_color(get("strokes"))
+            if border:
+                tokens["colors"].add(border)
+            if get("cornerRadius", 0) > 0:
+                tokens["border_radius"].add(current["cornerRadius"])
+            if get("itemSpacing", 0) > 0:
+                tokens["spacing"].add(current["itemSpacing"])
+            if counted and get("type") == "TEXT":
+                # Типографика внутри экземпляров учитывается по мастеру (см. _weight_component_typography)
+                self._extract_complete_typography(current, background)
+            
+            if children:
+                stack.extend((child, depth + 1, counted) for child in reversed(children))
+        
+        for node_type, count in type_counts.items():
+            self.type_counts[node_type] = self.type_counts.get(node_type, 0) + count
+        return {"total_elements": size, "element_count": element_count, "type_counts": type_counts}
+    
+    def materialize(self, node: Dict[str, Any], parent_id: str, start: int) -> Dict[str, Any]:
+        """
+        Анализирует поддерево, отложенное ленивым режимом (см. lazy_tree.LazyElement)
+        Нумерация идет с заранее известного номера start, поэтому ID те же, что при полном
+        анализе; статистику и токены уже собрал предварительный проход - они не меняются
+        """
+        saved = (self.element_counter, self.type_counts, self.max_depth, self.instance_elements, self.log_depth,
+                 self.prune_stats)
+        self.element_counter, self.type_counts, self.max_depth, self.log_depth = start - 1, {}, 0, -1
+        self.prune_stats = None  # Отсеченное тоже учел предварительный проход
+        try:
+            element = self._analyze_element_completely(node, parent_id, 1)
+            self._resolve_instances(count=False)
+        finally:
+            (self.element_counter, self.type_counts, self.max_depth, self.instance_elements, self.log_depth,
+             self.prune_stats) = saved
+        return element
+    
+    def _merge_worker_result(self, result: Dict[str, Any], instances: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Вливает результат анализа поддерева из процесса пула в общий анализ
+        instances: сырые экземпляры компонентов поддерева в порядке обхода (см. _measure_subtree)
+        """
+        # Лог воркера выводим здесь, по порядку детей (как при последовательном обходе)
+        if result["log"]:
+            self.log(result["log"].rstrip("\n"))
+        
+        # Номера стилей воркера локальные - переводим их в общую таблицу стилей
+        style_ids = [self.style_table.intern_record(record) for record in result["styles"]]
+        
+        element = result["element"]
+        instances = iter(instances)
+        stack = [element]
+        while stack:
+            current = stack.pop()
+            current["style_id"] = style_ids[current["style_id"]]
+            current["styles"] = self.style_table[current["style_id"]]
+            self._count_element(current)
+            if "component_id" in current:
+                # Переопределения экземпляров считаются после обхода - в основном процессе
+                self.pending_instances.append((current, next(instances)))
+            stack.extend(reversed(current["children"]))
+        
+        tokens = self.raw_tokens
+        worker_tokens = result["design_tokens"]
+        tokens["colors"].update(worker_tokens["colors"])
+        tokens["spacing"].update(worker_tokens["spacing"])
+        tokens["border_radius"].update(worker_tokens["border_radius"])
+        tokens["typography"].merge(worker_tokens["typography"])
+        return element
+    
+    def _load_cached_subtree(self, subtree_hash: str, instances: List[Dict[str, Any]]):
+        """
+        Поддерево из кэша инкрементальной обработки или None
+        Какие экземпляры станут ссылками, зависит и от других фреймов (мастером может быть
+        первый экземпляр), поэтому кэш годится, только если ссылками стали те же экземпляры
+        """
+        cached = self.incremental.load_subtree(subtree_hash)
+        if cached is None or not self.resolve_components:
+            return cached
+        resolved = [element.get("original_id") for element in self.iter_elements(cached) if "component_id" in element]
+        return cached if resolved == [node.get("id") for node in instances] else None
+    
+    def _reuse_analyzed_subtree(self, element: Dict[str, Any], parent_id: str,
+                                instances: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        Встраивает ранее проанализированное поддерево в текущий анализ:
+        заново нумерует ID (в том же порядке, что и обычный анализ) и
+        добавляет его значения в общие дизайн-токены
+        instances: сырые экземпляры компонентов поддерева (переопределения считаются заново)
+        """
+        instances = iter(instances)
+        stack = [(element, parent_id)]
+        while stack:
+            current, current_parent = stack.pop()
+            self.element_counter += 1
+            current["id"] = f"{current_parent}-{self.element_counter}"
+            # style_id из кэша относится к прошлому запуску - интернируем запись заново
+            current["style_id"] = self.style_table.intern_record(current["styles"])
+            current["styles"] = self.style_table[current["style_id"]]
+            self._count_element(current)
+            self._replay_design_tokens(current)
+            if "component_id" in current:
+                current["overrides"] = []
+                self.pending_instances.append((current, next(instances)))
+            
+            # В обратном порядке, чтобы первым со стека снялся первый ребенок
+            for child in reversed(current.get("children", [])):
+                stack.append((child, current["id"]))
+        
+        return element
+    
+    def _replay_design_tokens(self, element: Dict[str, Any]):
+        """
+        Добавляет в дизайн-токены те же значения, что собрал бы _extract_complete_styles
+        """
+        tokens = self.raw_tokens
+        styles = element.get("styles", {})
+        border = styles.get("border", {})
+        
+        if styles.get("background"):
+            tokens["colors"].add(styles["background"])
+        if border.get("color"):
+            tokens["colors"].add(border["color"])
+        if border.get("radius", 0) > 0:
+            tokens["border_radius"].add(border["radius"])
+        if element.get("layout", {}).get("spacing", 0) > 0:
+            tokens["spacing"].add(element["layout"]["spacing"])
+        
+        tokens["typography"].add(styles.get("typography", {}), element.get("original_id"))
+    
     def _analyze_element_completely(self, node: Dict[str, Any], element_id: str, depth: int) -> Dict[str, Any]:
         """
-        Рекурсивно анализирует элемент и всех его детей
+        Анализирует элемент и всех его детей
+        Обход итеративный (явный стек вместо рекурсии): глубина дерева не ограничена,
+        поддеревья не обрезаются, а порядок нумерации ID такой же, как при рекурсии
         node: данные элемента от Figma API
-        element_id: уникальный ID для отслеживания
-        depth: глубина вложенности (для отступов и защиты от бесконечной рекурсии)
+        element_id: уникальный ID родителя для построения ID элементов
+        depth: глубина вложенности корня обхода
         """
-        # Защита от бесконечной рекурсии (максимум 20 уровней)
-        if depth > 20:
-            return {"error": "max_depth_exceeded"}
+        root_data = None
+        # (нода Figma, ID родителя, глубина, список детей родителя)
+        stack = [(node, element_id, depth, None)]
+        
+        while stack:
+            current, parent_id, current_depth, siblings = stack.pop()
+            instance = self._component_master(current) is not None
+            # Экземпляр сравнивается с мастером целиком, остальные ноды - после отсечения
+            children, collapsed = (current.get("children"), 0) if instance else self.pruning.prune(current, self.prune_stats)
+            element_data = self._build_element(current, parent_id, current_depth, children)
+            if collapsed:
+                element_data["collapsed"] = collapsed  # Иконка: столько нод свернуто в этот лист
+            
+            if siblings is None:
+                root_data = element_data
+            else:
+                siblings.append(element_data)
+            
+            # Детей кладем в обратном порядке, чтобы первым со стека снялся первый ребенок
+            # (сохраняем ПОЛНУЮ вложенность - каждый ребенок добавится в свой родительский список)
+            if instance:
+                # Экземпляр компонента: дети не анализируются, элемент ссылается на мастер
+                element_data["component_id"] = current["componentId"]
+                element_data["overrides"] = []
+                self.pending_instances.append((element_data, current))
+            elif children:
+                own_id = element_data["id"]
+                own_children = element_data["children"]
+                for child in reversed(children):
+                    stack.append((child, own_id, current_depth + 1, own_children))
         
+        return root_data
+    
+    def _build_element(self, node: Dict[str, Any], parent_id: str, depth: int,
+                       children: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Строит данные одного элемента (без детей - их добавляет обход)
+        children: дети ноды, оставшиеся после отсечения (по ним восстанавливается раскладка)
+        """
         # Увеличиваем счетчик и создаем номер элемента
         self.element_counter += 1
         element_number = self.element_counter
         
-        # Получаем базовые геометрические данные
-        bounding_box = node.get("absoluteBoundingBox", {})
+        get = node.get  # Локальная ссылка - метод вызывается много раз на каждую ноду
         
-        # Извлекаем все стили элемента
-        styles = self._extract_complete_styles(node)
+        # Получаем базовые геометрические данные
+        bounding_box = get("absoluteBoundingBox") or {}
+        style_id = self._intern_styles(node)
         
         # Создаем структуру данных для элемента
         element_data = {
-            "id": f"{element_id}-{element_number}",  # Уникальный ID
-            "original_id": node.get("id", ""),       # Оригинальный ID из Figma
-            "name": node.get("name", ""),            # Имя элемента
-            "type": node.get("type", ""),            # Тип (FRAME, TEXT, RECTANGLE и т.д.)
+            "id": f"{parent_id}-{element_number}",   # Уникальный ID
+            "original_id": get("id", ""),            # Оригинальный ID из Figma
+            "name": get("name", ""),                 # Имя элемента
+            "type": get("type", ""),                 # Тип (FRAME, TEXT, RECTANGLE и т.д.)
             "depth": depth,                          # Уровень вложенности
             "size": {                                # Размеры
                 "width": bounding_box.get("width", 0),
@@ -99,38 +689,350 @@ class DeepFigmaAnalyzer:
                 "y": bounding_box.get("y", 0)
             },
             "layout": {                              # Настройки лайаута
-                "mode": node.get("layoutMode", "NONE"),  # FLEX, GRID и т.д.
-                "spacing": node.get("itemSpacing", 0),   # Расстояние между элементами
+                "mode": get("layoutMode", "NONE"),   # FLEX, GRID и т.д.
+                "spacing": get("itemSpacing", 0),    # Расстояние между элементами
                 "padding": {                         # Внутренние отступы
-                    "left": node.get("paddingLeft", 0),
-                    "right": node.get("paddingRight", 0),
-                    "top": node.get("paddingTop", 0),
-                    "bottom": node.get("paddingBottom", 0)
+                    "left": get("paddingLeft", 0),
+                    "right": get("paddingRight", 0),
+                    "top": get("paddingTop", 0),
+                    "bottom": get("paddingBottom", 0)
                 },
-                "constraints": node.get("constraints", {})  # Ограничения позиционирования
+                "constraints": get("constraints", {})  # Ограничения позиционирования
             },
-            "styles": styles,                        # Все стили элемента
+            "styles": self.style_table[style_id],   # Все стили элемента (общая запись)
+            "style_id": style_id,                    # Номер записи в таблице стилей
             "content": self._extract_complete_content(node),  # Тексты и контент
-            "effects": self._extract_effects(node),  # Тени, блюры и т.д.
-            "visibility": node.get("visible", True), # Видимость элемента
-            "locked": node.get("locked", False),     # Заблокирован ли элемент
+            "effects": self._extract_effects(node) if get("effects") else [],  # Тени, блюры и т.д.
+            "visibility": get("visible", True),      # Видимость элемента
+            "locked": get("locked", False),          # Заблокирован ли элемент
             "children": []                           # Дочерние элементы
         }
         
+        # Для фреймов без auto-layout - раскладка, восстановленная по координатам детей
+        inferred = self._infer_layout(node, children)
+        if inferred is not None:
+            element_data["layout"]["inferred"] = inferred
+        
+        self._count_element(element_data)
+        
         # Логируем анализ (только первые 3 уровня для читаемости)
-        if depth <= 3:
+        if depth <= self.log_depth:
             indent = "  " * depth  # Создаем отступы для дерева
-            print(f"{indent}📦 {element_data['name']} ({element_data['type']}) - {element_data['size']['width']}×{element_data['size']['height']}")
-        
-        # РЕКУРСИВНЫЙ АНАЛИЗ ДЕТЕЙ - сохраняем полную вложенность!
-        children = node.get("children", [])
-        for i, child in enumerate(children):
-            # Рекурсивно анализируем каждого ребенка
-            child_analysis = self._analyze_element_completely(child, f"{element_id}-{element_number}", depth + 1)
-            element_data["children"].append(child_analysis)
+            self.log(f"{indent}📦 {element_data['name']} ({element_data['type']}) - {element_data['size']['width']}×{element_data['size']['height']}")
         
         return element_data
     
+    def _analyze_into_table(self, node: Dict[str, Any], parent_row: int, depth: int) -> int:
+        """
+        Тот же обход, что _analyze_element_completely, но элементы пишутся строками в NodeTable
+        Возвращает номер строки корня обхода
+        """
+        table = self.node_table
+        type_counts = self.type_counts
+        root_row = None
+        stack = [(node, parent_row, depth)]
+        
+        while stack:
+            current, parent, current_depth = stack.pop()
+            get = current.get
+            self.element_counter += 1
+            instance = self._component_master(current) is not None
+            children, collapsed = (get("children"), 0) if instance else self.pruning.prune(current, self.prune_stats)
+            
+            # Одинаковые стили, лайауты и эффекты хранятся один раз
+            style_id = self._intern_styles(current)
+            
+            layout_key = (get("layoutMode", "NONE"), get("itemSpacing", 0), get("paddingLeft", 0),
+                          get("paddingRight", 0), get("paddingTop", 0), get("paddingBottom", 0),
+                          repr(get("constraints", {})))
+            inferred = self._infer_layout(current, children)
+            if inferred is not None:
+                # Восстановленная раскладка своя у каждого фрейма - такой лайаут не общий
+                layout_key = ("inferred", self.element_counter)
+            layout_id = table.layouts.ids.get(layout_key)
+            if layout_id is None:
+                layout = {
+                    "mode": get("layoutMode", "NONE"),
+                    "spacing": get("itemSpacing", 0),
+                    "padding": {"left": get("paddingLeft", 0), "right": get("paddingRight", 0),
+                                "top": get("paddingTop", 0), "bottom": get("paddingBottom", 0)},
+                    "constraints": get("constraints", {})
+                }
+                if inferred is not None:
+                    layout["inferred"] = inferred
+                layout_id = table.layouts.intern(layout_key, layout)
+            
+            effects = get("effects")
+            effects_id = table.effect_lists.intern(repr(effects), self._extract_effects(current)) if effects else 0
+            
+            row = table.add(current, parent, current_depth, self.element_counter, style_id, layout_id, effects_id)
+            if root_row is None:
+                root_row = row
+            if collapsed:
+                table.collapsed[row] = collapsed
+            
+            node_type = get("type", "")
+            type_counts[node_type] = type_counts.get(node_type, 0) + 1
+            if current_depth > self.max_depth:
+                self.max_depth = current_depth
+            
+            # Логируем анализ (только первые 3 уровня для читаемости)
+            if current_depth <= self.log_depth:
+                bounding_box = get("absoluteBoundingBox") or {}
+                self.log(f"{'  ' * current_depth}📦 {get('name', '')} ({node_type}) - {bounding_box.get('width', 0)}×{bounding_box.get('height', 0)}")
+            
+            if instance:
+                self.pending_instances.append((row, current))  # Экземпляр - ссылка на мастер
+            elif children:
+                for child in reversed(children):
+                    stack.append((child, row, current_depth + 1))
+        
+        return root_row
+    
+    def _infer_layout(self, node: Dict[str, Any], children: List[Dict[str, Any]] = None):
+        """
+        Восстановленная раскладка детей (см. layout_inference.infer_layout) или None:
+        только для нод без auto-layout, у которых хотя бы два ребенка
+        children: дети после отсечения (по умолчанию - все дети ноды)
+        """
+        if not self.layout_inference or node.get("layoutMode", "NONE") != "NONE":
+            return None
+        if children is None:
+            children = node.get("children")
+        if not children or len(children) < 2:
+            return None
+        return infer_layout(node, children)
+    
+    def _infer_root_layout(self, target_document: Dict[str, Any], root_analysis):
+        """
+        Восстанавливает раскладку корня по уже проанализированным детям
+        (в потоковом режиме сырых детей корня к этому моменту уже нет)
+        """
+        children = [{"id": child["original_id"], "visible": child["visibility"],
+                     "absoluteBoundingBox": {**child["position"], **child["size"]}}
+                    for child in root_analysis["children"]]
+        inferred = self._infer_layout({**target_document, "children": children})
+        if inferred is None:
+            return
+        
+        if self.node_table is not None:
+            table = self.node_table
+            row = root_analysis.row
+            layout = dict(table.layouts.values[table.layout[row]], inferred=inferred)
+            table.layout[row] = table.layouts.intern(("inferred", row), layout)
+        else:
+            root_analysis["layout"]["inferred"] = inferred
+    
+    def _component_master(self, node: Dict[str, Any]):
+        """
+        Сырой мастер, на который можно сослаться вместо анализа детей экземпляра, или None
+        (не экземпляр, нет детей, структура разошлась с мастером или разрешение выключено)
+        Мастер без ноды COMPONENT в ответе - первый встреченный экземпляр компонента
+        """
+        if not self.resolve_components or node.get("type") != "INSTANCE" or not node.get("children"):
+            return None
+        component_id = node.get("componentId")
+        if not component_id:
+            return None
+        master = self.master_nodes.get(component_id)
+        if master is None:
+            self.master_nodes[component_id] = node
+            return node
+        return master if master is node or same_structure(master, node) else None
+    
+    def _resolve_instances(self, count: bool = True):
+        """
+        Дорабатывает экземпляры компонентов после обхода: мастер каждого компонента
+        анализируется один раз (в порядке первой ссылки), экземплярам - переопределения
+        Во всех режимах (последовательный, параллельный, из кэша) экземпляры приходят
+        в одном порядке, поэтому и таблица стилей, и результат одинаковые
+        count: учитывать экземпляры в component_info (ленивый режим учел их предварительным проходом)
+        """
+        index = 0
+        while index < len(self.pending_instances):  # Мастера добавляют свои вложенные экземпляры
+            target, node = self.pending_instances[index]
+            index += 1
+            component_id = node["componentId"]
+            master = self.components.get(component_id)
+            if master is None:
+                master = self._analyze_component(component_id)
+            if count:
+                master["component_info"]["instances"] += 1
+            
+            overrides = self._instance_overrides(node, self.master_nodes[component_id], master)
+            if isinstance(target, int):
+                self.node_table.instances[target] = {"component_id": component_id, "overrides": overrides}
+            else:
+                target["overrides"] = overrides
+        self.pending_instances = []
+    
+    def _weight_component_typography(self):
+        """
+        Стили текста мастера используются в каждом экземпляре - учитываем их частоту
+        """
+        typography = self.raw_tokens["typography"]
+        for master in self.components.values():
+            extra = master["component_info"]["instances"] - 1
+            if extra > 0:
+                for element in self.iter_elements(master):
+                    typography.add(element["styles"].get("typography", {}), count=extra)
+    
+    def _analyze_component(self, component_id: str) -> Dict[str, Any]:
+        """
+        Анализирует мастер компонента один раз: элементы мастера нумеруются отдельно
+        (ID вида component-<ID компонента>-1-...) и не входят в статистику дерева макета
+        """
+        master_node = self.master_nodes[component_id]
+        meta = self.component_meta.get(component_id, {})
+        
+        saved = (self.element_counter, self.type_counts, self.max_depth, self.element_index, self.log_depth, self.pruning)
+        self.element_counter, self.type_counts, self.max_depth, self.element_index, self.log_depth = 0, {}, 0, None, -1
+        self.pruning = self.master_pruning
+        try:
+            # Мастер, взятый из первого экземпляра, анализируется как компонент, а не как ссылка на себя
+            master = self._analyze_element_completely(dict(master_node, type="COMPONENT"),
+                                                      f"component-{component_id}", 0)
+            elements = self.element_counter
+        finally:
+            self.element_counter, self.type_counts, self.max_depth, self.element_index, self.log_depth, self.pruning = saved
+        
+        master["component_info"] = {
+            "id": component_id,
+            "key": meta.get("key", ""),
+            "name": meta.get("name") or master_node.get("name", ""),
+            "description": meta.get("description", ""),
+            "source": "component" if master_node.get("type") == "COMPONENT" else "instance",
+            "elements": elements,   # Элементов в мастере
+            "instances": 0          # Экземпляров, ссылающихся на мастер
+        }
+        self.components[component_id] = master
+        return master
+    
+    def _instance_overrides(self, node: Dict[str, Any], master_node: Dict[str, Any],
+                            master: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Переопределения экземпляра: потомки, которые отличаются от соответствующих элементов
+        мастера (текст, видимость, стили, эффекты, лайаут, размер, смещение внутри экземпляра)
+        Структура уже совпадает с мастером (см. same_structure) - идем по трем деревьям параллельно
+        """
+        box = node.get("absoluteBoundingBox") or {}
+        master_box = master_node.get("absoluteBoundingBox") or {}
+        offset = (box.get("x", 0) - master_box.get("x", 0), box.get("y", 0) - master_box.get("y", 0))
+        
+        overrides = []
+        stack = list(reversed(self._matched_children(node, master_node, master)))
+        while stack:
+            instance_child, master_child, element = stack.pop()
+            self.instance_elements += 1
+            changes = self._override_changes(instance_child, master_child, element, offset)
+            if changes:
+                overrides.append({"id": element["id"], "name": element["name"], **changes})
+            stack.extend(reversed(self._matched_children(instance_child, master_child, element)))
+        return overrides
+    
+    def _matched_children(self, node: Dict[str, Any], master_node: Dict[str, Any],
+                          element: Dict[str, Any]) -> List[tuple]:
+        """
+        Тройки (ребенок экземпляра, ребенок мастера, элемент мастера) - только для детей,
+        которые в мастере пережили отсечение (у элемента мастера есть только они)
+        Отсечение - политикой мастеров: скрытый в мастере ребенок сравнивается с экземпляром
+        """
+        pairs = zip(node.get("children") or [], master_node.get("children") or [])
+        if self.master_pruning.enabled:
+            kept = {id(child) for child in self.master_pruning.prune(master_node, None)[0]}
+            pairs = [(instance_child, master_child) for instance_child, master_child in pairs
+                     if id(master_child) in kept]
+        return [(instance_child, master_child, child_element)
+                for (instance_child, master_child), child_element in zip(pairs, element["children"])]
+    
+    def _override_changes(self, node: Dict[str, Any], master_node: Dict[str, Any],
+                          element: Dict[str, Any], offset: tuple) -> Dict[str, Any]:
+        """
+        Чем нода экземпляра отличается от ноды мастера (пустой словарь - ничем)
+        Стили сравниваются по сырым полям; отличающиеся разбираются и попадают в токены
+        """
+        get = node.get
+        master_get = master_node.get
+        changes = {}
+        
+        if get("name", "") != master_get("name", ""):
+            changes["renamed"] = get("name", "")
+        if get("characters", "") != master_get("characters", ""):
+            changes["text"] = get("characters", "")
+        if get("visible", True) != master_get("visible", True):
+            changes["visibility"] = get("visible", True)
+        if self._style_key(node) != self._style_key(master_node):
+            styles = self._extract_complete_styles(node)
+            changes["styles"] = {key: value for key, value in styles.items() if value != element["styles"].get(key)}
+        if get("effects") != master_get("effects"):
+            changes["effects"] = self._extract_effects(node)
+        
+        layout_fields = ("layoutMode", "itemSpacing", "paddingLeft", "paddingRight", "paddingTop", "paddingBottom")
+        if any(get(field) != master_get(field) for field in layout_fields):
+            changes["layout"] = {"mode": get("layoutMode", "NONE"), "spacing": get("itemSpacing", 0),
+                                 "padding": {"left": get("paddingLeft", 0), "right": get("paddingRight", 0),
+                                             "top": get("paddingTop", 0), "bottom": get("paddingBottom", 0)}}
+        
+        box = get("absoluteBoundingBox") or {}
+        master_box = master_get("absoluteBoundingBox") or {}
+        if (box.get("width", 0), box.get("height", 0)) != (master_box.get("width", 0), master_box.get("height", 0)):
+            changes["size"] = {"width": box.get("width", 0), "height": box.get("height", 0)}
+        # Позиция - относительно экземпляра (сдвиг всего экземпляра переопределением не считается)
+        if (abs(box.get("x", 0) - offset[0] - master_box.get("x", 0)) > 0.01
+                or abs(box.get("y", 0) - offset[1] - master_box.get("y", 0)) > 0.01):
+            changes["position"] = {"x": box.get("x", 0), "y": box.get("y", 0)}
+        return changes
+    
+    def _intern_styles(self, node: Dict[str, Any]) -> int:
+        """
+        style_id стилей ноды: новая комбинация стилей разбирается полностью (и собирает
+        дизайн-токены), повторная - это поиск в словаре по ключу сырых полей
+        """
+        style_key = self._style_key(node)
+        style_id = self.style_table.lookup(style_key)
+        if style_id is None:
+            return self.style_table.add(style_key, self._extract_complete_styles(node))
+        
+        # Повтор - цвета и скругления уже в токенах, добавляем то, что зависит не только от стиля
+        tokens = self.raw_tokens
+        spacing = node.get("itemSpacing", 0)
+        if spacing > 0:
+            tokens["spacing"].add(spacing)
+        tokens["typography"].add(self.style_table[style_id]["typography"], node.get("id"))
+        return style_id
+    
+    def _style_key(self, node: Dict[str, Any]) -> tuple:
+        """
+        Ключ интернирования стилей: все поля ноды, от которых зависит _extract_complete_styles
+        """
+        get = node.get
+        is_text = get("type") == "TEXT"
+        return (is_text, repr(get("fills", [])), repr(get("strokes", [])), get("cornerRadius", 0),
+                get("opacity", 1), get("blendMode", "PASS_THROUGH"), repr(get("style", {})) if is_text else None)
+    
+    def _count_element(self, element: Dict[str, Any]):
+        """
+        Учитывает элемент в статистике (и в плоском индексе, если он включен)
+        """
+        element_type = element["type"]
+        self.type_counts[element_type] = self.type_counts.get(element_type, 0) + 1
+        if element["depth"] > self.max_depth:
+            self.max_depth = element["depth"]
+        if self.element_index is not None:
+            self.element_index[element["id"]] = element
+    
+    @staticmethod
+    def iter_elements(element: Dict[str, Any]):
+        """
+        Плоский обход дерева элементов сверху вниз (без копирования)
+        Замена прежнему списку all_elements там, где нужен плоский вид
+        """
+        stack = [element]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(reversed(current.get("children", [])))
+    
     def _extract_complete_styles(self, node: Dict[str, Any]) -> Dict[str, Any]:
         """
         Извлекает все стили элемента: цвета, границы, типографику и т.д.
@@ -139,23 +1041,27 @@ class DeepFigmaAnalyzer:
         fills = node.get("fills", [])
         strokes = node.get("strokes", [])
         
+        # Детали заливок и обводок разбираем один раз: основной цвет - это цвет первой из них
+        fills_details = self._extract_fills_details(fills)
+        strokes_details = self._extract_strokes_details(strokes)
+        
         # Извлекаем основные стили
-        background_color = self._extract_color(fills)
-        border_color = self._extract_color(strokes)
+        background_color = fills_details[0]["color"] if fills_details else None
+        border_color = strokes_details[0]["color"] if strokes_details else None
         border_radius = node.get("cornerRadius", 0)
         
         # СОБИРАЕМ ДИЗАЙН-ТОКЕНЫ в общую копилку
         if background_color:
-            self.analysis_result["design_tokens"]["colors"].add(background_color)
+            self.raw_tokens["colors"].add(background_color)
         if border_color:
-            self.analysis_result["design_tokens"]["colors"].add(border_color)
+            self.raw_tokens["colors"].add(border_color)
         if border_radius > 0:
-            self.analysis_result["design_tokens"]["border_radius"].add(border_radius)
+            self.raw_tokens["border_radius"].add(border_radius)
         
         # Собираем значения отступов
         spacing = node.get("itemSpacing", 0)
         if spacing > 0:
-            self.analysis_result["design_tokens"]["spacing"].add(spacing)
+            self.raw_tokens["spacing"].add(spacing)
         
         # Возвращаем структурированные стили
         return {
@@ -167,14 +1073,15 @@ class DeepFigmaAnalyzer:
             },
             "opacity": node.get("opacity", 1),      # Прозрачность (0-1)
             "blend_mode": node.get("blendMode", "PASS_THROUGH"),  # Режим смешивания
-            "typography": self._extract_complete_typography(node),  # Шрифты и текст
-            "fills": self._extract_fills_details(fills),    # Детали заливок
-            "strokes": self._extract_strokes_details(strokes)  # Детали обводок
+            "typography": self._extract_complete_typography(node, background_color),  # Шрифты и текст
+            "fills": fills_details,      # Детали заливок
+            "strokes": strokes_details   # Детали обводок
         }
     
-    def _extract_complete_typography(self, node: Dict[str, Any]) -> Dict[str, Any]:
+    def _extract_complete_typography(self, node: Dict[str, Any], color: str = None) -> Dict[str, Any]:
         """
         Извлекает все параметры типографики для текстовых элементов
+        color: цвет первой заливки, если уже известен
         """
         # Работаем только с текстовыми элементами
         if node.get("type") != "TEXT":
@@ -182,8 +1089,8 @@ class DeepFigmaAnalyzer:
         
         # Получаем стили текста из Figma
         style = node.get("style", {})
-        fills = node.get("fills", [])
-        color = self._extract_color(fills)  # Цвет текста
+        if color is None:
+            color = self._extract_color(node.get("fills", []))  # Цвет текста
         
         # Собираем все параметры шрифта
         typo_data = {
@@ -199,9 +1106,8 @@ class DeepFigmaAnalyzer:
             "paragraph_spacing": style.get("paragraphSpacing", 0)   # Отступ между параграфами
         }
         
-        # Сохраняем в дизайн-токены если есть какие-то данные
-        if any(typo_data.values()):
-            self.analysis_result["design_tokens"]["typography"].append(typo_data)
+        # Учитываем стиль в реестре типографики (пустые стили реестр пропускает)
+        self.raw_tokens["typography"].add(typo_data, node.get("id"))
         
         return typo_data
     
@@ -303,29 +1209,25 @@ class DeepFigmaAnalyzer:
             return 0
         return strokes[0].get("strokeWeight", 1)  # Толщина обводки в пикселях
     
-    def _flatten_hierarchy(self, element: Dict[str, Any]):
-        """
-        Преобразует древовидную структуру в плоский список
-        Нужно для статистики и быстрого поиска элементов
-        """
-        # Создаем копию элемента без детей и добавляем в плоский список
-        element_flat = element.copy()
-        element_flat.pop("children", None)  # Удаляем детей из копии
-        self.analysis_result["all_elements"].append(element_flat)
-        
-        # Рекурсивно обрабатываем всех детей
-        for child in element.get("children", []):
-            self._flatten_hierarchy(child)
-    
     def _create_final_design_tokens(self):
         """
         Преобразует сырые токены (множества) в именованные словари
         Создает удобную структуру для использования в коде
         """
-        # Преобразуем множества в отсортированные списки
-        colors_list = sorted(list(self.analysis_result["design_tokens"]["colors"]))
-        spacing_list = sorted(list(self.analysis_result["design_tokens"]["spacing"]))
-        radius_list = sorted(list(self.analysis_result["design_tokens"]["border_radius"]))
+        raw_tokens = self.raw_tokens
+        if self.cluster_tokens:
+            # Близкие цвета - один токен (от самого большого кластера), отступы и скругления - по сетке
+            colors_list, colors_map = cluster_colors(raw_tokens["colors"], Config.COLOR_MERGE_DISTANCE)
+            spacing_list, spacing_map = snap_values(raw_tokens["spacing"], Config.SPACING_BASE)
+            radius_list, radius_map = snap_values(raw_tokens["border_radius"], Config.SPACING_BASE)
+        else:
+            # Преобразуем множества в отсортированные списки (каждое значение - свой токен)
+            colors_list = sorted(list(raw_tokens["colors"]))
+            spacing_list = sorted(list(raw_tokens["spacing"]))
+            radius_list = sorted(list(raw_tokens["border_radius"]))
+            colors_map = {value: value for value in colors_list}
+            spacing_map = {value: value for value in spacing_list}
+            radius_map = {value: value for value in radius_list}
         
         # СОЗДАЕМ ИМЕНОВАННЫЕ ТОКЕНЫ ЦВЕТОВ
         colors_dict = {}
@@ -354,26 +1256,18 @@ class DeepFigmaAnalyzer:
             radius_dict[name] = f"{radius}px"
         
         # ГРУППИРУЕМ ТИПОГРАФИКУ ПО РАЗМЕРАМ И ВЕСУ
+        # Стили идут от самого частого к редкому - токен получает самый используемый стиль
+        self.typography_registry = raw_tokens["typography"]
         typography_dict = {}
-        for typo in self.analysis_result["design_tokens"]["typography"]:
-            size = typo.get("font_size", 16)
-            weight = typo.get("font_weight", 400)
-            
-            # Классифицируем стили по размерам
-            if size >= 32:
-                key = "heading-1"      # Заголовок 1 уровня
-            elif size >= 24:
-                key = "heading-2"      # Заголовок 2 уровня
-            elif size >= 20:
-                key = "heading-3"      # Заголовок 3 уровня
-            elif size >= 18:
-                key = "heading-4"      # Заголовок 4 уровня
-            elif weight >= 600:
-                key = "bold"           # Жирный текст
-            else:
-                key = "body"           # Основной текст
-            
-            typography_dict[key] = typo
+        for typo in self.typography_registry.styles():
+            typography_dict.setdefault(typography_token_name(typo), typo)
+        
+        # Какой токен получило каждое сырое значение
+        self.analysis_result["token_map"] = {
+            "colors": token_map(colors_map, dict(zip(colors_list, colors_dict))),
+            "spacing": token_map(spacing_map, dict(zip(spacing_list, spacing_dict))),
+            "border_radius": token_map(radius_map, dict(zip(radius_list, radius_dict)))
+        }
         
         # ЗАМЕНЯЕМ СЫРЫЕ ДАННЫЕ НА СТРУКТУРИРОВАННЫЕ ТОКЕНЫ
         self.analysis_result["design_tokens"] = {
@@ -386,20 +1280,62 @@ class DeepFigmaAnalyzer:
     def _collect_statistics(self):
         """
         Собирает статистику по анализу: количество элементов, типы и т.д.
+        Счетчики уже накоплены во время обхода - здесь только итог
         """
-        elements = self.analysis_result["all_elements"]
-        
-        # СЧИТАЕМ ЭЛЕМЕНТЫ ПО ТИПАМ
-        type_counts = {}
-        for element in elements:
-            elem_type = element.get("type", "unknown")
-            type_counts[elem_type] = type_counts.get(elem_type, 0) + 1
-        
         # СОХРАНЯЕМ СТАТИСТИКУ
         self.analysis_result["statistics"] = {
-            "total_elements": len(elements),  # Общее количество элементов
-            "type_counts": type_counts,       # Количество по типам
+            "total_elements": self.element_counter,  # Общее количество элементов
+            "type_counts": self.type_counts,         # Количество по типам
             "total_colors": len(self.analysis_result["design_tokens"]["colors"]),
+            "raw_colors": len(self.analysis_result["token_map"]["colors"]),  # Разных цветов до объединения
             "total_typography_styles": len(self.analysis_result["design_tokens"]["typography"]),
-            "max_depth": max([elem.get("depth", 0) for elem in elements]) if elements else 0  # Максимальная вложенность
-        }
\ No newline at end of file
+            "unique_typography_styles": len(self.typography_registry),  # Разных стилей текста в макете
+            "unique_styles": len(self.style_table),  # Уникальных комбинаций стилей
+            "max_depth": self.max_depth,             # Максимальная вложенность
+            "repeat_groups": len(self.analysis_result["repeats"]),  # Групп повторяющихся поддеревьев
+            "repeated_elements": sum(group["elements"] * (group["count"] - 1)  # Элементов в копиях шаблонов
+                                     for group in self.analysis_result["repeats"]),
+            "components": len(self.components),      # Мастер-компонентов (каждый проанализирован один раз)
+            "component_instances": sum(master["component_info"]["instances"] for master in self.components.values()),
+            "component_elements": sum(master["component_info"]["elements"] for master in self.components.values()),
+            "instance_elements": self.instance_elements,  # Элементов экземпляров, замененных ссылками
+            "pruning": dict(self.pruning_stats)  # Нод, отсеченных до анализа (см. pruning.PruningPolicy)
+        }
+
+@contextlib.contextmanager
+def _gc_paused():
+    """
+    Отключает циклический сборщик мусора на время построения/распаковки больших деревьев:
+    элементы анализа не образуют циклов, а сборщик на миллионах новых словарей
+    запускается постоянно и съедает большую часть времени unpickle
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+def _analyze_subtree_in_worker(node: Dict[str, Any], parent_id: str, start: int,
+                               masters: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Анализ одного поддерева в процессе пула (см. DeepFigmaAnalyzer._analyze_children_in_parallel)
+    start: номер первого элемента поддерева в общей нумерации
+    masters: сырые мастера компонентов поддерева (мастера и переопределения анализирует основной процесс)
+    """
+    analyzer = DeepFigmaAnalyzer(compact=False, workers=1)
+    analyzer.element_counter = start - 1
+    analyzer.element_index = None  # Индекс строит основной процесс при слиянии
+    analyzer.master_nodes = masters
+    
+    log = io.StringIO()  # Лог отдаем основному процессу, чтобы вывод не перемешивался
+    with _gc_paused(), contextlib.redirect_stdout(log):
+        element = analyzer._analyze_element_completely(node, parent_id, 1)
+    
+    return {
+        "element": element,
+        "styles": analyzer.style_table.records,
+        "design_tokens": analyzer.raw_tokens,
+        "log": log.getvalue()
+    }
\ No newline at end of file
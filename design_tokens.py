@@ -0,0 +1,91 @@
+# design_tokens.py
+from typing import Dict, Any, List, Iterator
+
+class TypographyRegistry:
+    """
+    Реестр стилей типографики с частотой использования
+    Одинаковые стили (по нормализованному кортежу параметров) хранятся один раз
+    вместе с количеством использований и ID нод, поэтому память не растет
+    с количеством TEXT нод, а токены можно называть по популярности
+    """
+    
+    def __init__(self):
+        self.entries: Dict[tuple, Dict[str, Any]] = {}  # ключ стиля -> {"style", "count", "node_ids"}
+    
+    @staticmethod
+    def style_key(typography: Dict[str, Any]) -> tuple:
+        """
+        Нормализованный ключ стиля: все параметры шрифта в фиксированном порядке
+        (словари line_height/letter_spacing - через repr, чтобы ключ был хэшируемым)
+        """
+        get = typography.get
+        return (get("font_family"), get("font_size"), get("font_weight"),
+                repr(get("line_height")), repr(get("letter_spacing")), get("text_align"),
+                get("text_case"), get("text_decoration"), get("color"), get("paragraph_spacing"))
+    
+    def add(self, typography: Dict[str, Any], node_id: str = None, count: int = 1):
+        """
+        Учитывает использование стиля (пустые стили не учитываются)
+        """
+        if not typography or not any(typography.values()):
+            return
+        key = self.style_key(typography)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = {"style": typography, "count": 0, "node_ids": []}
+            self.entries[key] = entry
+        entry["count"] += count
+        if node_id is not None:
+            entry["node_ids"].append(node_id)
+    
+    def merge(self, other: "TypographyRegistry"):
+        """
+        Добавляет все использования из другого реестра
+        """
+        for key, other_entry in other.entries.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = {"style": other_entry["style"], "count": other_entry["count"],
+                                     "node_ids": list(other_entry["node_ids"])}
+            else:
+                entry["count"] += other_entry["count"]
+                entry["node_ids"].extend(other_entry["node_ids"])
+    
+    def ranked(self) -> List[Dict[str, Any]]:
+        """
+        Записи от самого частого стиля к самому редкому (при равенстве - в порядке появления)
+        """
+        return sorted(self.entries.values(), key=lambda entry: -entry["count"])
+    
+    def styles(self) -> List[Dict[str, Any]]:
+        """
+        Уникальные стили по убыванию частоты
+        """
+        return [entry["style"] for entry in self.ranked()]
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.entries.values())
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def typography_token_name(typography: Dict[str, Any]) -> str:
+    """
+    Имя токена по размеру и весу шрифта: heading-1..4, bold или body
+    """
+    size = typography.get("font_size", 16)
+    weight = typography.get("font_weight", 400)
+    
+    # Классифицируем стили по размерам
+    if size >= 32:
+        return "heading-1"      # Заголовок 1 уровня
+    elif size >= 24:
+        return "heading-2"      # Заголовок 2 уровня
+    elif size >= 20:
+        return "heading-3"      # Заголовок 3 уровня
+    elif size >= 18:
+        return "heading-4"      # Заголовок 4 уровня
+    elif weight >= 600:
+        return "bold"           # Жирный текст
+    else:
+        return "body"           # Основной текст
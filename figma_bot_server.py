@@ -3,9 +3,16 @@ from flask import Flask, request, jsonify
 import requests
 import json
 import os
-import subprocess
-import sys
+import threading
+import traceback
 from typing import Dict, Any, List
+from config import Config
+from figma_client import FigmaClient
+from deep_analyzer import DeepFigmaAnalyzer
+from frame_splitter import FrameSplitter
+from smart_prompt_generator import SmartPromptGenerator
+from incremental import IncrementalManifest
+from main import run_pipeline
 
 # Создаем Flask приложение - веб-сервер для API
 app = Flask(__name__)
@@ -21,45 +28,49 @@ class FigmaBotProcessor:
     """
     
     def __init__(self):
-        self.output_dir = "generated_code"
+        self.output_dir = Config.OUTPUT_DIR
+        
+        # Компоненты конвейера создаются один раз на процесс и переиспользуются всеми заданиями
+        # (анализатор не хранит состояние запуска, пул процессов анализа остается прогретым)
+        self.incremental = IncrementalManifest() if Config.INCREMENTAL_PROCESSING and not Config.LAZY_ANALYSIS else None
+        self.analyzer = DeepFigmaAnalyzer(self.incremental, keep_workers=True)
+        self.frame_splitter = FrameSplitter()
+        self.smart_generator = SmartPromptGenerator()
+        self.lock = threading.Lock()  # Одно задание за раз: общая выходная папка
+        self.last_run = None          # (анализ, фреймы) последнего задания - для разбора отложенных фреймов
     
     def process_figma_design(self, figma_token: str, file_key: str, node_id: str) -> Dict[str, Any]:
         """
         Основной метод - запускает процесс обработки Figma дизайна
         Возвращает структуру промптов для последовательной обработки
+        Конвейер выполняется прямо в процессе сервера теми же (прогретыми) компонентами
         """
         try:
-            print("🚀 Запускаем основной скрипт Figma-to-Code...")
+            print("🚀 Запускаем конвейер Figma-to-Code...")
             print(f"📊 Получены данные: {file_key}, нода: {node_id}")
             
-            # Создаем временный .env файл с переданными данными
-            # Это нужно потому что основной скрипт читает конфиг из .env
-            env_content = f"""FIGMA_ACCESS_TOKEN={figma_token}
-FIGMA_FILE_KEY={file_key}
-FIGMA_NODE_ID={node_id}
-"""
+            # Ход конвейера собираем для ответа через log (sys.stdout общий для всех потоков сервера)
+            script_lines = []
             
-            # Сохраняем временный файл с настройками
-            with open(".temp_bot_env", "w") as f:
-                f.write(env_content)
+            def log(message: str):
+                print(message)
+                script_lines.append(message)
             
-            # ЗАПУСКАЕМ ОСНОВНОЙ СКРИПТ КАК ПОДПРОЦЕСС
-            # Это позволяет изолировать выполнение и перехватывать вывод
-            result = subprocess.run([
-                sys.executable, "main.py"  # Запускаем main.py
-            ], 
-            capture_output=True,    # Перехватываем stdout и stderr
-            text=True,              # Возвращаем строки вместо bytes
-            cwd=os.getcwd(),        # Рабочая директория - текущая
-            env={**os.environ,      # Передаем переменные окружения + наши
-                 "FIGMA_ACCESS_TOKEN": figma_token, 
-                 "FIGMA_FILE_KEY": file_key, 
-                 "FIGMA_NODE_ID": node_id}
-            )
+            # Ленивый анализ: родительские фреймы не разбираются, пока пользователь их не выберет
+            frame_ids = set() if self.analyzer.lazy else None
+            # Задания пишут в одну выходную папку - выполняем их по одному
+            with self.lock:
+                # Клиент свой у каждого задания (токен, файл и нода пользователя), HTTP-сессия общая на процесс
+                # Создается под блокировкой: индекс дискового кэша читается после записи предыдущего задания
+                figma_client = FigmaClient(access_token=figma_token, file_key=file_key, node_id=node_id)
+                result = run_pipeline(figma_client, self.analyzer, self.frame_splitter,
+                                      self.smart_generator, self.incremental, frame_ids, log)
+                self.last_run = result
+            script_output = "\n".join(script_lines)
             
             # Проверяем успешность выполнения
-            if result.returncode == 0:
-                print("✅ Основной скрипт выполнен успешно")
+            if result is not None:
+                print("✅ Конвейер выполнен успешно")
                 
                 # Читаем сгенерированную структуру промптов
                 prompt_structure = self._read_generated_prompts()
@@ -69,11 +80,11 @@ FIGMA_NODE_ID={node_id}
                     "message": "Figma дизайн успешно обработан! Сгенерированы промпты для последовательной обработки.",
                     "prompt_structure": prompt_structure,
                     "available_frames": self._get_available_frames(),
-                    "script_output": result.stdout[:500] + "..." if len(result.stdout) > 500 else result.stdout
+                    "script_output": script_output[:500] + "..." if len(script_output) > 500 else script_output
                 }
             else:
-                # Если скрипт завершился с ошибкой
-                error_msg = f"Ошибка выполнения скрипта: {result.stderr}"
+                # Данные из Figma не получены
+                error_msg = f"Не удалось получить данные из Figma API: {script_output[-500:]}"
                 print(f"❌ {error_msg}")
                 return {
                     "success": False,
@@ -84,14 +95,11 @@ FIGMA_NODE_ID={node_id}
             # Обрабатываем любые исключения
             error_msg = f"Ошибка при обработке: {str(e)}"
             print(f"❌ {error_msg}")
+            traceback.print_exc()
             return {
                 "success": False, 
                 "error": error_msg
             }
-        finally:
-            # Удаляем временный файл в любом случае
-            if os.path.exists(".temp_bot_env"):
-                os.remove(".temp_bot_env")
     
     def _read_generated_prompts(self) -> Dict[str, Any]:
         """
@@ -120,40 +128,73 @@ FIGMA_NODE_ID={node_id}
             "parent_frames": []  # Список родительских фреймов
         }
         
-        # Добавляем родительские фреймы из папки parent_frames
-        parent_frames_dir = os.path.join(prompts_dir, "parent_frames")
-        if os.path.exists(parent_frames_dir):
-            for filename in os.listdir(parent_frames_dir):
-                # Ищем файлы промптов (заканчиваются на _prompt.txt)
-                if filename.endswith("_prompt.txt") and filename != "root_container_prompt.txt":
-                    # Извлекаем ID фрейма из имени файла
-                    frame_id = filename.replace("_prompt.txt", "").replace("root_frame_", "")
-                    structure["parent_frames"].append({
-                        "name": filename,
-                        "file_path": os.path.join(parent_frames_dir, filename),
-                        "description": f"Фрейм {frame_id}",
-                        "order": len(structure["parent_frames"]) + 3  # Порядок после корня и контейнера
-                    })
+        # Добавляем родительские фреймы (по индексу фреймов - в порядке макета)
+        for filename, path in self._frame_prompt_files():
+            # Извлекаем ID фрейма из имени файла
+            frame_id = filename.replace("_prompt.txt", "").replace("root_frame_", "")
+            structure["parent_frames"].append({
+                "name": filename,
+                "file_path": path,
+                "description": f"Фрейм {frame_id}",
+                "order": len(structure["parent_frames"]) + 3  # Порядок после корня и контейнера
+            })
         
         return structure
     
+    def _frame_prompt_files(self) -> List[tuple]:
+        """
+        Промпты родительских фреймов (имя файла, путь) без обхода папки промптов: по фреймам
+        последнего задания или (после перезапуска сервера) по индексу хранилища фреймов
+        Промпт отложенного фрейма появится при его выборе (см. ensure_frame_prompt)
+        """
+        prompts_dir = os.path.join(self.output_dir, "smart_prompts")
+        if self.last_run is not None:
+            frames = self.last_run[1]["parent_frames"]
+        else:
+            frames = [frame for frame in self.frame_splitter.store.frames() if frame["id"] != "root"]
+        files = []
+        for frame in frames:
+            relative_path = self.smart_generator.parent_frame_prompt_filename(frame)
+            path = os.path.join(prompts_dir, relative_path)
+            if frame.get("deferred") or os.path.exists(path):
+                files.append((os.path.basename(relative_path), path))
+        return files
+    
+    def ensure_frame_prompt(self, prompt_name: str) -> bool:
+        """
+        Ленивый анализ: выбранный отложенный фрейм анализируется, сохраняется и получает промпт
+        (вместе с частями, если он больше лимита). False - такого отложенного фрейма нет
+        """
+        with self.lock:
+            if self.last_run is None:
+                return False
+            analysis, frames_data = self.last_run
+            frame_info = next((frame for frame in frames_data["parent_frames"] if frame.get("deferred")
+                               and os.path.basename(self.smart_generator.parent_frame_prompt_filename(frame)) == prompt_name), None)
+            if frame_info is None:
+                return False
+            
+            print(f"🔍 Разбираем отложенный фрейм '{frame_info['name']}'...")
+            ready = {frame["id"] for frame in frames_data["parent_frames"] if not frame.get("deferred")}
+            self.frame_splitter.extract_parent_frame(analysis, frames_data, frame_info["original_id"])
+            for frame in frames_data["parent_frames"]:
+                if frame["id"] not in ready and not frame.get("deferred"):
+                    self.smart_generator.generate_frame_prompt(frame)
+            return True
+    
     def _get_available_frames(self) -> List[Dict[str, str]]:
         """
         Возвращает список доступных фреймов для выбора пользователем
         """
-        prompts_dir = os.path.join(self.output_dir, "smart_prompts", "parent_frames")
         frames = []
-        
-        if os.path.exists(prompts_dir):
-            for filename in os.listdir(prompts_dir):
-                if filename.endswith("_prompt.txt"):
-                    # Извлекаем информацию о фрейме из имени файла
-                    frame_id = filename.replace("_prompt.txt", "").replace("root_frame_", "")
-                    frames.append({
-                        "id": frame_id,
-                        "name": filename,
-                        "description": f"Фрейм {frame_id}"
-                    })
+        for filename, _ in self._frame_prompt_files():
+            # Извлекаем информацию о фрейме из имени файла
+            frame_id = filename.replace("_prompt.txt", "").replace("root_frame_", "")
+            frames.append({
+                "id": frame_id,
+                "name": filename,
+                "description": f"Фрейм {frame_id}"
+            })
         
         return frames
     
@@ -220,6 +261,9 @@ def process_figma():
         
         # ВЫЗЫВАЕМ ОСНОВНУЮ ФУНКЦИЮ ОБРАБОТКИ
         result = processor.process_figma_design(figma_token, file_key, node_id)
+        if result["success"]:
+            # Список фреймов этого задания (в ленивом режиме - и еще не разобранные)
+            user_sessions[user_id]["available_frames"] = result["available_frames"]
         
         # ФОРМИРУЕМ ОТВЕТ
         response_data = {
@@ -280,6 +324,10 @@ def get_next_prompt():
             next_prompt_name = selected_frame
             session["processed_prompts"].append(selected_frame)
         
+        # Ленивый анализ: выбранный фрейм еще не разобран - разбираем сейчас, его части пополняют список
+        if next_prompt_name and processor.ensure_frame_prompt(next_prompt_name):
+            session["available_frames"] = processor._get_available_frames()
+        
         # ВАЖНО: Получаем РЕАЛЬНОЕ содержимое промпта
         prompt_content = processor.get_prompt_content(next_prompt_name)
         
@@ -0,0 +1,226 @@
+# figma_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+from config import Config
+
+class FigmaResponseCache:
+    """
+    Персистентный кэш ответов Figma API на диске
+    Ключ - хэш от file key, эндпоинта, параметров (ID нод) и версии файла,
+    поэтому при изменении макета старые записи просто перестают совпадать
+    """
+    
+    INDEX_FILE = "index.json"
+    
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        # Папка кэша (по умолчанию внутри папки результатов)
+        self.cache_dir = cache_dir or Config.FIGMA_CACHE_DIR
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Ограничение размера кэша - при превышении удаляем самые старые записи (LRU)
+        self.max_bytes = max_bytes if max_bytes is not None else Config.FIGMA_CACHE_MAX_MB * 1024 * 1024
+        
+        self._lock = threading.Lock()  # Кэш может использоваться из нескольких потоков
+        self._index = self._load_index()
+        self._run_stats = {"hits": 0, "misses": 0}  # Счетчики текущего запуска
+        self._dirty = False  # Индекс изменен в памяти (чтения) и еще не записан на диск
+    
+    def _load_index(self) -> Dict[str, Any]:
+        """
+        Загружает индекс кэша: записи, проверки версий и счетчики
+        """
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print("⚠️  Индекс кэша Figma поврежден - начинаем с пустого кэша")
+        
+        return {
+            "entries": {},         # key -> {"size": байты, "last_access": время}
+            "versions": {},        # file key + токен -> {"version": ..., "checked_at": время}
+            "stats": {"hits": 0, "misses": 0, "evictions": 0}  # Счетчики за все запуски
+        }
+    
+    def _save_index(self):
+        """
+        Атомарно сохраняет индекс (через временный файл)
+        """
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, index_path)
+        self._dirty = False
+    
+    def flush(self):
+        """
+        Записывает индекс, если чтения изменили его в памяти (время доступа, счетчики)
+        get()/get_path() индекс не пишут - иначе каждый запрос переписывал бы весь index.json
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+    
+    @staticmethod
+    def make_key(file_key: str, endpoint: str, params: Dict[str, Any], version: str) -> str:
+        """
+        Строит ключ кэша из всего, что влияет на ответ API
+        ID нод сортируются, чтобы порядок в запросе не давал разные ключи
+        """
+        normalized = dict(params or {})
+        if "ids" in normalized:
+            normalized["ids"] = ",".join(sorted(str(normalized["ids"]).split(",")))
+        raw_key = json.dumps([file_key, endpoint, normalized, version], sort_keys=True)
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+    
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает закэшированный ответ или None (промах)
+        """
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            path = self._entry_path(key)
+            if entry is None or not os.path.exists(path):
+                self._index["entries"].pop(key, None)
+                self._count("misses")
+                return None
+            
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Битая запись - считаем промахом и удаляем
+                self._remove_entry(key)
+                self._count("misses")
+                return None
+            
+            # Обновляем время доступа для LRU
+            entry["last_access"] = time.time()
+            self._count("hits")
+            return data
+    
+    def get_path(self, key: str) -> Optional[str]:
+        """
+        Как get(), но возвращает путь к файлу записи без чтения в память
+        Нужно потоковому режиму - ответ парсится прямо с диска
+        """
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            path = self._entry_path(key)
+            if entry is None or not os.path.exists(path):
+                self._index["entries"].pop(key, None)
+                self._count("misses")
+                return None
+            
+            entry["last_access"] = time.time()
+            self._count("hits")
+            return path
+    
+    def _count(self, counter: str):
+        self._index["stats"][counter] += 1
+        self._run_stats[counter] += 1
+        self._dirty = True
+    
+    def put(self, key: str, data: Dict[str, Any]):
+        """
+        Сохраняет ответ в кэш и вытесняет старые записи при превышении лимита
+        """
+        with self._lock:
+            path = self._entry_path(key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            
+            self._index["entries"][key] = {
+                "size": os.path.getsize(path),
+                "last_access": time.time()
+            }
+            self._evict()
+            self._save_index()
+    
+    def put_file(self, key: str, src_path: str) -> str:
+        """
+        Переносит уже скачанный на диск ответ в кэш (без чтения в память)
+        Возвращает путь к записи кэша (или исходный путь, если ответ больше лимита кэша)
+        """
+        with self._lock:
+            if os.path.getsize(src_path) > self.max_bytes:
+                return src_path
+            
+            path = self._entry_path(key)
+            os.replace(src_path, path)
+            
+            self._index["entries"][key] = {
+                "size": os.path.getsize(path),
+                "last_access": time.time()
+            }
+            self._evict()
+            self._save_index()
+            return path
+    
+    def _evict(self):
+        """
+        LRU-вытеснение: удаляем давно не используемые записи, пока не влезем в лимит
+        """
+        entries = self._index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        if total <= self.max_bytes:
+            return
+        
+        # Самые старые по времени доступа - первые кандидаты на удаление
+        for key in sorted(entries, key=lambda k: entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["size"]
+            self._remove_entry(key)
+            self._index["stats"]["evictions"] += 1
+    
+    def _remove_entry(self, key: str):
+        self._index["entries"].pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+    
+    def get_known_version(self, version_key: str, max_age: float) -> Optional[str]:
+        """
+        Возвращает версию файла, если ее проверяли не позже чем max_age секунд назад
+        Позволяет вообще не ходить в сеть при частых повторных запусках
+        """
+        with self._lock:
+            record = self._index["versions"].get(version_key)
+            if record and max_age > 0 and time.time() - record["checked_at"] <= max_age:
+                return record["version"]
+            return None
+    
+    def remember_version(self, version_key: str, version: str):
+        """
+        Запоминает свежую версию файла и время проверки
+        """
+        with self._lock:
+            self._index["versions"][version_key] = {"version": version, "checked_at": time.time()}
+            self._save_index()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика кэша: попадания, промахи, вытеснения и текущий размер
+        """
+        with self._lock:
+            entries = self._index["entries"]
+            return {
+                **self._index["stats"],
+                "run_hits": self._run_stats["hits"],      # Попадания в этом запуске
+                "run_misses": self._run_stats["misses"],  # Промахи в этом запуске
+                "entries": len(entries),
+                "bytes": sum(entry["size"] for entry in entries.values())
+            }
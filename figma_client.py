@@ -1,8 +1,54 @@
 # figma_client.py
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
 import requests
 import json
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List
 from config import Config
+from figma_cache import FigmaResponseCache
+from figma_stream import FigmaNodeStream
+from frame_store import FILE_MODE
+from rate_limiter import TokenBucketRateLimiter
+
+# Общая HTTP-сессия для всех экземпляров FigmaClient
+# Живет все время работы процесса, поэтому TCP+TLS соединения переиспользуются
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session() -> requests.Session:
+    """
+    Возвращает общую сессию с пулом keep-alive соединений
+    Создается один раз на процесс (потокобезопасно)
+    """
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                session = requests.Session()
+                # Пул соединений: pool_maxsize - сколько соединений держим открытыми к одному хосту
+                adapter = HTTPAdapter(
+                    pool_connections=Config.FIGMA_HTTP_POOL_SIZE,
+                    pool_maxsize=Config.FIGMA_HTTP_POOL_SIZE
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                # Просим сжатый ответ и держим соединение открытым
+                session.headers.update({
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive"
+                })
+                _shared_session = session
+    return _shared_session
+
+# Общий ограничитель частоты запросов - лимиты Figma действуют на весь процесс
+_shared_rate_limiter = TokenBucketRateLimiter(Config.FIGMA_RATE_LIMIT, Config.FIGMA_RATE_BURST)
 
 class FigmaClient:
     """
@@ -10,11 +56,142 @@ class FigmaClient:
     Отвечает за получение данных из Figma
     """
     
-    def __init__(self):
-        # Инициализация с данными из конфига
-        self.access_token = Config.FIGMA_ACCESS_TOKEN
-        self.base_url = "https://api.figma.com/v1"  # Базовый URL Figma API
+    def __init__(self, session: requests.Session = None, cache: FigmaResponseCache = None,
+                 access_token: str = None, file_key: str = None, node_id: str = None):
+        # Инициализация с данными из конфига (или переданными явно - сервер обрабатывает
+        # запросы разных пользователей в одном процессе)
+        self.access_token = access_token or Config.FIGMA_ACCESS_TOKEN
+        self.file_key = file_key or Config.FIGMA_FILE_KEY
+        self.node_id = node_id or Config.FIGMA_NODE_ID
+        self.base_url = Config.FIGMA_API_BASE_URL.rstrip("/")  # Базовый URL Figma API (или мока)
         self.headers = {"X-FIGMA-TOKEN": self.access_token}  # Заголовки для авторизации
+        # Сессия с пулом соединений (по умолчанию - общая на весь процесс)
+        self.session = session or get_shared_session()
+        self.rate_limiter = _shared_rate_limiter  # Token bucket для всех запросов
+        
+        # Дисковый кэш ответов (можно отключить через FIGMA_CACHE_ENABLED=false)
+        if cache is None and Config.FIGMA_CACHE_ENABLED:
+            cache = FigmaResponseCache()
+        self.cache = cache
+        self._file_version = None  # Версия файла, проверенная в этом запуске
+        self.log = print  # Куда писать ход работы (run_pipeline подменяет на время запуска)
+    
+    def _get_json(self, endpoint: str, params: Dict[str, Any] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        GET запрос к Figma API с проверкой статуса и дисковым кэшем
+        Ошибки сети пробрасываются наверх (requests.exceptions.RequestException)
+        """
+        cache_key = self._cache_key(endpoint, params) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached  # Макет не менялся - сеть не нужна
+        
+        response = self._send(endpoint, params)
+        data = response.json()
+        
+        if cache_key:
+            self.cache.put(cache_key, data)
+        return data
+    
+    def _send(self, endpoint: str, params: Dict[str, Any] = None, stream: bool = False) -> requests.Response:
+        """
+        Отправляет GET запрос с ограничением частоты и повторами
+        429 - ждем сколько просит Retry-After (все потоки), 5xx и сетевые сбои -
+        экспоненциальная задержка. Остальные ошибки пробрасываются сразу
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                # Отправляем GET запрос к Figma API через общую сессию
+                response = self.session.get(
+                    f"{self.base_url}{endpoint}",
+                    params=params,
+                    headers=self.headers,               # Заголовки с токеном
+                    timeout=Config.FIGMA_HTTP_TIMEOUT,  # Таймаут из конфига
+                    stream=stream
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= Config.FIGMA_MAX_RETRIES:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+            
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt >= Config.FIGMA_MAX_RETRIES:
+                if stream and not response.ok:
+                    response.close()
+                response.raise_for_status()    # Проверяем статус ответа (если ошибка - исключение)
+                return response
+            
+            if response.status_code == 429:
+                # Figma говорит сколько ждать - останавливаем весь пул запросов
+                delay = self._retry_after(response) or self._backoff_delay(attempt)
+                self.log(f"⏳ Figma API: 429 Too Many Requests, ждем {delay:.1f} c")
+                self.rate_limiter.pause(delay)
+            else:
+                delay = self._backoff_delay(attempt)
+                self.log(f"⚠️  Figma API: {response.status_code}, повтор через {delay:.1f} c")
+                time.sleep(delay)
+            
+            response.close()
+            attempt += 1
+    
+    def _retry_after(self, response: requests.Response) -> float:
+        """
+        Значение заголовка Retry-After в секундах (None если его нет или он не число)
+        """
+        try:
+            return max(0.0, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return None
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Экспоненциальная задержка с небольшим случайным разбросом (jitter)
+        """
+        delay = Config.FIGMA_BACKOFF_BASE * (2 ** attempt)
+        return min(delay, Config.FIGMA_BACKOFF_MAX) * random.uniform(0.8, 1.2)
+    
+    def _cache_key(self, endpoint: str, params: Dict[str, Any] = None) -> str:
+        """
+        Ключ дискового кэша для запроса (None если кэш выключен или версия неизвестна)
+        """
+        if self.cache is None:
+            return None
+        version = self.get_file_version()
+        if not version:
+            return None
+        return self.cache.make_key(self.file_key, endpoint, params, version)
+    
+    def get_file_version(self) -> str:
+        """
+        Дешевая проверка свежести: узнаем версию файла без скачивания дерева
+        Запрос с depth=1 возвращает только страницы, но с полями version/lastModified
+        """
+        if self._file_version:
+            return self._file_version
+        
+        # Токен тоже входит в ключ - чужой токен не получит доступ к версии без запроса
+        token_hash = hashlib.sha256((self.access_token or "").encode("utf-8")).hexdigest()[:16]
+        version_key = f"{self.file_key}:{token_hash}"
+        version = self.cache.get_known_version(version_key, Config.FIGMA_CACHE_VERSION_TTL)
+        
+        if not version:
+            try:
+                meta = self._get_json(f"/files/{self.file_key}", {"depth": 1}, use_cache=False)
+            except requests.exceptions.RequestException as e:
+                self.log(f"⚠️  Не удалось проверить версию файла, кэш пропущен: {e}")
+                return None
+            # version меняется при каждом сохранении, lastModified - запасной вариант
+            version = meta.get("version") or meta.get("lastModified")
+            if version:
+                self.cache.remember_version(version_key, version)
+        
+        self._file_version = version
+        return version
     
     def get_file(self) -> Dict[str, Any]:
         """
@@ -22,51 +199,173 @@ class FigmaClient:
         Возвращает JSON со всем содержимым файла
         """
         try:
-            # Отправляем GET запрос к Figma API
-            response = requests.get(
-                f"{self.base_url}/files/{Config.FIGMA_FILE_KEY}",  # URL файла
-                headers=self.headers,      # Заголовки с токеном
-                timeout=30                 # Таймаут 30 секунд
-            )
-            response.raise_for_status()    # Проверяем статус ответа (если ошибка - исключение)
-            return response.json()         # Возвращаем JSON ответ
+            return self._get_json(f"/files/{self.file_key}")  # Возвращаем JSON ответ
         except requests.exceptions.RequestException as e:
             # Обрабатываем ошибки сети или API
-            print(f"❌ Ошибка при запросе к Figma API: {e}")
+            self.log(f"❌ Ошибка при запросе к Figma API: {e}")
             return {}  # Возвращаем пустой словарь при ошибке
     
-    def get_specific_node(self) -> Dict[str, Any]:
+    def get_specific_node(self, node_ids: List[str] = None, depth: int = None, geometry: str = None) -> Dict[str, Any]:
         """
-        Получаем конкретную ноду (элемент) по ID
+        Получаем конкретную ноду (элемент) по ID - или сразу несколько нод
         Полезно когда нужно анализировать не весь файл, а конкретный фрейм
+        node_ids: список ID нод (по умолчанию целевая нода клиента)
+        depth: глубина поддерева (None - все поддерево целиком)
+        geometry: "paths" чтобы получить геометрию векторов (по умолчанию не запрашиваем)
         """
         try:
-            # Запрос конкретной ноды по ID
-            response = requests.get(
-                f"{self.base_url}/files/{Config.FIGMA_FILE_KEY}/nodes?ids={Config.FIGMA_NODE_ID}",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            # Запрос нод по ID (большие списки разбиваются на пачки)
+            return self.get_nodes(node_ids or [self.node_id], depth, geometry)
         except requests.exceptions.RequestException as e:
-            print(f"❌ Ошибка при запросе конкретной ноды: {e}")
+            self.log(f"❌ Ошибка при запросе конкретной ноды: {e}")
             return {}
     
-    def get_full_structure(self) -> Dict[str, Any]:
+    def get_nodes(self, node_ids: List[str], depth: int = None, geometry: str = None) -> Dict[str, Any]:
+        """
+        Пакетная загрузка многих нод: ID объединяются в запросы /nodes?ids=a,b,c
+        с учетом лимита длины URL, пачки качаются параллельно (не больше
+        Config.FIGMA_MAX_CONCURRENCY одновременно). Результаты сливаются в один ответ
+        """
+        endpoint = f"/files/{self.file_key}/nodes"
+        # Убираем дубликаты, сохраняя порядок
+        unique_ids = list(dict.fromkeys(node_ids))
+        batches = self._chunk_node_ids(endpoint, unique_ids, depth, geometry)
+        
+        if len(batches) == 1:
+            responses = [self._get_json(endpoint, self._node_params(batches[0], depth, geometry))]
+        else:
+            self.log(f"📦 {len(unique_ids)} нод -> {len(batches)} запросов (параллельно до {Config.FIGMA_MAX_CONCURRENCY})")
+            # Версию файла для ключей кэша узнаем заранее, чтобы потоки не проверяли ее наперегонки
+            if self.cache is not None:
+                self.get_file_version()
+            with ThreadPoolExecutor(max_workers=Config.FIGMA_MAX_CONCURRENCY) as pool:
+                responses = list(pool.map(
+                    lambda batch: self._get_json(endpoint, self._node_params(batch, depth, geometry)),
+                    batches
+                ))
+        
+        # Сливаем ответы: общие поля (name, version...) из первого, ноды из всех
+        merged = {key: value for key, value in responses[0].items() if key != "nodes"}
+        merged["nodes"] = {}
+        for response in responses:
+            merged["nodes"].update(response.get("nodes") or {})
+        return merged
+    
+    def _chunk_node_ids(self, endpoint: str, node_ids: List[str], depth: int = None, geometry: str = None) -> List[List[str]]:
+        """
+        Разбивает список ID на пачки так, чтобы URL запроса не превышал лимит
+        """
+        # Длина URL без списка ID (базовый адрес + остальные параметры)
+        base_length = len(f"{self.base_url}{endpoint}?") + len(urlencode(self._node_params([], depth, geometry)))
+        budget = Config.FIGMA_MAX_URL_LENGTH - base_length
+        
+        batches = []
+        current = []
+        current_length = 0
+        for node_id in node_ids:
+            # ID в URL кодируется (":" -> "%3A"), запятая между ID - тоже "%2C"
+            encoded_length = len(urlencode({"": node_id})) - 1 + (3 if current else 0)
+            if current and (current_length + encoded_length > budget or len(current) >= Config.FIGMA_MAX_IDS_PER_REQUEST):
+                batches.append(current)
+                current = []
+                current_length = 0
+                encoded_length -= 3
+            current.append(node_id)
+            current_length += encoded_length
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _node_params(self, node_ids: List[str], depth: int = None, geometry: str = None) -> Dict[str, Any]:
+        """
+        Параметры запроса /nodes: скачиваем только то поддерево, которое анализируем
         """
-        Основной метод - получает полную структуру файла и конкретную ноду
+        params = {"ids": ",".join(node_ids)}
+        if depth is not None:
+            params["depth"] = depth
+        if geometry:
+            params["geometry"] = geometry
+        return params
+    
+    def download_specific_node(self, depth: int = None, geometry: str = None) -> str:
+        """
+        Потоково скачивает ответ /nodes на диск и возвращает путь к файлу
+        Тело ответа пишется кусками, поэтому в памяти не бывает целиком
+        """
+        endpoint = f"/files/{self.file_key}/nodes"
+        params = self._node_params([self.node_id], depth, geometry)
+        
+        # Макет не менялся - парсим прямо из файла кэша
+        cache_key = self._cache_key(endpoint, params)
+        if cache_key:
+            cached_path = self.cache.get_path(cache_key)
+            if cached_path:
+                return cached_path
+        
+        # Временный файл для ответа (spool)
+        spool_dir = os.path.join(Config.OUTPUT_DIR, ".figma_spool")
+        os.makedirs(spool_dir, exist_ok=True)
+        safe_node_id = self.node_id.replace(":", "-")
+        spool_path = os.path.join(spool_dir, f"{self.file_key}_{safe_node_id}.json")
+        
+        # Ответ пишется в уникальный временный файл и атомарно заменяет spool: одновременные
+        # загрузки той же ноды не пишут в один файл, а читатель не видит недописанный ответ
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.file_key}_{safe_node_id}.", suffix=".tmp", dir=spool_dir)
+        try:
+            # stream=True - requests не читает тело сразу, отдаем его кусками (gzip распаковывается на лету)
+            with os.fdopen(fd, "wb") as f, self._send(endpoint, params, stream=True) as response:
+                for chunk in response.iter_content(chunk_size=Config.FIGMA_STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, spool_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        if cache_key:
+            return self.cache.put_file(cache_key, spool_path)
+        return spool_path
+    
+    def get_full_structure(self, fetch_full_file: bool = None) -> Dict[str, Any]:
+        """
+        Основной метод - получает целевую ноду (и при необходимости полный файл)
         Возвращает объединенные данные для анализа
+        fetch_full_file: качать ли весь файл сразу (по умолчанию Config.FIGMA_FETCH_FULL_FILE)
         """
-        print("📡 Запрашиваем данные из Figma API...")
+        self.log("📡 Запрашиваем данные из Figma API...")
+        
+        if fetch_full_file is None:
+            fetch_full_file = Config.FIGMA_FETCH_FULL_FILE
+        
+        # Потоковый режим: ответ ложится на диск, анализатор читает детей по одному
+        node_stream = None
+        specific_node = None
+        if Config.FIGMA_STREAMING:
+            try:
+                spool_path = self.download_specific_node(
+                    depth=Config.FIGMA_NODE_DEPTH,
+                    geometry=Config.FIGMA_GEOMETRY
+                )
+                node_stream = FigmaNodeStream(spool_path, self.node_id)
+            except requests.exceptions.RequestException as e:
+                self.log(f"❌ Ошибка при потоковой загрузке ноды: {e}")
+        else:
+            # Конкретная нода нужна всегда - именно ее анализирует DeepFigmaAnalyzer
+            specific_node = self.get_specific_node(
+                node_ids=[self.node_id],
+                depth=Config.FIGMA_NODE_DEPTH,
+                geometry=Config.FIGMA_GEOMETRY
+            )
         
-        # Получаем оба типа данных
-        full_file = self.get_file()        # Весь файл
-        specific_node = self.get_specific_node()  # Конкретная нода
+        # Весь файл качаем только по требованию (на больших файлах это десятки мегабайт)
+        full_file = self.get_file() if fetch_full_file else None
         
         # Объединяем в одну структуру
         return {
-            "full_file": full_file,        # Полная структура файла
-            "specific_node": specific_node, # Данные конкретной ноды
-            "target_node_id": Config.FIGMA_NODE_ID  # ID целевой ноды для отслеживания
-        }
\ No newline at end of file
+            "full_file": full_file,        # Полная структура файла (None если не запрашивали)
+            "specific_node": specific_node, # Данные конкретной ноды (None в потоковом режиме)
+            "node_stream": node_stream,     # Потоковый доступ к ноде (только в потоковом режиме)
+            "target_node_id": self.node_id,  # ID целевой ноды для отслеживания
+            "file_key": self.file_key        # Файл Figma (манифест инкрементальной обработки - по файлу и ноде)
+        }
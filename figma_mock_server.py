@@ -0,0 +1,188 @@
+# figma_mock_server.py
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Dict, Any
+from flask import Flask, request, jsonify, Response
+from synthetic_figma import SyntheticFigmaGenerator
+
+class MockFigmaAPI:
+    """
+    Локальная замена Figma API для бенчмарков и нагрузочных тестов
+    Реализует эндпоинты, которые использует FigmaClient:
+    GET /v1/files/{key} и GET /v1/files/{key}/nodes?ids=...
+    Умеет добавлять задержку, случайные 5xx и 429 с Retry-After
+    """
+    
+    def __init__(self, documents: Dict[str, Dict[str, Any]], latency_ms: float = 0, latency_jitter_ms: float = 0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: int = 1, seed: int = 0):
+        self.documents = documents                  # file key -> документ в формате /files/{key}
+        self.latency_ms = latency_ms                # Базовая задержка ответа
+        self.latency_jitter_ms = latency_jitter_ms  # Случайная добавка к задержке
+        self.error_rate = error_rate                # Доля ответов 500
+        self.rate_limit_rate = rate_limit_rate      # Доля ответов 429
+        self.retry_after = retry_after              # Значение Retry-After для 429
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()               # random.Random не потокобезопасен
+        
+        # Счетчики запросов для отчетов бенчмарков
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        
+        # Индекс нод по ID для быстрого ответа на /nodes
+        self.node_index = {key: self._index_nodes(document) for key, document in documents.items()}
+    
+    def _index_nodes(self, document: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        index = {}
+        stack = [document.get("document", {})]
+        while stack:
+            node = stack.pop()
+            index[node.get("id")] = node
+            stack.extend(node.get("children", []))
+        return index
+    
+    def _truncate(self, node: Dict[str, Any], depth: int = None) -> Dict[str, Any]:
+        """
+        Копия ноды, обрезанная до depth уровней детей (как параметр depth у Figma)
+        """
+        if depth is None:
+            return node
+        truncated = {key: value for key, value in node.items() if key != "children"}
+        if depth > 0 and "children" in node:
+            truncated["children"] = [self._truncate(child, depth - 1) for child in node["children"]]
+        return truncated
+    
+    def _inject_failures(self):
+        """
+        Задержка и случайные ошибки перед ответом. None - отвечаем нормально
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency_ms + self.random.uniform(0, self.latency_jitter_ms)
+            roll = self.random.random()
+        
+        if delay > 0:
+            time.sleep(delay / 1000)
+        
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            response = jsonify({"status": 429, "err": "Rate limit exceeded"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response
+        
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            return jsonify({"status": 500, "err": "Internal server error (injected)"}), 500
+        
+        return None
+    
+    def create_app(self) -> Flask:
+        app = Flask(__name__)
+        
+        @app.route('/v1/files/<file_key>', methods=['GET'])
+        def get_file(file_key):
+            failure = self._inject_failures()
+            if failure is not None:
+                return failure
+            
+            document = self.documents.get(file_key)
+            if document is None:
+                return jsonify({"status": 404, "err": "Not found"}), 404
+            
+            depth = request.args.get("depth", type=int)
+            # depth=1 у Figma - только страницы документа
+            body = {key: value for key, value in document.items() if key != "document"}
+            body["document"] = self._truncate(document["document"], depth)
+            return Response(json.dumps(body, ensure_ascii=False), mimetype="application/json")
+        
+        @app.route('/v1/files/<file_key>/nodes', methods=['GET'])
+        def get_nodes(file_key):
+            failure = self._inject_failures()
+            if failure is not None:
+                return failure
+            
+            document = self.documents.get(file_key)
+            if document is None:
+                return jsonify({"status": 404, "err": "Not found"}), 404
+            
+            depth = request.args.get("depth", type=int)
+            ids = [node_id for node_id in request.args.get("ids", "").split(",") if node_id]
+            index = self.node_index[file_key]
+            
+            nodes = {}
+            for node_id in ids:
+                node = index.get(node_id)
+                # Как у Figma: неизвестная нода -> null
+                nodes[node_id] = None if node is None else {
+                    "document": self._truncate(node, depth),
+                    "components": document.get("components", {}),
+                    "styles": document.get("styles", {})
+                }
+            
+            body = {
+                "name": document.get("name"),
+                "lastModified": document.get("lastModified"),
+                "version": document.get("version"),
+                "nodes": nodes
+            }
+            return Response(json.dumps(body, ensure_ascii=False), mimetype="application/json")
+        
+        @app.route('/mock/stats', methods=['GET'])
+        def get_stats():
+            """Счетчики запросов (для отчетов бенчмарков)"""
+            with self._lock:
+                return jsonify(dict(self.stats))
+        
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный мок Figma API с синтетическим документом")
+    parser.add_argument("--port", type=int, default=8765, help="Порт сервера")
+    parser.add_argument("--file-key", default="synthetic", help="File key синтетического файла")
+    parser.add_argument("--node-id", default="1:1", help="ID целевого фрейма")
+    parser.add_argument("--document", help="Готовый JSON документ (вместо генерации)")
+    parser.add_argument("--nodes", type=int, default=10000, help="Количество нод синтетического документа")
+    parser.add_argument("--depth", type=int, default=8, help="Максимальная глубина")
+    parser.add_argument("--fan-out", type=int, default=6, help="Максимум детей у контейнера")
+    parser.add_argument("--text-ratio", type=float, default=0.3, help="Доля TEXT нод")
+    parser.add_argument("--vector-ratio", type=float, default=0.2, help="Доля VECTOR нод")
+    parser.add_argument("--instance-ratio", type=float, default=0.1, help="Доля INSTANCE нод")
+    parser.add_argument("--components", type=int, default=5, help="Количество компонентов")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора и ошибок")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Задержка ответа (мс)")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0, help="Случайная добавка к задержке (мс)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After для 429 (секунды)")
+    args = parser.parse_args()
+    
+    if args.document:
+        with open(args.document, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    else:
+        generator = SyntheticFigmaGenerator(
+            node_count=args.nodes, max_depth=args.depth, fan_out=args.fan_out,
+            text_ratio=args.text_ratio, vector_ratio=args.vector_ratio,
+            instance_ratio=args.instance_ratio, component_count=args.components, seed=args.seed
+        )
+        document = generator.generate(args.node_id)
+    
+    mock = MockFigmaAPI(
+        {args.file_key: document},
+        latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, seed=args.seed
+    )
+    
+    print(f"🧪 Мок Figma API на http://localhost:{args.port}/v1")
+    print("   Для запуска main.py против мока:")
+    print(f"   FIGMA_API_BASE_URL=http://localhost:{args.port}/v1 FIGMA_FILE_KEY={args.file_key} "
+          f"FIGMA_NODE_ID={args.node_id} FIGMA_ACCESS_TOKEN=mock python main.py")
+    mock.create_app().run(host='127.0.0.1', port=args.port, debug=False, threaded=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# figma_stream.py
+import json
+from typing import Dict, Any, Iterator
+
+# ijson - потоковый JSON парсер: читает файл кусками и не строит весь документ в памяти
+# Если библиотеки нет, работаем через обычный json (весь документ в памяти)
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+class FigmaNodeStream:
+    """
+    Потоковый доступ к ответу /files/{key}/nodes, сохраненному на диск
+    Отдает корневую ноду без детей и затем ее детей по одному,
+    поэтому полный документ никогда не лежит в памяти целиком
+    """
+    
+    def __init__(self, path: str, node_id: str):
+        self.path = path          # Путь к JSON ответу на диске
+        self.node_id = node_id    # ID целевой ноды
+        # Префикс документа ноды в терминах ijson: nodes -> <id> -> document
+        self.document_prefix = f"nodes.{node_id}.document"
+        
+        if ijson is None:
+            print("⚠️  ijson не установлен - потоковый режим читает документ целиком")
+    
+    def load_shell(self) -> Dict[str, Any]:
+        """
+        Возвращает корневую ноду БЕЗ детей (все остальные поля на месте)
+        Пустой словарь, если нода не найдена в ответе
+        """
+        if ijson is None:
+            document = self._load_document()
+            return {key: value for key, value in document.items() if key != "children"}
+        
+        children_prefix = self.document_prefix + ".children"
+        builder = None
+        
+        with open(self.path, "rb") as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if builder is None:
+                    # Ждем начала объекта документа
+                    if prefix == self.document_prefix and event == "start_map":
+                        builder = ObjectBuilder()
+                        builder.event(event, value)
+                    continue
+                
+                # Пропускаем ключ children и все содержимое массива детей
+                if prefix == self.document_prefix and event == "map_key" and value == "children":
+                    continue
+                if prefix == children_prefix or prefix.startswith(children_prefix + "."):
+                    continue
+                
+                # Документ закончился - дальше файл не читаем
+                if prefix == self.document_prefix and event == "end_map":
+                    builder.event(event, value)
+                    return builder.value
+                
+                builder.event(event, value)
+        
+        return {}
+    
+    def iter_children(self) -> Iterator[Dict[str, Any]]:
+        """
+        Отдает прямых детей корневой ноды по одному, по мере чтения файла
+        В памяти одновременно находится только текущее поддерево
+        """
+        if ijson is None:
+            yield from self._load_document().get("children", [])
+            return
+        
+        with open(self.path, "rb") as f:
+            # use_float=True - числа как float, а не Decimal (как в обычном json)
+            yield from ijson.items(f, self.document_prefix + ".children.item", use_float=True)
+    
+    def _load_document(self) -> Dict[str, Any]:
+        """
+        Запасной вариант без ijson - читаем документ ноды целиком
+        """
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return ((data.get("nodes") or {}).get(self.node_id) or {}).get("document", {})
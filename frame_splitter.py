@@ -1,8 +1,24 @@
 # frame_splitter.py
-import json
+import hashlib
+import math
 import os
-from typing import Dict, Any, List, Tuple
+import re
+import sys
+from collections import deque
+from collections.abc import Mapping
+from typing import Dict, Any, List, Set, Tuple
 from config import Config
+from serializer import JsonSerializer
+from frame_store import open_frame_store, PackedFrameStore, ROOT_FRAME_FILE
+from style_table import pack_styles
+from repeats import find_repeats, frame_repeats, collapse_repeats
+from components import frame_components
+from lazy_tree import LazyElement
+from subtree_metrics import SubtreeMetrics
+
+# Поля элемента в заглушке: ребенок, чье поддерево вынесено в отдельный фрейм
+STUB_FIELDS = ("id", "original_id", "name", "type", "depth", "size", "position", "layout",
+               "styles", "style_id", "visibility", "locked")
 
 class FrameSplitter:
     """
@@ -20,96 +36,515 @@ class FrameSplitter:
         os.makedirs(self.frames_dir, exist_ok=True)
         
         self.frames_count = 0  # Счетчик созданных фреймов
+        self.serializer = JsonSerializer()  # Запись JSON (компактно, orjson - если установлен)
+        self.store = open_frame_store(self.output_dir)  # Куда пишутся фреймы: один упакованный файл или папка frames/
+        self.log = print  # Куда писать ход работы (run_pipeline подменяет на время запуска)
+        self.repeats = []      # Таблица повторяющихся поддеревьев из анализа
+        self.metrics = SubtreeMetrics()  # Размеры поддеревьев (один обход на анализ)
+        self.components = {}   # ID компонента -> проанализированный мастер
+        self.lazy = False      # Анализ в ленивом режиме (дети корня - LazyElement)
+        self.token_map = {}    # Сырое значение -> имя токена (из анализа)
+        
+        # Размер одного фрейма ограничен: большие поддеревья делятся на части
+        self.max_elements = Config.MAX_ELEMENTS_PER_FRAME or sys.maxsize  # 0 - без лимита
+        self.min_children = Config.MIN_FRAME_CHILDREN
     
-    def split_into_frames(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    def split_into_frames(self, analysis: Dict[str, Any], frame_ids: Set[str] = None) -> Dict[str, Any]:
         """
         Основной метод - разделяет анализ на родительские фреймы первого уровня
         Сохраняет ПОЛНУЮ ВЛОЖЕННОСТЬ каждого фрейма
+        frame_ids: оригинальные ID родительских фреймов, которые нужно разобрать сейчас (None - все);
+        остальные попадают в метаданные без файла, их разбирает extract_parent_frame по запросу
         """
-        print("🔄 Разделяем структуру на родительские фреймы первого уровня...")
+        self.log("🔄 Разделяем структуру на родительские фреймы первого уровня...")
+        
+        self.frames_count = 0  # Сплиттер переиспользуется между запусками
         
         # Структура для хранения данных о всех фреймах
         frames_data = {
             "root_frame": None,      # Главный фрейм (весь макет)
             "parent_frames": [],     # Только родительские фреймы первого уровня (основные секции)
             "total_frames": 0,       # Общее количество фреймов
-            "frame_map": {}          # Словарь для быстрого доступа к фреймам по ID
+            "frame_map": {},         # Словарь для быстрого доступа к фреймам по ID
+            "metrics": None,         # Индекс метрик поддеревьев (его же читает генератор промптов)
+            "store": self.store      # Хранилище фреймов (из него генератор промптов читает фреймы)
         }
         
         # Получаем корневой элемент из анализа
         root_element = analysis["target_node"]
+        self._use_analysis(analysis)
+        frames_data["metrics"] = self.metrics
         
         # Сохраняем корневой фрейм (С ПОЛНОЙ ВЛОЖЕННОСТЬЮ всех элементов)
-        root_frame_data = self._extract_frame_data(root_element, "root", analysis["design_tokens"])
+        root_frame_data = self._extract_frame_data(root_element, "root", analysis["design_tokens"], root=True)
+        root_frame_data["unchanged"] = analysis.get("layout_unchanged", False)  # Инкрементальный режим
         frames_data["root_frame"] = root_frame_data
         frames_data["frame_map"]["root"] = root_frame_data
         self.frames_count += 1
         
         # Логируем информацию о корневом фрейме
-        total_elements_in_root = self._count_total_elements(root_element)
-        print(f"   📦 Корневой фрейм: {root_element.get('name')} -> {total_elements_in_root} элементов")
+        total_elements_in_root = self.metrics.total(root_element)
+        self.log(f"   📦 Корневой фрейм: {root_element.get('name')} -> {total_elements_in_root} элементов")
         
         # Находим и сохраняем только родительские фреймы первого уровня
         # Это основные секции макета: header, main, footer, sidebar и т.д.
-        self._find_and_save_parent_frames(root_element, frames_data, analysis["design_tokens"])
+        self._find_and_save_parent_frames(root_element, frames_data, analysis["design_tokens"],
+                                          set(analysis.get("unchanged_frames", [])), frame_ids)
         
         frames_data["total_frames"] = self.frames_count
         
         # Сохраняем мета-информацию о всех фреймах
         self._save_frames_metadata(frames_data)
         
-        print(f"✅ Разделение завершено! Всего фреймов: {frames_data['total_frames']}")
+        self.log(f"✅ Разделение завершено! Всего фреймов: {frames_data['total_frames']}")
         return frames_data
     
+    def extract_parent_frame(self, analysis: Dict[str, Any], frames_data: Dict[str, Any],
+                             original_id: str) -> Dict[str, Any]:
+        """
+        Разбирает и сохраняет родительский фрейм, отложенный split_into_frames(frame_ids=...)
+        В ленивом режиме анализа поддерево фрейма анализируется именно здесь
+        Возвращает данные фрейма или None, если такого фрейма первого уровня нет
+        """
+        self._use_analysis(analysis, frames_data.get("metrics"))
+        for child in analysis["target_node"].get("children", []):
+            if child.get("type") != "FRAME" or child.get("original_id") != original_id:
+                continue
+            
+            units = self._save_parent_frame(child, analysis["design_tokens"])
+            parent_frames = frames_data["parent_frames"]
+            for i, info in enumerate(parent_frames):
+                if info.get("deferred") and info.get("original_id") == original_id:
+                    # Отложенная запись заменяется фреймом и всеми его частями
+                    parent_frames[i:i + 1] = [frame_info for _, frame_info in units]
+                    break
+            for frame_data, frame_info in units:
+                frames_data["frame_map"][frame_info["id"]] = frame_data
+            frames_data["total_frames"] += len(units) - 1
+            self._save_frames_metadata(frames_data, root=False)
+            return units[0][0]
+        return None
+    
+    def _use_analysis(self, analysis: Dict[str, Any], metrics: SubtreeMetrics = None):
+        """
+        Запоминает то, что нужно при разборе любого фрейма: повторы, мастера компонентов, режим анализа
+        metrics: индекс метрик, построенный для этого анализа раньше (None - новый)
+        """
+        self.metrics = metrics or SubtreeMetrics()
+        self.repeats = analysis.get("repeats", [])
+        self.components = {master["component_info"]["id"]: master for master in analysis.get("components", [])}
+        self.lazy = analysis.get("lazy", False)
+        self.token_map = analysis.get("token_map", {})
+    
     def _find_and_save_parent_frames(self, root_element: Dict[str, Any], 
-                                   frames_data: Dict[str, Any], design_tokens: Dict[str, Any]):
+                                   frames_data: Dict[str, Any], design_tokens: Dict[str, Any],
+                                   unchanged_frames: Set[str] = None, frame_ids: Set[str] = None):
         """
         Находит и сохраняет только родительские фреймы первого уровня
         Это основные логические блоки макета
+        unchanged_frames: оригинальные ID фреймов, не изменившихся с прошлого запуска
+        frame_ids: какие фреймы разбирать сейчас (None - все, см. split_into_frames)
         """
-        children = root_element.get("children", [])
+        unchanged_frames = unchanged_frames or set()
         
-        print(f"🔍 Ищем родительские фреймы первого уровня...")
+        self.log(f"🔍 Ищем родительские фреймы первого уровня...")
         
-        # Проходим по всем детям корневого элемента
-        for child in children:
-            child_type = child.get("type", "")
+        # Берем только FRAME элементы первого уровня (основные секции)
+        frames = [child for child in root_element.get("children", []) if child.get("type", "") == "FRAME"]
+        for group in self._group_parent_frames(frames, frame_ids):
+            if len(group) > 1:
+                # Мелкие фреймы подряд - одним фреймом-пачкой
+                unit = self._pack_unit(group)
+                if (all(frame.get("original_id") in unchanged_frames for frame in group)
+                        and self.store.exists(unit["id"], unit["file"])):
+                    frame_info = self._unit_info(unit)
+                    frame_info["unchanged"] = True
+                    self._add_units(frames_data, [(frame_info, frame_info)])
+                    self.log(f"   ♻️  Пачка фреймов '{unit['name']}' не изменилась - пропускаем")
+                    continue
+                self.log(f"   📦 Пачка мелких фреймов '{unit['name']}' -> {unit['total_elements']} элементов (фреймов: {len(group)})")
+                self._add_units(frames_data, self._save_units([unit], design_tokens))
+                continue
+            
+            child = group[0]
             child_name = child.get("name", "unnamed")
-            child_id = child.get("id", "").split("-")[0]  # Берем первую часть ID
+            frame_id = self._frame_key(child)
+            
+            # Фрейм не менялся и все его части уже в хранилище - ничего не пересчитываем и не перезаписываем
+            if child.get("original_id") in unchanged_frames:
+                plan = self._plan_units(child)
+                if all(self.store.exists(unit["id"], unit["file"]) for unit in plan):
+                    for unit in plan:
+                        frame_info = self._unit_info(unit)
+                        frame_info["unchanged"] = True  # Промпт для него тоже можно не генерировать
+                        frames_data["parent_frames"].append(frame_info)
+                        frames_data["frame_map"][frame_info["id"]] = frame_info
+                        self.frames_count += 1
+                    self.log(f"   ♻️  Родительский фрейм '{child_name}' не изменился - пропускаем")
+                    continue
             
-            # Берем только FRAME элементы первого уровня (основные секции)
-            if child_type == "FRAME":
-                # Извлекаем данные фрейма (С ПОЛНОЙ ВЛОЖЕННОСТЬЮ всех детей)
-                frame_data = self._extract_frame_data(child, child_id, design_tokens)
-                frame_data["parent"] = "root"  # Отмечаем что родитель - корневой фрейм
-                
-                # Сохраняем фрейм в отдельный JSON файл
-                self._save_single_frame(frame_data)
-                
-                # Считаем общее количество элементов во фрейме (включая вложенные)
-                total_elements = self._count_total_elements(child)
-                
-                # Добавляем информацию о фрейме в общую структуру
-                frames_data["parent_frames"].append({
-                    "id": child_id,
+            # Фрейм пока не нужен - в метаданных только сводка (в ленивом режиме он и не анализируется)
+            if frame_ids is not None and child.get("original_id") not in frame_ids:
+                frame_info = {
+                    "id": frame_id,  # Совпадает с ID первой части при разборе (см. _plan_units)
+                    "original_id": child.get("original_id", ""),
                     "name": child_name,
-                    "element_count": len(child.get("children", [])),  # Только непосредственные дети
-                    "total_elements": total_elements,  # Все элементы включая вложенные
-                    "file": f"frames/{child_id}_{self._sanitize_name(child_name)}.json"  # Путь к файлу
-                })
-                
-                # Добавляем в карту фреймов для быстрого доступа
-                frames_data["frame_map"][child_id] = frame_data
+                    "element_count": self._count_children(child),
+                    "total_elements": self.metrics.total(child),
+                    "file": self._frame_file(frame_id, child_name),
+                    "parent": "root",
+                    "deferred": True  # Файла и промпта нет - см. extract_parent_frame
+                }
+                frames_data["parent_frames"].append(frame_info)
+                frames_data["frame_map"][frame_id] = frame_info
                 self.frames_count += 1
-                
-                # Логируем информацию о фрейме
-                print(f"   📦 Родительский фрейм '{child_name}' -> {total_elements} элементов (включая вложенные)")
+                continue
+            
+            # Фрейм и (если он больше лимита) все его части - каждая в свой файл
+            self._add_units(frames_data, self._save_parent_frame(child, design_tokens))
+    
+    def _add_units(self, frames_data: Dict[str, Any], units: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """
+        Записывает сохраненные фреймы в parent_frames и в карту фреймов для быстрого доступа
+        """
+        for frame_data, frame_info in units:
+            frames_data["parent_frames"].append(frame_info)
+            frames_data["frame_map"][frame_info["id"]] = frame_data
+            self.frames_count += 1
+    
+    def _group_parent_frames(self, frames: List[Mapping], frame_ids: Set[str] = None) -> List[List[Mapping]]:
+        """
+        Родительские фреймы первого уровня по группам: мелкие фреймы подряд пакуются, как мелкие
+        соседи в _plan_units; пачка меньше MIN_FRAME_CHILDREN фреймов распадается на отдельные
+        Отложенные фреймы (не из frame_ids) пачки разрывают - их разбирает extract_parent_frame по одному
+        Без лимита элементов (MAX_ELEMENTS_PER_FRAME=0) фреймы не пакуются
+        """
+        if self.max_elements == sys.maxsize:
+            return [[frame] for frame in frames]
+        
+        groups = []
+        run = []
+        for frame in frames + [None]:
+            if frame is not None and (frame_ids is None or frame.get("original_id") in frame_ids):
+                run.append((frame, []))
+                continue
+            for group in self._pack_siblings(run):
+                if len(group) >= self.min_children:
+                    groups.append([element for element, _ in group])
+                else:
+                    groups.extend([element] for element, _ in group)
+            run = []
+            if frame is not None:
+                groups.append([frame])
+        return groups
+    
+    def _pack_unit(self, frames: List[Mapping]) -> Dict[str, Any]:
+        """
+        Пачка мелких родительских фреймов: ID "pack-<хэш ключей фреймов>" и имя по крайним фреймам
+        зависят только от состава пачки - неизменную пачку инкрементальный режим не перезаписывает
+        """
+        keys = [self._frame_key(frame) for frame in frames]
+        unit_id = "pack-" + hashlib.sha1(",".join(keys).encode("utf-8")).hexdigest()[:12]
+        name = f"{frames[0].get('name', 'unnamed')} … {frames[-1].get('name', 'unnamed')}"
+        root_shell = {"id": "root", "child_frames": []}
+        return self._chunk_unit(root_shell, 0, [(frame, []) for frame in frames], unit_id, name)
+    
+    def _save_parent_frame(self, child: Dict[str, Any], design_tokens: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Извлекает родительский фрейм, сохраняет его в JSON и возвращает пары
+        (данные фрейма, запись для списка parent_frames): сначала сам фрейм, затем его части
+        """
+        total_elements = self.metrics.total(child)
+        units = self._plan_units(child)
+        
+        # Логируем информацию о фрейме
+        self.log(f"   📦 Родительский фрейм '{child.get('name', 'unnamed')}' -> {total_elements} элементов (включая вложенные)"
+                 + (f", частей: {len(units)}" if len(units) > 1 else ""))
+        return self._save_units(units, design_tokens)
+    
+    def _save_units(self, units: List[Dict[str, Any]], design_tokens: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Сохраняет части из плана: (данные фрейма, запись для списка parent_frames) по каждой
+        """
+        result = []
+        for unit in units:
+            # Извлекаем данные фрейма (С ПОЛНОЙ ВЛОЖЕННОСТЬЮ всех детей - или заглушками вынесенных частей)
+            frame_data = self._extract_frame_data(unit["element"], unit["id"], design_tokens, unit=unit)
+            frame_data["parent"] = unit["parent"]  # ID родительского фрейма ("root" - корневой)
+            frame_data["child_frames"] = unit["child_frames"]  # Части, вынесенные в отдельные фреймы
+            
+            # Сохраняем фрейм в отдельный JSON файл
+            self._save_single_frame(frame_data)
+            result.append((frame_data, self._unit_info(unit, frame_data)))
+        return result
+    
+    def _unit_info(self, unit: Dict[str, Any], frame_data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Запись для списка parent_frames (без frame_data - по плану, файл уже записан раньше)
+        """
+        element = unit["element"]
+        return {
+            "id": unit["id"],
+            "name": unit["name"],
+            "element_count": frame_data["element_count"] if frame_data else self._count_children(element),  # Только непосредственные дети
+            "total_elements": frame_data["total_elements"] if frame_data else unit["total_elements"],  # Все элементы во фрейме
+            "file": unit["file"],  # Путь к файлу
+            "parent": unit["parent"],
+            "child_frames": unit["child_frames"]
+        }
+    
+    def _plan_units(self, element: Mapping) -> List[Dict[str, Any]]:
+        """
+        Делит родительский фрейм на части не больше MAX_ELEMENTS_PER_FRAME элементов
+        Поддерево в пределах лимита - одна часть. Большее становится "оболочкой": его дети
+        заменяются заглушками со ссылками на части, а сами дети делятся так же (очередь,
+        без рекурсии); подряд идущие маленькие соседи упаковываются вместе в пачки
+        примерно равного размера. Большой элемент меньше чем с MIN_FRAME_CHILDREN детьми
+        (обертка) своей оболочки не получает - его дети делятся прямо в оболочке выше
+        Оболочка держит по заглушке на каждого большого ребенка (маленькие соседи - одной
+        заглушкой пачки), поэтому больше лимита она бывает, только если больших детей больше лимита
+        Возвращает части в порядке разбора (первая - сам фрейм): id, name, file, element
+        (то, что пойдет во фрейм), parent, child_frames, total_elements и members
+        ID первой части - ключ фрейма (_frame_key), остальных - "<ключ>_<номер в плане>",
+        пачек - "<ID оболочки>_part<N>": короткие (ID элементов растут с глубиной и в имя файла
+        не влезают) и при неизменном фрейме те же, что в прошлом запуске
+        """
+        key = self._frame_key(element)
+        if self.metrics.total(element) <= self.max_elements:
+            # У ленивого элемента размер известен из предварительного прохода - поддерево не разбираем
+            return [self._new_unit(element, element, None, self.metrics.total(element), unit_id=key)]
+        if isinstance(element, LazyElement):
+            element = element.materialize()
+        
+        units = []
+        queue = deque([(element, None, ())])  # (элемент, оболочка-родитель, заглушки в ней)
+        while queue:
+            current, shell, owners = queue.popleft()
+            unit_id = f"{key}_{len(units)}" if units else key
+            if self.metrics.total(current) <= self.max_elements:
+                units.append(self._new_unit(current, current, shell, self.metrics.total(current), owners, unit_id))
+                continue
+            
+            current_shell = self._new_unit(current, None, shell, 0, owners, unit_id)
+            units.append(current_shell)
+            stubs = []
+            items = []  # (элемент, заглушки, внутри которых он лежит)
+            for child in current.get("children", []):
+                child_stub = self._stub(child, self.metrics.total(child))
+                stubs.append(child_stub)
+                items.extend(self._unwrap(child, child_stub))
+            
+            chunk_stubs = {}  # ID пачки -> ее заглушка (одна на подряд идущих детей оболочки)
+            for group in self._pack_siblings(items):
+                if len(group) == 1 and self.metrics.total(group[0][0]) > self.max_elements:
+                    queue.append((group[0][0], current_shell, group[0][1]))
+                elif len(group) == 1:
+                    units.append(self._new_unit(group[0][0], group[0][0], current_shell,
+                                                self.metrics.total(group[0][0]), group[0][1], f"{key}_{len(units)}"))
+                else:
+                    part = len(chunk_stubs) + 1
+                    chunk = self._chunk_unit(current_shell, part, group)
+                    units.append(chunk)
+                    chunk_stubs[chunk["id"]] = self._stub(chunk["element"], chunk["total_elements"])
+                    chunk_stubs[chunk["id"]]["frames"].append(chunk["id"])
+            
+            # Маленькие дети из одной пачки в оболочке - одна заглушка пачки, а не по заглушке на ребенка
+            shell_children = []
+            for child_stub in stubs:
+                chunk_stub = (chunk_stubs.get(child_stub["frames"][0])
+                              if child_stub["total_elements"] <= self.max_elements else None)
+                if chunk_stub is None:
+                    shell_children.append(child_stub)
+                elif not shell_children or shell_children[-1] is not chunk_stub:
+                    shell_children.append(chunk_stub)
+            current_shell["element"] = self._shell_element(current, shell_children)
+            current_shell["total_elements"] = 1 + self._count_stubs(shell_children)
+        return units
+    
+    def _new_unit(self, element: Mapping, content: Mapping, shell: Dict[str, Any], total: int,
+                  stubs: List[Dict[str, Any]] = (), unit_id: str = None, name: str = None,
+                  members: List[str] = ()) -> Dict[str, Any]:
+        """
+        Часть фрейма; регистрируется в оболочке-родителе и в заглушках, которые на нее ссылаются
+        content: элемент, который целиком пойдет во фрейм (None - оболочка, заполняется позже)
+        """
+        unit_id = unit_id or element.get("id", "")
+        name = name or element.get("name", "unnamed")
+        unit = {
+            "id": unit_id,
+            "name": name,
+            "file": self._frame_file(unit_id, name),
+            "element": content,
+            "parent": shell["id"] if shell else "root",
+            "child_frames": [],
+            "total_elements": total,
+            "members": list(members),  # Элементы пачки (у пачки нет своего элемента в макете)
+            "shell": content is None   # Оболочка: дети - заглушки вынесенных частей
+        }
+        if shell is not None:
+            shell["child_frames"].append(unit_id)
+        for owner in stubs:
+            if unit_id not in owner["frames"]:
+                owner["frames"].append(unit_id)
+        return unit
+    
+    def _chunk_unit(self, shell: Dict[str, Any], part: int, group: List[Tuple[Mapping, List[Dict[str, Any]]]],
+                    unit_id: str = None, name: str = None) -> Dict[str, Any]:
+        """
+        Пачка маленьких соседей одним фреймом: синтетический элемент-группа с ними в детях
+        Размер и позиция - габариты участников; ID и имя по умолчанию - по оболочке и номеру части
+        """
+        members = [element for element, _ in group]
+        unit_id = unit_id or f"{shell['id']}_part{part}"
+        name = name or f"{shell['name']} · часть {part}"
+        left = min(member.get("position", {}).get("x", 0) for member in members)
+        top = min(member.get("position", {}).get("y", 0) for member in members)
+        right = max(member.get("position", {}).get("x", 0) + member.get("size", {}).get("width", 0) for member in members)
+        bottom = max(member.get("position", {}).get("y", 0) + member.get("size", {}).get("height", 0) for member in members)
+        content = {
+            "id": unit_id,
+            "name": name,
+            "type": "GROUP",
+            "size": {"width": right - left, "height": bottom - top},
+            "position": {"x": left, "y": top},
+            "styles": {},
+            "layout": {},
+            "children": members
+        }
+        return self._new_unit(content, content, shell, 1 + sum(self.metrics.total(member) for member in members),
+                              [owner for _, owners in group for owner in owners], unit_id, name,
+                              [member.get("id", "") for member in members])
     
-    def _extract_frame_data(self, frame_element: Dict[str, Any], frame_id: str, design_tokens: Dict[str, Any]) -> Dict[str, Any]:
+    def _unwrap(self, element: Mapping, stub: Dict[str, Any]) -> List[Tuple[Mapping, List[Dict[str, Any]]]]:
+        """
+        Большие обертки (меньше MIN_FRAME_CHILDREN детей) раскрываются до их потомков
+        Заглушка обертки получает заглушки своих детей - цепочка оберток остается в оболочке
+        Возвращает элементы с заглушками, внутри которых они лежат (от внешней к своей)
+        """
+        items = []
+        stack = [(element, [stub])]
+        while stack:
+            current, owners = stack.pop()
+            children = current.get("children", [])
+            if self.metrics.total(current) > self.max_elements and len(children) < self.min_children:
+                owners[-1]["children"] = [self._stub(child, self.metrics.total(child)) for child in children]
+                stack.extend(reversed([(child, owners + [child_stub])
+                                       for child, child_stub in zip(children, owners[-1]["children"])]))
+            else:
+                items.append((current, owners))
+        return items
+    
+    def _pack_siblings(self, items: List[Tuple[Mapping, List[Dict[str, Any]]]]) -> List[List[Tuple[Mapping, List[Dict[str, Any]]]]]:
+        """
+        Группы соседей: большой элемент - один, подряд идущие маленькие - пачками
+        (элемент ровно в лимит - тоже один: в пачке с группой он бы лимит превысил)
+        """
+        groups = []
+        run = []
+        for item in items + [None]:
+            if item is not None and self.metrics.total(item[0]) < self.max_elements:
+                run.append(item)
+                continue
+            if run:
+                groups.extend(self._balance(run))
+                run = []
+            if item is not None:
+                groups.append([item])
+        return groups
+    
+    def _balance(self, run: List[Tuple[Mapping, List[Dict[str, Any]]]]) -> List[List[Tuple[Mapping, List[Dict[str, Any]]]]]:
+        """
+        Делит подряд идущих маленьких соседей на минимум пачек, близких по размеру:
+        число пачек - как у жадной упаковки по лимиту, а емкость пачки - наименьшая,
+        при которой их не становится больше (бинарный поиск)
+        Емкость на один меньше лимита - пачке нужен свой элемент-группа
+        """
+        sizes = [self.metrics.total(element) for element, _ in run]
+        capacity = max(self.max_elements - 1, 1)
+        count = len(self._greedy_groups(sizes, capacity))
+        low, high = max(max(sizes), math.ceil(sum(sizes) / count)), max(capacity, max(sizes))
+        while low < high:
+            middle = (low + high) // 2
+            if len(self._greedy_groups(sizes, middle)) <= count:
+                high = middle
+            else:
+                low = middle + 1
+        return [[run[i] for i in group] for group in self._greedy_groups(sizes, low)]
+    
+    def _greedy_groups(self, sizes: List[int], capacity: int) -> List[List[int]]:
+        """
+        Номера элементов по пачкам: пачка закрывается, когда следующий не влезает в емкость
+        """
+        groups = []
+        group = []
+        size = 0
+        for i, item_size in enumerate(sizes):
+            if group and size + item_size > capacity:
+                groups.append(group)
+                group = []
+                size = 0
+            group.append(i)
+            size += item_size
+        if group:
+            groups.append(group)
+        return groups
+    
+    def _count_stubs(self, stubs: List[Dict[str, Any]]) -> int:
+        """
+        Заглушек вместе с вложенными (у обертки в заглушке - заглушки ее детей)
+        """
+        count = 0
+        stack = list(stubs)
+        while stack:
+            count += 1
+            stack.extend(stack.pop()["children"])
+        return count
+    
+    def _stub(self, element: Mapping, total: int) -> Dict[str, Any]:
+        """
+        Ребенок оболочки без поддерева: ссылки на фреймы, в которые оно вынесено
+        """
+        stub = {key: element[key] for key in STUB_FIELDS if key in element}
+        stub.update(total_elements=total, element_count=len(element.get("children", [])), frames=[], children=[])
+        return stub
+    
+    def _shell_element(self, element: Mapping, stubs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Элемент оболочки: все поля, кроме детей, - как у оригинала, дети - заглушки
+        """
+        shell = {key: element[key] for key in element if key != "children"}
+        shell["children"] = stubs
+        return shell
+    
+    def _frame_key(self, element: Mapping) -> str:
+        """
+        ID родительского фрейма первого уровня: оригинальный ID ноды Figma без спецсимволов ("12:34" -> "12-34")
+        """
+        original_id = element.get("original_id") or element.get("id", "")
+        return re.sub(r"[^0-9A-Za-z]+", "-", original_id).strip("-") or "frame"
+    
+    def _frame_file(self, frame_id: str, name: str) -> str:
+        return f"frames/{frame_id}_{self._sanitize_name(name)}.json"
+    
+    def _extract_frame_data(self, frame_element: Dict[str, Any], frame_id: str, design_tokens: Dict[str, Any],
+                            root: bool = False, unit: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Извлекает данные для отдельного фрейма с ПОЛНОЙ ВЛОЖЕННОСТЬЮ
         Сохраняет всех детей, детей детей и т.д.
+        Мастера компонентов, на которые ссылаются экземпляры фрейма, кладутся в сам фрейм
+        root: корневой фрейм (в ленивом режиме его поддерево не обходится - см. ниже)
+        unit: часть большого фрейма из _plan_units (у оболочки вместо детей заглушки)
         """
+        if self.lazy and root:
+            # Обход корня разобрал бы весь макет - берем то, что анализатор уже знает:
+            # все мастера, сырые значения токенов; повторы ищутся в каждом фрейме отдельно
+            components = list(self.components.values())
+            frame_tokens = self._lazy_root_design_tokens(design_tokens)
+            repeats = []
+        else:
+            components = frame_components(self.components, frame_element)
+            frame_tokens = self._frame_design_tokens(frame_element, components, unit)
+            repeats = self._frame_repeats(frame_element, unit)
         return {
             "id": frame_id,
             "name": frame_element.get("name", ""),
@@ -120,8 +555,10 @@ class FrameSplitter:
             "layout": frame_element.get("layout", {}),    # Настройки лайаута
             "children": frame_element.get("children", []),  # ВАЖНО: СОХРАНЯЕМ ПОЛНУЮ ВЛОЖЕННОСТЬ
             "element_count": len(frame_element.get("children", [])),  # Количество непосредственных детей
-            "total_elements": self._count_total_elements(frame_element),  # Всего элементов включая вложенные
-            "design_tokens": self._extract_frame_design_tokens(frame_element),  # Токены используемые в этом фрейме
+            "total_elements": unit["total_elements"] if unit else self.metrics.total(frame_element),  # Всего элементов включая вложенные
+            "design_tokens": frame_tokens,  # Токены используемые в этом фрейме
+            "repeats": repeats,  # Повторы внутри фрейма
+            "components": components,  # Мастера компонентов (экземпляры ссылаются на них по component_id)
             "global_design_tokens": {  # Глобальные токены всего макета (первые несколько)
                 "colors": dict(list(design_tokens.get("colors", {}).items())[:10]),      # Первые 10 цветов
                 "typography": dict(list(design_tokens.get("typography", {}).items())[:5]), # Первые 5 стилей шрифтов
@@ -130,99 +567,86 @@ class FrameSplitter:
             }
         }
     
-    def _count_total_elements(self, element: Dict[str, Any]) -> int:
+    def _frame_repeats(self, frame_element: Dict[str, Any], unit: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
-        Рекурсивно считает общее количество элементов включая всех детей
-        Используется для оценки сложности фрейма
+        Повторы внутри фрейма: из таблицы повторов всего макета, а в ленивом режиме
+        (таблицы нет - пришлось бы разобрать весь макет) - поиском по самому фрейму
+        У оболочки повторов нет - ее поддеревья вынесены в другие фреймы
         """
-        count = 1  # Начинаем с текущего элемента
-        
-        # Рекурсивно добавляем счетчики всех детей
-        for child in element.get("children", []):
-            count += self._count_total_elements(child)
-        
-        return count
+        if unit is not None and unit["shell"]:
+            return []
+        if not self.lazy:
+            if unit is not None and unit["members"]:
+                return frame_repeats(self.repeats, frame_element.get("id", ""), unit["members"])
+            return frame_repeats(self.repeats, frame_element.get("id", ""))
+        if not Config.DETECT_REPEATS:
+            return []
+        return find_repeats(frame_element, Config.REPEAT_MIN_ELEMENTS)
     
-    def _extract_frame_design_tokens(self, frame_element: Dict[str, Any]) -> Dict[str, Any]:
+    def _frame_design_tokens(self, frame_element: Mapping, components: List[Dict[str, Any]],
+                             unit: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Извлекает дизайн-токены, используемые только в этом фрейме
+        Дизайн-токены, используемые только в этом фрейме - из масок индекса метрик, без обхода
         Помогает понять какие цвета/шрифты/отступы используются в каждой секции
+        components: мастера компонентов фрейма (их токены тоже используются во фрейме)
+        """
+        if unit is not None and unit["shell"]:
+            # Оболочка: сама и заглушки (поддеревья заглушек - в других фреймах)
+            flat = []
+            stack = [frame_element]
+            while stack:
+                element = stack.pop()
+                flat.append(element)
+                stack.extend(reversed(element.get("children", [])))
+            return self.metrics.design_tokens(components, flat=flat)
+        if unit is not None and unit["members"]:
+            return self.metrics.design_tokens(list(frame_element["children"]) + components)  # Пачка соседей
+        return self.metrics.design_tokens([frame_element] + components)
+    
+    def _lazy_root_design_tokens(self, design_tokens: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Токены корневого фрейма в ленивом режиме: корень - это весь макет, поэтому это все сырые
+        значения из token_map (их собрал предварительный проход анализатора) и стили типографики
+        из глобальных токенов. В отличие от обхода, padding в отступы не попадает
         """
-        colors = set()
-        typography_styles = []
-        spacing_values = set()
-        radius_values = set()
-        
-        def collect_tokens(element: Dict[str, Any]):
-            """
-            Внутренняя рекурсивная функция для сбора токенов
-            """
-            # Собираем цвета из разных мест элемента
-            bg_color = element.get("styles", {}).get("background")
-            if bg_color:
-                colors.add(bg_color)
-            
-            border_color = element.get("styles", {}).get("border", {}).get("color")
-            if border_color:
-                colors.add(border_color)
-            
-            text_color = element.get("styles", {}).get("typography", {}).get("color")
-            if text_color:
-                colors.add(text_color)
-            
-            # Собираем типографику
-            typo = element.get("styles", {}).get("typography", {})
-            if typo and any(typo.values()):  # Если есть хоть какие-то данные о шрифтах
-                typography_styles.append(typo)
-            
-            # Собираем значения отступов и промежутков
-            layout = element.get("layout", {})
-            spacing = layout.get("spacing", 0)  # Расстояние между элементами
-            if spacing > 0:
-                spacing_values.add(spacing)
-            
-            # Собираем padding (внутренние отступы)
-            padding = layout.get("padding", {})
-            for key in ["left", "right", "top", "bottom"]:
-                padding_val = padding.get(key, 0)
-                if padding_val > 0:
-                    spacing_values.add(padding_val)
-            
-            # Собираем border radius (скругления)
-            border_radius = element.get("styles", {}).get("border", {}).get("radius", 0)
-            if border_radius > 0:
-                radius_values.add(border_radius)
-            
-            # Рекурсивно обрабатываем всех детей
-            for child in element.get("children", []):
-                collect_tokens(child)
-        
-        # Запускаем сбор токенов для этого фрейма и всех его детей
-        collect_tokens(frame_element)
-        
         return {
-            "colors": list(colors),           # Уникальные цвета в этом фрейме
-            "typography": typography_styles,  # Стили шрифтов
-            "spacing": sorted(list(spacing_values)),      # Отсортированные значения отступов
-            "border_radius": sorted(list(radius_values))  # Отсортированные значения скруглений
+            "colors": list(self.token_map.get("colors", {})),
+            "typography": list(design_tokens.get("typography", {}).values()),
+            "spacing": sorted(self.token_map.get("spacing", {})),
+            "border_radius": sorted(self.token_map.get("border_radius", {}))
         }
     
+    def _count_children(self, element: Dict[str, Any]) -> int:
+        """
+        Количество непосредственных детей (у ленивого элемента - без анализа)
+        """
+        if isinstance(element, LazyElement):
+            return element.summary["element_count"]
+        return len(element.get("children", []))
+    
     def _save_single_frame(self, frame_data: Dict[str, Any]):
         """
-        Сохраняет отдельный фрейм в JSON файл
+        Сохраняет отдельный фрейм в хранилище (по умолчанию - строкой упакованного файла)
         """
-        # Создаем безопасное имя файла из ID и имени фрейма
-        filename = f"{frame_data['id']}_{self._sanitize_name(frame_data['name'])}.json"
-        filepath = os.path.join(self.frames_dir, filename)
-        
-        # Сохраняем в JSON с красивым форматированием
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(frame_data, f, indent=2, ensure_ascii=False, default=str)
+        frame_file = self._frame_file(frame_data["id"], frame_data["name"])  # Путь при выгрузке в файлы
+        self.store.write(self._prepare_for_json(frame_data), frame_file)
+    
+    def _prepare_for_json(self, frame_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Стили элементов фрейма выносятся в общий style_table, а копии повторяющихся
+        поддеревьев - заменяются ссылкой на шаблон (если включено в конфиге)
+        """
+        if Config.COLLAPSE_REPEATS_IN_JSON and frame_data.get("repeats"):
+            frame_data = dict(frame_data, children=collapse_repeats(frame_data["children"], frame_data["repeats"]))
+        if Config.STYLE_TABLE_IN_JSON:
+            return pack_styles(frame_data, ("children", "components"))
+        return frame_data
     
-    def _save_frames_metadata(self, frames_data: Dict[str, Any]):
+    def _save_frames_metadata(self, frames_data: Dict[str, Any], root: bool = True):
         """
         Сохраняет мета-информацию о всех фреймах
         Это как оглавление для всей системы фреймов
+        root: перезаписать и файл корневого фрейма (после извлечения отложенного фрейма - не нужно)
         """
         # Структура метаданных
         metadata = {
@@ -236,15 +660,20 @@ class FrameSplitter:
             "total_frames": frames_data["total_frames"]     # Общее количество
         }
         
-        # Сохраняем корневой фрейм в отдельный файл
-        root_filepath = os.path.join(self.frames_dir, "root_frame.json")
-        with open(root_filepath, "w", encoding="utf-8") as f:
-            json.dump(frames_data["root_frame"], f, indent=2, ensure_ascii=False, default=str)
+        # Сохраняем корневой фрейм (если макет не менялся - он в хранилище уже актуален)
+        root_frame = frames_data["root_frame"]
+        if root and not (root_frame.get("unchanged") and self.store.exists("root", ROOT_FRAME_FILE)):
+            if self.lazy:
+                # Ленивый анализ: в файле корня только первый уровень (вложенность - в файлах фреймов)
+                root_frame = dict(root_frame, children=[child.outline() for child in root_frame["children"]])
+            self.store.write(self._prepare_for_json(root_frame), ROOT_FRAME_FILE)
+        
+        # Фиксируем индекс хранилища: фреймы в порядке макета, фреймов прошлых запусков в нем больше нет
+        self.store.commit(["root"] + [frame["id"] for frame in frames_data["parent_frames"]])
         
         # Сохраняем метаданные в отдельный файл
         meta_filepath = os.path.join(self.output_dir, "frames_metadata.json")
-        with open(meta_filepath, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False, default=str)
+        self.serializer.dump(metadata, meta_filepath)
         
         # Создаем удобный индекс для навигации по фреймам
         self._create_frames_index(metadata)
@@ -254,6 +683,11 @@ class FrameSplitter:
         Создает красивый Markdown файл с индексом всех фреймов
         Помогает быстро понять структуру макета
         """
+        # Упакованные фреймы - в одном файле, пути "Файл" появляются после выгрузки
+        export_note = ""
+        if isinstance(self.store, PackedFrameStore):
+            export_note = "\n6. Фреймы упакованы в один файл; отдельные JSON файлы: `python frame_store.py export`"
+        
         index_content = f"""
 # ИНДЕКС ФРЕЙМОВ (РОДИТЕЛЬСКИЕ ФРЕЙМЫ ПЕРВОГО УРОВНЯ)
 
@@ -271,7 +705,7 @@ class FrameSplitter:
 2. Начни с корневого фрейма (root_frame.json) для общей структуры
 3. Затем реализуй родительские фреймы по одному
 4. Все элементы сохраняют свои детей, детей детей и т.д.
-5. Каждый JSON файл самодостаточен
+5. Каждый JSON файл самодостаточен{export_note}
 
 ## ПРЕИМУЩЕСТВА:
 - ✅ Только основные секции макета
@@ -301,6 +735,8 @@ class FrameSplitter:
             lines.append(f"  - Элементов: {frame['element_count']}")
             lines.append(f"  - Всего с вложенными: {frame['total_elements']}")
             lines.append(f"  - Файл: `{frame['file']}`")
+            if frame.get("parent", "root") != "root":
+                lines.append(f"  - Часть фрейма: `{frame['parent']}`")
             lines.append("")  # Пустая строка между фреймами
         
         return "\n".join(lines)
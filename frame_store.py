@@ -0,0 +1,287 @@
+# frame_store.py
+import abc
+import argparse
+import contextlib
+import mmap
+import os
+import tempfile
+from typing import Dict, Any, List, Iterable, Optional
+from config import Config
+from serializer import JsonSerializer
+
+ROOT_FRAME_FILE = "frames/root_frame.json"  # Путь корневого фрейма в раскладке по файлам
+
+def _current_umask() -> int:
+    """umask процесса: узнать его можно только заменой, поэтому сразу возвращаем прежний"""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Права для файлов, созданных через mkstemp (он создает 0600): как у обычного open() - 0666 с учетом umask.
+# umask читается один раз при импорте: os.umask меняет его для всего процесса, а записи идут из потоков сервера
+FILE_MODE = 0o666 & ~_current_umask()
+
+@contextlib.contextmanager
+def _atomic_file(path: str):
+    """
+    Файл для записи под уникальным временным именем рядом с path; после записи он атомарно
+    заменяет path (os.replace), при ошибке удаляется. Читатели видят старый или новый файл целиком,
+    а одновременные записи не пишут в один и тот же временный файл
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+class FrameStore(abc.ABC):
+    """
+    Хранилище JSON фреймов с индексом frames_index.json: ID фрейма -> имя и путь файла
+    (относительно папки результатов) в порядке фреймов макета. По индексу фреймы
+    перечисляются без обхода папок (так их получает сервер)
+    Раскладку задают наследники: write, read и exists
+    """
+    
+    INDEX_FILE = "frames_index.json"
+    
+    def __init__(self, output_dir: str = None):
+        self.output_dir = output_dir or Config.OUTPUT_DIR
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.index_path = os.path.join(self.output_dir, self.INDEX_FILE)
+        self.index = self._load_index()
+    
+    def _empty_index(self) -> Dict[str, Any]:
+        return {"frames": {}}  # ID -> запись фрейма
+    
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path):
+            try:
+                index = JsonSerializer().load(self.index_path)
+                if self._valid(index):
+                    return index
+            except (OSError, ValueError):
+                pass
+            print("⚠️  Индекс фреймов поврежден или не совпадает с файлами - фреймы будут записаны заново")
+        return self._empty_index()
+    
+    def _valid(self, index: Dict[str, Any]) -> bool:
+        return "frames" in index
+    
+    def _save_index(self):
+        """
+        Атомарно сохраняет индекс (через временный файл)
+        """
+        data = JsonSerializer(pretty=False).dumps(self.index)
+        with _atomic_file(self.index_path) as f:
+            f.write(data)
+    
+    def frames(self) -> List[Dict[str, Any]]:
+        """
+        Записанные фреймы в порядке макета: {"id", "name", "file"} (корневой - с ID "root")
+        """
+        return [{"id": frame_id, "name": entry["name"], "file": entry["file"]}
+                for frame_id, entry in self.index["frames"].items()]
+    
+    def commit(self, frame_ids: Iterable[str]):
+        """
+        Фиксирует индекс после записи фреймов: остаются только frame_ids, в их порядке
+        (фреймы прошлых запусков, которых больше нет в макете, из индекса уходят)
+        """
+        frames = self.index["frames"]
+        self.index["frames"] = {frame_id: frames[frame_id] for frame_id in frame_ids if frame_id in frames}
+        self._save_index()
+    
+    @abc.abstractmethod
+    def write(self, frame_data: Dict[str, Any], file: str):
+        """Записывает фрейм (file - его путь в раскладке по файлам); в индекс он попадет в commit()"""
+    
+    @abc.abstractmethod
+    def read(self, frame_id: str, file: str) -> Optional[Dict[str, Any]]:
+        """Фрейм по ID и пути или None, если его нет"""
+    
+    @abc.abstractmethod
+    def exists(self, frame_id: str, file: str) -> bool:
+        """Записан ли фрейм"""
+
+class LooseFrameStore(FrameStore):
+    """
+    Каждый фрейм - отдельный JSON файл в папке frames/ (раскладка для чтения глазами)
+    """
+    
+    def __init__(self, output_dir: str = None, serializer: JsonSerializer = None):
+        super().__init__(output_dir)
+        self.serializer = serializer or JsonSerializer()  # Отступы - как в JSON_PRETTY
+    
+    def write(self, frame_data: Dict[str, Any], file: str):
+        path = os.path.join(self.output_dir, file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = self.serializer.dumps(frame_data)
+        with _atomic_file(path) as f:
+            f.write(data)
+        self.index["frames"][frame_data["id"]] = {"name": frame_data.get("name", ""), "file": file}
+    
+    def read(self, frame_id: str, file: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.output_dir, file)
+        if not os.path.exists(path):
+            return None
+        return self.serializer.load(path)
+    
+    def exists(self, frame_id: str, file: str) -> bool:
+        return os.path.exists(os.path.join(self.output_dir, file))
+
+class PackedFrameStore(FrameStore):
+    """
+    Все фреймы в одном файле frames.<поколение>.jsonl: по компактной JSON строке на фрейм,
+    только дописывание в конец. В индексе у фрейма - смещение и длина его строки, поэтому
+    один фрейм читается по ID срезом отображенного в память (mmap) файла, а на диске
+    вместо тысяч мелких файлов - один
+    Перезаписанный фрейм дописывается заново, старая строка становится мусором. Когда мусора
+    больше, чем живых данных, живые строки переписываются в файл следующего поколения
+    Индекс сохраняется в commit() и меняется атомарно: после сбоя он указывает на строки,
+    записанные до последнего commit() (дописывание их не портит)
+    """
+    
+    def __init__(self, output_dir: str = None):
+        super().__init__(output_dir)
+        self.serializer = JsonSerializer(pretty=False)  # Фрейм - ровно одна строка
+        self._writer = None  # Открытый на дописывание файл данных
+        self._map = None     # Файл данных в памяти (переотображается, когда вырос)
+    
+    def _empty_index(self) -> Dict[str, Any]:
+        return {"generation": 0, "frames": {}}  # ID -> смещение, длина, имя, путь для выгрузки
+    
+    def _valid(self, index: Dict[str, Any]) -> bool:
+        """
+        Индекс годится, если файл данных его поколения на месте и вмещает все записи
+        """
+        if "generation" not in index or "frames" not in index:
+            return False
+        path = self._data_path(index["generation"])
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return all(entry["offset"] + entry["length"] <= size for entry in index["frames"].values())
+    
+    def _data_path(self, generation: int = None) -> str:
+        generation = self.index["generation"] if generation is None else generation
+        return os.path.join(self.output_dir, f"frames.{generation}.jsonl")
+    
+    def write(self, frame_data: Dict[str, Any], file: str):
+        data = self.serializer.dumps(frame_data)
+        if self._writer is None:
+            self._writer = open(self._data_path(), "ab")
+        offset = self._writer.tell()
+        self._writer.write(data + b"\n")
+        self.index["frames"][frame_data["id"]] = {
+            "offset": offset,
+            "length": len(data),
+            "name": frame_data.get("name", ""),
+            "file": file
+        }
+    
+    def read(self, frame_id: str, file: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Фрейм по ID: срез отображенного в память файла (без открытия файла и системных вызовов чтения)
+        Срез копирует байты строки - memoryview без копирования orjson разбирает медленнее
+        """
+        entry = self.index["frames"].get(frame_id)
+        if entry is None:
+            return None
+        end = entry["offset"] + entry["length"]
+        if self._map is None or len(self._map) < end:
+            self._remap()
+        return self.serializer.loads(self._map[entry["offset"]:end])
+    
+    def _remap(self):
+        if self._writer is not None:
+            self._writer.flush()
+        self._close_map()
+        with open(self._data_path(), "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+    
+    def exists(self, frame_id: str, file: str = None) -> bool:
+        return frame_id in self.index["frames"]
+    
+    def commit(self, frame_ids: Iterable[str]):
+        if self._writer is not None:
+            self._writer.flush()
+        frames = self.index["frames"]
+        self.index["frames"] = {frame_id: frames[frame_id] for frame_id in frame_ids if frame_id in frames}
+        
+        path = self._data_path()
+        live = sum(entry["length"] + 1 for entry in self.index["frames"].values())
+        if os.path.exists(path) and os.path.getsize(path) - live > live:
+            self._compact()
+        else:
+            self._save_index()
+    
+    def _compact(self):
+        """
+        Переписывает живые строки в файл следующего поколения (в порядке индекса)
+        Новый индекс - точка фиксации: до его сохранения действует старый файл
+        Файл поколения появляется целиком (через временный), недописанным его не увидит никто
+        """
+        old_path = self._data_path()
+        self._remap()
+        generation = self.index["generation"] + 1
+        frames = {}
+        with _atomic_file(self._data_path(generation)) as f:
+            for frame_id, entry in self.index["frames"].items():
+                start = entry["offset"]
+                frames[frame_id] = dict(entry, offset=f.tell())
+                f.write(self._map[start:start + entry["length"] + 1])
+        
+        self._close_map()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.index = {"generation": generation, "frames": frames}
+        self._save_index()
+        os.remove(old_path)
+    
+    def export(self, target_dir: str = None, pretty: bool = True) -> int:
+        """
+        Выгружает фреймы в раскладку по файлам (frames/<ID>_<имя>.json) для чтения глазами
+        Индекс выгрузки не сохраняется - в той же папке остается индекс упакованного файла
+        Возвращает количество записанных файлов
+        """
+        files = LooseFrameStore(target_dir or self.output_dir, JsonSerializer(pretty=pretty))
+        for frame_id in self.index["frames"]:
+            files.write(self.read(frame_id), self.index["frames"][frame_id]["file"])
+        return len(self.index["frames"])
+
+# Значение FRAME_STORE -> класс хранилища
+FRAME_STORES = {"packed": PackedFrameStore, "files": LooseFrameStore}
+
+def open_frame_store(output_dir: str = None) -> FrameStore:
+    """
+    Хранилище фреймов, выбранное в конфиге (FRAME_STORE)
+    """
+    store = FRAME_STORES.get(Config.FRAME_STORE)
+    if store is None:
+        print(f"⚠️  Неизвестное хранилище фреймов '{Config.FRAME_STORE}' - используем packed")
+        store = PackedFrameStore
+    return store(output_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка упакованных фреймов в отдельные JSON файлы")
+    parser.add_argument("command", choices=["export"], help="export - записать frames/<ID>_<имя>.json")
+    parser.add_argument("--from", dest="source", default=Config.OUTPUT_DIR, help="Папка результатов с frames_index.json")
+    parser.add_argument("--out", default=None, help="Куда выгрузить (по умолчанию - туда же)")
+    parser.add_argument("--compact", action="store_true", help="Без отступов")
+    args = parser.parse_args()
+    
+    count = PackedFrameStore(args.source).export(args.out, pretty=not args.compact)
+    print(f"✅ Выгружено фреймов: {count} -> {args.out or args.source}/frames/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# incremental.py
+import hashlib
+import json
+import os
+from typing import Dict, Any, Optional
+from config import Config
+from serializer import JsonSerializer
+
+def compute_subtree_hash(node: Dict[str, Any]) -> str:
+    """
+    Merkle-хэш поддерева по сырым данным Figma
+    Хэш ноды = sha1(ее собственные поля + хэши детей), поэтому любое
+    изменение в глубине дерева меняет хэши всех его предков
+    Обход итеративный (без рекурсии) - глубина дерева не ограничена
+    """
+    hashes = {}               # id(нода) -> хэш ее поддерева
+    stack = [(node, False)]   # (нода, дети уже обработаны?)
+    
+    while stack:
+        current, children_done = stack.pop()
+        children = current.get("children") or []
+        
+        if not children_done:
+            # Сначала дети, потом сама нода (post-order)
+            stack.append((current, True))
+            for child in children:
+                stack.append((child, False))
+            continue
+        
+        hashes[id(current)] = combine_hash(current, [hashes.pop(id(child)) for child in children])
+    
+    return hashes[id(node)]
+
+def combine_hash(node: Dict[str, Any], child_hashes: list) -> str:
+    """
+    Хэш одной ноды: ее собственные поля (без children) + хэши детей по порядку
+    """
+    own_fields = {key: value for key, value in node.items() if key != "children"}
+    digest = hashlib.sha1(json.dumps(own_fields, sort_keys=True, default=str).encode("utf-8"))
+    for child_hash in child_hashes:
+        digest.update(child_hash.encode("ascii"))
+    return digest.hexdigest()
+
+def compute_context_hash(*parts) -> str:
+    """
+    Хэш общих для всего макета данных, которые попадают в файл и промпт каждого фрейма
+    (дизайн-токены и имена токенов): изменился он - устарели все фреймы, а не только измененный
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class IncrementalManifest:
+    """
+    Манифест инкрементальной обработки
+    Хранит хэши поддеревьев родительских фреймов с прошлого запуска и кэш их анализа,
+    чтобы при новой версии макета пересчитывать только изменившиеся фреймы
+    Разделы манифеста - по макетам (file key + ID ноды): сервер обрабатывает разные файлы
+    в одной папке результатов, и у них бывают одинаковые ID нод
+    """
+    
+    def __init__(self, output_dir: str = None):
+        self.output_dir = output_dir or Config.OUTPUT_DIR
+        self.manifest_path = os.path.join(self.output_dir, "subtree_manifest.json")
+        # Кэш проанализированных поддеревьев: <хэш>.json (общий для всех макетов - ключ по содержимому)
+        self.subtrees_dir = os.path.join(self.output_dir, ".incremental")
+        os.makedirs(self.subtrees_dir, exist_ok=True)
+        self.min_subtree_elements = Config.INCREMENTAL_MIN_SUBTREE_ELEMENTS
+        self.max_targets = Config.INCREMENTAL_MAX_TARGETS
+        
+        self.manifest = self._load()   # Весь манифест: формат, чьи файлы сейчас в папке, разделы макетов
+        self.target = None             # Макет текущего запуска (см. select_target)
+        self.previous = self._empty()  # Раздел этого макета с прошлого запуска
+        self.current = self._empty()   # Раздел текущего запуска (сохраняется в commit())
+        self.reuse_subtrees = True     # False - кэш поддеревьев от другой версии анализатора
+    
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {
+            "root": None,
+            "context": None,   # Хэш токенов всего макета (см. compute_context_hash)
+            "frames": {}       # original_id -> {"hash": ..., "start": ...}
+        }
+    
+    def _load(self) -> Dict[str, Any]:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if "targets" in manifest:
+                    return manifest
+            except (OSError, ValueError):
+                print("⚠️  Манифест инкрементальной обработки поврежден - пересчитываем все")
+        return {
+            "format": None,    # Версия формата результата анализа
+            "output": None,    # Макет, чьи фреймы и промпты сейчас лежат в папке результатов
+            "targets": {}      # "<file key>:<ID ноды>" -> раздел (от давно обработанных к свежим)
+        }
+    
+    def set_format(self, format_version: str):
+        """
+        Запоминает версию формата анализа. Если прошлый запуск делала другая версия
+        анализатора, ни манифест, ни кэш поддеревьев с прошлого запуска не используются
+        """
+        if self.manifest.get("format") != format_version:
+            self.manifest = {"format": format_version, "output": None, "targets": {}}
+            self.previous = self._empty()
+            self.reuse_subtrees = False
+    
+    def select_target(self, file_key: str, node_id: str):
+        """
+        Макет текущего запуска: сравнивать будем с его разделом манифеста
+        """
+        self.target = f"{file_key}:{node_id}"
+        self.previous = self.manifest["targets"].get(self.target) or self._empty()
+        self.current = self._empty()
+    
+    def _owns_output(self) -> bool:
+        # Файлы в папке результатов записал прошлый запуск этого же макета (а не другого файла)
+        return self.target is not None and self.manifest.get("output") == self.target
+    
+    def record_root(self, root_hash: str) -> bool:
+        """
+        Запоминает хэш всего макета; True если макет не менялся с прошлого запуска
+        """
+        self.current["root"] = root_hash
+        return self._owns_output() and self.previous.get("root") == root_hash
+    
+    def record_context(self, context_hash: str):
+        """
+        Запоминает хэш общих данных макета (токены и их имена), см. compute_context_hash
+        """
+        self.current["context"] = context_hash
+    
+    def record_frame(self, original_id: str, subtree_hash: str, start: int):
+        """
+        Запоминает хэш поддерева и номер, с которого начинается нумерация его элементов
+        """
+        self.current["frames"][original_id] = {"hash": subtree_hash, "start": start}
+    
+    def is_unchanged(self, original_id: str) -> bool:
+        """
+        Фрейм не изменился, если совпал хэш его поддерева и нумерация элементов, а общие
+        для макета токены остались прежними (тогда его JSON и промпт с прошлого запуска можно
+        не перезаписывать). Вызывается после record_context
+        """
+        if not self._owns_output() or self.previous.get("context") != self.current["context"]:
+            return False
+        before = self.previous["frames"].get(original_id)
+        return before is not None and before == self.current["frames"].get(original_id)
+    
+    def load_subtree(self, subtree_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Результат анализа поддерева с таким хэшем (если уже анализировали)
+        """
+        path = os.path.join(self.subtrees_dir, f"{subtree_hash}.json")
+        if not self.reuse_subtrees or not os.path.exists(path):
+            return None
+        try:
+            return JsonSerializer(pretty=False).load(path)
+        except (OSError, ValueError):
+            return None
+    
+    def store_subtree(self, subtree_hash: str, element: Dict[str, Any], size: int):
+        """
+        Кэширует анализ поддерева из size элементов, если оно не меньше порога
+        (на мелких чтение файла не быстрее анализа, а файлов было бы по одному на каждый лист)
+        Кэш пишется через JsonSerializer: поддерево любой глубины (запасной кодировщик без рекурсии)
+        """
+        if size < self.min_subtree_elements:
+            return
+        path = os.path.join(self.subtrees_dir, f"{subtree_hash}.json")
+        JsonSerializer(pretty=False).dump(element, path)
+    
+    def commit(self):
+        """
+        Сохраняет раздел текущего запуска и удаляет кэш поддеревьев, которых нет ни в одном разделе
+        Вызывается только после успешной генерации всех файлов; после него манифест готов к следующему запуску
+        """
+        targets = self.manifest["targets"]
+        targets.pop(self.target, None)
+        targets[self.target] = self.current  # В конец - самый свежий
+        while len(targets) > max(self.max_targets, 1):
+            targets.pop(next(iter(targets)))
+        self.manifest["output"] = self.target
+        
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        
+        alive = {frame["hash"] for target in targets.values() for frame in target["frames"].values()}
+        for filename in os.listdir(self.subtrees_dir):
+            if filename.endswith(".json") and filename[:-5] not in alive:
+                os.remove(os.path.join(self.subtrees_dir, filename))
+        
+        # Долгоживущий процесс: следующий запуск этого макета сравнивает уже с этим
+        self.previous = self.current
+        self.current = self._empty()
+        self.reuse_subtrees = True
@@ -0,0 +1,270 @@
+# layout_inference.py
+import math
+from typing import Dict, Any, List, Optional
+
+# Допуск в пикселях: значения, отличающиеся меньше, считаются равными
+LAYOUT_TOLERANCE = 1.0
+# Ребенок, занимающий такую долю площади родителя и накрывающий остальных, - это фон
+BACKGROUND_COVERAGE = 0.9
+# Элемент, попадающий в большее число ячеек пространственной сетки, проверяется отдельно
+MAX_CELLS_PER_BOX = 64
+# До стольких детей пересечения проверяются попарно - сетка дороже самих сравнений
+PAIRWISE_MAX_CHILDREN = 16
+# Сколько пар пересекающихся элементов перечислять (всего пар считаем все)
+MAX_REPORTED_OVERLAPS = 10
+
+class Box:
+    """
+    Прямоугольник ребенка: координаты из absoluteBoundingBox и ID ноды Figma
+    """
+    
+    __slots__ = ("node_id", "x", "y", "width", "height", "right", "bottom")
+    
+    def __init__(self, node_id: str, x: float, y: float, width: float, height: float):
+        self.node_id = node_id
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.right = x + width
+        self.bottom = y + height
+
+def _box(node: Dict[str, Any]) -> Optional[Box]:
+    bounding_box = node.get("absoluteBoundingBox")
+    if not bounding_box or not node.get("visible", True):
+        return None
+    return Box(node.get("id", ""), bounding_box.get("x", 0), bounding_box.get("y", 0),
+               bounding_box.get("width", 0), bounding_box.get("height", 0))
+
+def infer_layout(parent: Dict[str, Any], children: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Восстанавливает раскладку детей фрейма с абсолютным позиционированием (layoutMode NONE):
+    ряд, колонка или сетка, отступы между элементами, выравнивание, внутренние отступы
+    родителя и пересечения. Все шаги - сортировка и проход по отсортированному
+    списку (O(n log n)), пересечения ищутся через пространственную сетку
+    parent: нода Figma (нужен только absoluteBoundingBox)
+    children: ноды детей (нужны id, absoluteBoundingBox и visible)
+    Возвращает None, если видимых детей с геометрией меньше двух
+    """
+    boxes = [box for box in (_box(child) for child in children) if box is not None]
+    if len(boxes) < 2:
+        return None
+    
+    parent_box = _box(parent)
+    backgrounds = _find_backgrounds(parent_box, boxes)
+    if backgrounds:
+        background_ids = {id(box) for box in backgrounds}
+        boxes = [box for box in boxes if id(box) not in background_ids]
+    
+    overlaps = _find_overlaps(boxes)
+    inferred = {"type": "absolute"}
+    
+    if len(boxes) >= 2:
+        inferred.update(_classify(_bands(boxes, "y", "bottom"), _bands(boxes, "x", "right")))
+    
+    if parent_box is not None and boxes:
+        inferred["padding"] = {
+            "left": _round(min(box.x for box in boxes) - parent_box.x),
+            "right": _round(parent_box.right - max(box.right for box in boxes)),
+            "top": _round(min(box.y for box in boxes) - parent_box.y),
+            "bottom": _round(parent_box.bottom - max(box.bottom for box in boxes))
+        }
+    
+    inferred["overlaps"] = overlaps["count"]
+    if overlaps["pairs"]:
+        inferred["overlapping"] = overlaps["pairs"]
+    if backgrounds:
+        inferred["backgrounds"] = [box.node_id for box in backgrounds]
+    inferred["css"] = _css_hint(inferred)
+    return inferred
+
+def _round(value: float) -> float:
+    value = round(value, 2)
+    return int(value) if float(value).is_integer() else value
+
+def _bands(boxes: List[Box], start: str, end: str) -> List[List[Box]]:
+    """
+    Группирует прямоугольники в полосы по одной оси (ряды по y или колонки по x):
+    после сортировки по началу новый элемент попадает в текущую полосу, если
+    пересекается с ней по этой оси (sweep по отсортированному списку)
+    """
+    ordered = sorted(boxes, key=lambda box: getattr(box, start))
+    bands = []
+    band_end = None
+    for box in ordered:
+        if band_end is not None and getattr(box, start) < band_end - LAYOUT_TOLERANCE:
+            bands[-1].append(box)
+            band_end = max(band_end, getattr(box, end))
+        else:
+            bands.append([box])
+            band_end = getattr(box, end)
+    return bands
+
+def _classify(rows: List[List[Box]], columns: List[List[Box]]) -> Dict[str, Any]:
+    """
+    Тип раскладки по полосам: один ряд - flex row, одна колонка - flex column
+    (если элементы идут друг за другом без наложений), одинаковое число элементов
+    в каждом ряду (кроме последнего) и столько же колонок - grid
+    """
+    if len(rows) == 1:
+        items = sorted(rows[0], key=lambda box: box.x)
+        if _sequential(items, "x", "right"):
+            result = {"type": "row", "columns": len(items)}
+            result.update(_gaps(items, "x", "right", "gap_x"))
+            result["align"] = _alignment(items, "y", "height")
+            return result
+    
+    if len(columns) == 1:
+        items = sorted(columns[0], key=lambda box: box.y)
+        if _sequential(items, "y", "bottom"):
+            result = {"type": "column", "rows": len(items)}
+            result.update(_gaps(items, "y", "bottom", "gap_y"))
+            result["align"] = _alignment(items, "x", "width")
+            return result
+    
+    # Последний ряд сетки может быть неполным (перенос, как у flex-wrap)
+    per_row = {len(row) for row in rows[:-1]}
+    if (len(per_row) == 1 and len(columns) == len(rows[0]) and len(rows[0]) >= 2
+            and len(rows[-1]) <= len(rows[0])):
+        result = {"type": "grid", "rows": len(rows), "columns": len(columns)}
+        result.update(_gaps(sorted(rows[0], key=lambda box: box.x), "x", "right", "gap_x"))
+        row_spans = [Box("", 0, min(box.y for box in row), 0, max(box.bottom for box in row) - min(box.y for box in row))
+                     for row in rows]
+        row_gaps = _gaps(row_spans, "y", "bottom", "gap_y")
+        result["gap_y"] = row_gaps["gap_y"]
+        result["uniform_gap"] = result["uniform_gap"] and row_gaps["uniform_gap"]
+        return result
+    
+    return {"type": "absolute", "rows": len(rows), "columns": len(columns)}
+
+def _sequential(items: List[Box], start: str, end: str) -> bool:
+    """
+    Элементы, отсортированные по оси, не накладываются друг на друга вдоль нее
+    """
+    return all(getattr(following, start) >= getattr(current, end) - LAYOUT_TOLERANCE
+               for current, following in zip(items, items[1:]))
+
+def _gaps(items: List[Box], start: str, end: str, name: str) -> Dict[str, Any]:
+    """
+    Отступ между соседями по оси: медиана и признак одинаковых отступов
+    """
+    gaps = sorted(getattr(following, start) - getattr(current, end) for current, following in zip(items, items[1:]))
+    if not gaps:
+        return {name: 0, "uniform_gap": True}
+    median = gaps[len(gaps) // 2]
+    return {name: _round(median), "uniform_gap": gaps[-1] - gaps[0] <= LAYOUT_TOLERANCE}
+
+def _alignment(items: List[Box], start: str, size: str) -> Optional[str]:
+    """
+    Выравнивание по поперечной оси: start/center/end, если совпадает у всех элементов
+    """
+    def aligned(values: List[float]) -> bool:
+        return max(values) - min(values) <= LAYOUT_TOLERANCE
+    
+    if aligned([getattr(box, start) for box in items]):
+        return "start"
+    if aligned([getattr(box, start) + getattr(box, size) / 2 for box in items]):
+        return "center"
+    if aligned([getattr(box, start) + getattr(box, size) for box in items]):
+        return "end"
+    return None
+
+def _find_backgrounds(parent_box: Optional[Box], boxes: List[Box]) -> List[Box]:
+    """
+    Дети-подложки: почти вся площадь родителя и накрывают всех остальных детей
+    Их исключаем из анализа рядов и пересечений, иначе они "склеивают" все в одну полосу
+    """
+    if parent_box is None or parent_box.width <= 0 or parent_box.height <= 0:
+        return []
+    parent_area = parent_box.width * parent_box.height
+    
+    candidates = [box for box in boxes if box.width * box.height >= BACKGROUND_COVERAGE * parent_area]
+    if not candidates or len(candidates) == len(boxes):
+        return []
+    
+    others = [box for box in boxes if box not in candidates]
+    left = min(box.x for box in others)
+    top = min(box.y for box in others)
+    right = max(box.right for box in others)
+    bottom = max(box.bottom for box in others)
+    return [box for box in candidates
+            if box.x <= left + LAYOUT_TOLERANCE and box.y <= top + LAYOUT_TOLERANCE
+            and box.right >= right - LAYOUT_TOLERANCE and box.bottom >= bottom - LAYOUT_TOLERANCE]
+
+def _find_overlaps(boxes: List[Box]) -> Dict[str, Any]:
+    """
+    Пары пересекающихся прямоугольников через равномерную пространственную сетку:
+    каждый элемент кладется в ячейки, которые он накрывает, и сравнивается только
+    с соседями по ячейкам. Размер ячейки - медианный размер элемента
+    """
+    if len(boxes) <= PAIRWISE_MAX_CHILDREN:
+        candidates = ((first, second) for first in range(len(boxes)) for second in range(first + 1, len(boxes)))
+    else:
+        candidates = _grid_candidates(boxes)
+    
+    pairs = []
+    for first, second in candidates:
+        a, b = boxes[first], boxes[second]
+        if (a.x < b.right - LAYOUT_TOLERANCE and b.x < a.right - LAYOUT_TOLERANCE
+                and a.y < b.bottom - LAYOUT_TOLERANCE and b.y < a.bottom - LAYOUT_TOLERANCE):
+            pairs.append((first, second))
+    
+    pairs.sort()
+    return {
+        "count": len(pairs),
+        "pairs": [[boxes[first].node_id, boxes[second].node_id] for first, second in pairs[:MAX_REPORTED_OVERLAPS]]
+    }
+
+def _grid_candidates(boxes: List[Box]) -> set:
+    """
+    Пары (меньший номер, больший номер) элементов, попавших в общую ячейку сетки
+    """
+    sizes = sorted(max(box.width, box.height) for box in boxes)
+    cell = max(sizes[len(sizes) // 2], LAYOUT_TOLERANCE)
+    
+    grid = {}        # (колонка, ряд) -> номера элементов
+    large = []       # Огромные элементы - сравниваются со всеми напрямую
+    for index, box in enumerate(boxes):
+        first_column, last_column = math.floor(box.x / cell), math.floor(box.right / cell)
+        first_row, last_row = math.floor(box.y / cell), math.floor(box.bottom / cell)
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > MAX_CELLS_PER_BOX:
+            large.append(index)
+            continue
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                grid.setdefault((column, row), []).append(index)
+    
+    candidates = set()
+    for members in grid.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                candidates.add((members[i], members[j]))  # Номера в ячейке идут по возрастанию
+    for index in large:
+        for other in range(len(boxes)):
+            if other != index:
+                candidates.add((min(index, other), max(index, other)))
+    return candidates
+
+def _css_hint(inferred: Dict[str, Any]) -> str:
+    """
+    Подсказка для верстки: какой flex/grid воспроизведет найденную раскладку
+    """
+    align_items = {"start": "flex-start", "center": "center", "end": "flex-end"}
+    layout_type = inferred["type"]
+    
+    if layout_type in ("row", "column"):
+        gap = inferred.get("gap_x" if layout_type == "row" else "gap_y", 0)
+        parts = ["display: flex", f"flex-direction: {layout_type}"]
+        if gap > 0:
+            parts.append(f"gap: {gap}px")
+        if inferred.get("align"):
+            parts.append(f"align-items: {align_items[inferred['align']]}")
+        return "; ".join(parts)
+    
+    if layout_type == "grid":
+        parts = ["display: grid", f"grid-template-columns: repeat({inferred['columns']}, 1fr)"]
+        if inferred.get("gap_y", 0) > 0 or inferred.get("gap_x", 0) > 0:
+            parts.append(f"gap: {max(inferred.get('gap_y', 0), 0)}px {max(inferred.get('gap_x', 0), 0)}px")
+        return "; ".join(parts)
+    
+    return "position: relative (дети - position: absolute)"
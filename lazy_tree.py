@@ -0,0 +1,83 @@
+# lazy_tree.py
+from collections.abc import Mapping
+from typing import Dict, Any
+
+# Поля, которые берутся прямо из ноды Figma - обращение к ним не запускает анализ поддерева
+CHEAP_FIELDS = ("id", "original_id", "name", "type", "depth", "size", "position", "visibility", "locked")
+
+class LazyElement(Mapping):
+    """
+    Ленивый элемент анализа - прямой ребенок корня в ленивом режиме DeepFigmaAnalyzer
+    Поля из CHEAP_FIELDS отдаются сразу, при обращении к любому другому полю поддерево
+    анализируется целиком (один раз, результат запоминается). Размер поддерева, число
+    детей и гистограмма типов известны заранее - из предварительного прохода анализатора
+    """
+    
+    __slots__ = ("analyzer", "node", "parent_id", "start", "summary", "element")
+    
+    def __init__(self, analyzer, node: Dict[str, Any], parent_id: str, start: int, summary: Dict[str, Any]):
+        self.analyzer = analyzer    # DeepFigmaAnalyzer, который разберет поддерево
+        self.node = node            # Сырая нода Figma (отпускается после анализа)
+        self.parent_id = parent_id
+        self.start = start          # Номер элемента в общей нумерации (часть ID)
+        self.summary = summary      # total_elements, element_count, type_counts
+        self.element = None         # Результат анализа поддерева
+    
+    @property
+    def materialized(self) -> bool:
+        return self.element is not None
+    
+    @property
+    def total_elements(self) -> int:
+        """Элементов в поддереве (вместе с самим элементом) - без анализа"""
+        return self.summary["total_elements"]
+    
+    def materialize(self) -> Dict[str, Any]:
+        """
+        Элемент со всем поддеревом (при первом вызове - анализ)
+        """
+        if self.element is None:
+            self.element = self.analyzer.materialize(self.node, self.parent_id, self.start)
+            self.node = None
+        return self.element
+    
+    def _cheap_field(self, key: str):
+        get = self.node.get
+        if key == "id":
+            return f"{self.parent_id}-{self.start}"
+        if key == "depth":
+            return 1
+        if key in ("size", "position"):
+            bounding_box = get("absoluteBoundingBox") or {}
+            if key == "size":
+                return {"width": bounding_box.get("width", 0), "height": bounding_box.get("height", 0)}
+            return {"x": bounding_box.get("x", 0), "y": bounding_box.get("y", 0)}
+        if key == "visibility":
+            return get("visible", True)
+        if key == "locked":
+            return get("locked", False)
+        return get("id" if key == "original_id" else key, "")
+    
+    def __getitem__(self, key: str):
+        if self.element is None and key in CHEAP_FIELDS:
+            return self._cheap_field(key)
+        return self.materialize()[key]
+    
+    def __iter__(self):
+        return iter(self.materialize())
+    
+    def __len__(self) -> int:
+        return len(self.materialize())
+    
+    def __repr__(self) -> str:
+        state = "разобран" if self.element is not None else "не разобран"
+        return f"LazyElement({self['id']!r}, {state})"
+    
+    def outline(self) -> Dict[str, Any]:
+        """
+        Сводка без анализа поддерева: дешевые поля, число детей, размер поддерева и типы
+        """
+        outline = {key: self[key] for key in CHEAP_FIELDS}
+        outline.update(self.summary)
+        outline["children"] = []
+        return outline
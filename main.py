@@ -1,13 +1,82 @@
 # main.py
+import contextlib
 import json
 import os
 from datetime import datetime
+from typing import Set, Callable
 from figma_client import FigmaClient
 from deep_analyzer import DeepFigmaAnalyzer
 from smart_prompt_generator import SmartPromptGenerator
 from frame_splitter import FrameSplitter
+from incremental import IncrementalManifest
 from config import Config
 
+@contextlib.contextmanager
+def _logging_to(log: Callable[[str], None], *components):
+    """
+    Подменяет атрибут log у компонентов, по выходу возвращает прежний
+    """
+    saved = [component.log for component in components]
+    for component in components:
+        component.log = log
+    try:
+        yield
+    finally:
+        for component, previous in zip(components, saved):
+            component.log = previous
+
+def run_pipeline(figma_client: FigmaClient, deep_analyzer: DeepFigmaAnalyzer, frame_splitter: FrameSplitter,
+                 smart_generator: SmartPromptGenerator, incremental: IncrementalManifest = None,
+                 frame_ids: Set[str] = None, log: Callable[[str], None] = print):
+    """
+    Этапы 1-4 (данные Figma -> анализ -> фреймы -> промпты) одним вызовом
+    Возвращает (анализ, фреймы) или None, если данные из Figma не получены
+    frame_ids: оригинальные ID родительских фреймов, которые разобрать сейчас (None - все);
+    остальные откладываются до FrameSplitter.extract_parent_frame (в ленивом анализе не разбираются вовсе)
+    Компоненты не хранят состояние запуска, поэтому долгоживущий процесс (сервер)
+    вызывает функцию с одними и теми же экземплярами для каждого задания
+    log: куда пишут ход выполнения конвейер и компоненты (их атрибут log) - сервер собирает его
+    в ответ задания, не трогая sys.stdout
+    """
+    # Компоненты пишут ход работы через свой атрибут log - на время запуска направляем его в log
+    with _logging_to(log, figma_client, deep_analyzer, frame_splitter, smart_generator):
+        # ЭТАП 1: 📡 ПОЛУЧЕНИЕ ДАННЫХ ИЗ FIGMA
+        log("\n📍 ЭТАП 1: Получаем данные из Figma API...")
+        try:
+            figma_data = figma_client.get_full_structure()
+        finally:
+            # Чтения из кэша копят время доступа и счетчики в памяти - индекс пишем один раз за запуск
+            if figma_client.cache is not None:
+                figma_client.cache.flush()
+        
+        # Проверяем что данные получены (полный файл качается только по требованию)
+        if not figma_data.get("specific_node") and not figma_data.get("node_stream"):
+            log("❌ Не удалось получить данные из Figma API")
+            log("   Проверьте FIGMA_ACCESS_TOKEN и FIGMA_FILE_KEY в .env файле")
+            return None
+        
+        log("✅ Данные успешно получены из Figma")
+        
+        # ЭТАП 2: 🔍 ПОЛНЫЙ АНАЛИЗ СТРУКТУРЫ FIGMA
+        log("\n📍 ЭТАП 2: Выполняем ПОЛНЫЙ анализ структуры...")
+        complete_analysis = deep_analyzer.analyze_completely(figma_data)
+        
+        # ЭТАП 3: ✂️ РАЗДЕЛЕНИЕ НА РОДИТЕЛЬСКИЕ ФРЕЙМЫ ПЕРВОГО УРОВНЯ
+        log("\n📍 ЭТАП 3: Разделяем структуру на родительские фреймы первого уровня...")
+        frames_data = frame_splitter.split_into_frames(complete_analysis, frame_ids)
+        
+        # ЭТАП 4: 🧠 ГЕНЕРАЦИЯ УМНЫХ ПРОМПТОВ ДЛЯ КАЖДОГО ФРЕЙМА
+        log("\n📍 ЭТАП 4: Генерируем УМНЫЕ промпты для каждого фрейма...")
+        smart_generator.generate_smart_prompts(complete_analysis, frames_data)
+        
+        # Все файлы записаны - фиксируем хэши, следующий запуск пропустит неизменившиеся фреймы
+        if incremental is not None:
+            incremental.commit()
+        
+        statistics = complete_analysis["statistics"]
+        log(f"✅ Элементов: {statistics['total_elements']}, фреймов: {frames_data['total_frames']}")
+        return complete_analysis, frames_data
+
 def main():
     """
     ГЛАВНЫЙ СКРИПТ СИСТЕМЫ FIGMA-TO-CODE
@@ -23,34 +92,20 @@ def main():
     # ИНИЦИАЛИЗАЦИЯ КОМПОНЕНТОВ СИСТЕМЫ
     # Каждый компонент отвечает за свою часть работы:
     figma_client = FigmaClient()           # 📡 Работа с Figma API
-    deep_analyzer = DeepFigmaAnalyzer()    # 🔍 Анализ структуры Figma
+    # ♻️ Манифест инкрементальной обработки (пересчитываем только изменившиеся фреймы)
+    # Ленивый анализ кэш поддеревьев не использует - манифест не трогаем
+    incremental = IncrementalManifest() if Config.INCREMENTAL_PROCESSING and not Config.LAZY_ANALYSIS else None
+    deep_analyzer = DeepFigmaAnalyzer(incremental)  # 🔍 Анализ структуры Figma
     smart_generator = SmartPromptGenerator()  # 🧠 Генерация промптов для ИИ
     frame_splitter = FrameSplitter()       # ✂️ Разделение на логические фреймы
     
     try:
-        # ЭТАП 1: 📡 ПОЛУЧЕНИЕ ДАННЫХ ИЗ FIGMA
-        print("\n📍 ЭТАП 1: Получаем данные из Figma API...")
-        figma_data = figma_client.get_full_structure()
-        
-        # Проверяем что данные получены
-        if not figma_data.get("full_file"):
-            print("❌ Не удалось получить данные из Figma API")
-            print("   Проверьте FIGMA_ACCESS_TOKEN и FIGMA_FILE_KEY в .env файле")
+        # Ленивый анализ: сразу разбираем только фреймы из LAZY_FRAME_IDS, иначе он не дешевле полного
+        frame_ids = set(Config.LAZY_FRAME_IDS) if deep_analyzer.lazy else None
+        result = run_pipeline(figma_client, deep_analyzer, frame_splitter, smart_generator, incremental, frame_ids)
+        if result is None:
             return
-        
-        print("✅ Данные успешно получены из Figma")
-        
-        # ЭТАП 2: 🔍 ПОЛНЫЙ АНАЛИЗ СТРУКТУРЫ FIGMA
-        print("\n📍 ЭТАП 2: Выполняем ПОЛНЫЙ анализ структуры...")
-        complete_analysis = deep_analyzer.analyze_completely(figma_data)
-        
-        # ЭТАП 3: ✂️ РАЗДЕЛЕНИЕ НА РОДИТЕЛЬСКИЕ ФРЕЙМЫ ПЕРВОГО УРОВНЯ
-        print("\n📍 ЭТАП 3: Разделяем структуру на родительские фреймы первого уровня...")
-        frames_data = frame_splitter.split_into_frames(complete_analysis)
-        
-        # ЭТАП 4: 🧠 ГЕНЕРАЦИЯ УМНЫХ ПРОМПТОВ ДЛЯ КАЖДОГО ФРЕЙМА
-        print("\n📍 ЭТАП 4: Генерируем УМНЫЕ промпты для каждого фрейма...")
-        smart_generator.generate_smart_prompts(complete_analysis, frames_data)
+        complete_analysis, frames_data = result
         
         # ВЫВОД СТАТИСТИКИ И РЕЗУЛЬТАТОВ
         stats = complete_analysis["statistics"]
@@ -60,6 +115,9 @@ def main():
         print(f"   - Уникальных типов: {len(stats['type_counts'])}")
         print(f"   - Всего фреймов: {frames_data['total_frames']}")
         print(f"   - Родительских фреймов: {len(frames_data['parent_frames'])}")
+        deferred = sum(1 for frame in frames_data['parent_frames'] if frame.get('deferred'))
+        if deferred:
+            print(f"   - Отложено (ленивый анализ, не разобраны): {deferred} - нужные укажи в LAZY_FRAME_IDS")
         
         # Показываем какие типы элементов найдены
         print(f"   - Распределение по типам:")
@@ -70,8 +128,12 @@ def main():
         print(f"📂 Папка с результатами: {Config.OUTPUT_DIR}/")
         
         print(f"\n📋 СТРУКТУРА ВЫХОДНЫХ ФАЙЛОВ:")
-        print(f"   📄 frames/root_frame.json - Корневой фрейм (весь макет)")
-        print(f"   📁 frames/ - Родительские фреймы ({len(frames_data['parent_frames'])} шт)")
+        if Config.FRAME_STORE == "files":
+            print(f"   📄 frames/root_frame.json - Корневой фрейм (весь макет)")
+            print(f"   📁 frames/ - Родительские фреймы ({len(frames_data['parent_frames'])} шт)")
+        else:
+            print(f"   📦 frames.<N>.jsonl - Корневой и родительские фреймы ({len(frames_data['parent_frames'])} шт) одним файлом")
+            print(f"   📄 frames_index.json - Где во frames.<N>.jsonl лежит каждый фрейм")
         print(f"   📄 frames_metadata.json - Метаданные фреймов")
         print(f"   📄 FRAMES_INDEX.md - Навигация по фреймам")
         print(f"   📁 smart_prompts/ - Умные промпты для ИИ")
@@ -97,6 +159,12 @@ def main():
             if len(frames_data['parent_frames']) > 10:
                 print(f"   ... и еще {len(frames_data['parent_frames']) - 10} фреймов")
         
+        # Статистика дискового кэша Figma API
+        if figma_client.cache is not None:
+            cache_stats = figma_client.cache.stats()
+            print(f"\n💾 Кэш Figma API: попаданий {cache_stats['run_hits']}, промахов {cache_stats['run_misses']}"
+                  f" (всего записей: {cache_stats['entries']}, {cache_stats['bytes'] // 1024} КБ)")
+        
         print(f"\n⏱️  Процесс завершен в: {datetime.now().strftime('%H:%M:%S')}")
         print(f"🎉 Система готова к работе! Используй промпты из папки smart_prompts/")
         
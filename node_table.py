@@ -0,0 +1,316 @@
+# node_table.py
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Any, List
+from style_table import StyleTable
+
+# NumPy - компактные колонки и быстрое построение индекса детей
+# Если библиотеки нет, колонки остаются в стандартном модуле array (тоже компактно)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Типы-фигуры: для них в content добавляются shape_type и fill_type (как в DeepFigmaAnalyzer)
+SHAPE_TYPES = ("RECTANGLE", "ELLIPSE", "VECTOR", "LINE")
+
+# Порядок полей элемента - такой же, как в словаре от DeepFigmaAnalyzer
+ELEMENT_FIELDS = ("id", "original_id", "name", "type", "depth", "size", "position", "layout",
+                  "styles", "style_id", "content", "effects", "visibility", "locked", "children")
+# Дополнительные поля экземпляра компонента (ссылка на мастер и переопределения)
+INSTANCE_FIELDS = ("component_id", "overrides")
+
+# Биты колонки int_mask: какие геометрические значения были целыми числами в ответе Figma
+WIDTH_INT, HEIGHT_INT, X_INT, Y_INT = 1, 2, 4, 8
+
+class InternTable:
+    """
+    Таблица интернирования: одинаковые значения хранятся один раз, ноды ссылаются на номер
+    """
+    
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+    
+    def intern(self, key, value=None) -> int:
+        """
+        Номер значения по ключу; value (если задано) сохраняется при первом появлении ключа
+        """
+        number = self.ids.get(key)
+        if number is None:
+            number = len(self.values)
+            self.values.append(key if value is None else value)
+            self.ids[key] = number
+        return number
+    
+    def __len__(self) -> int:
+        return len(self.values)
+
+class NodeTable:
+    """
+    Компактное колоночное хранилище результата анализа (struct-of-arrays)
+    Одна строка = один элемент: геометрия, глубина, родитель и номера интернированных
+    строк и записей (стили из общей StyleTable, лайаут, эффекты). Для потребителей, которые ждут словари
+    (FrameSplitter, SmartPromptGenerator), есть ленивое представление NodeView
+    """
+    
+    def __init__(self, root_prefix: str = "root", styles: StyleTable = None):
+        self.root_prefix = root_prefix  # Префикс ID корня (как element_id в анализаторе)
+        self.styles = styles if styles is not None else StyleTable()  # Общая таблица стилей анализатора
+        
+        # Колонки пополняются через array (быстрое добавление), в freeze() переводятся в NumPy
+        self.x = array("d")
+        self.y = array("d")
+        self.width = array("d")
+        self.height = array("d")
+        self.int_mask = array("B")      # Биты WIDTH_INT/HEIGHT_INT/X_INT/Y_INT
+        self.depth = array("i")
+        self.parent = array("i")        # Номер строки родителя (-1 у корня)
+        self.number = array("i")        # Номер элемента из счетчика анализатора (часть ID)
+        self.type_code = array("i")
+        self.name = array("i")
+        self.text = array("i")          # Текст TEXT-нод ("" у остальных)
+        self.description = array("i")
+        self.style = array("i")
+        self.layout = array("i")
+        self.effects = array("i")
+        self.flags = array("B")         # Бит 1 - видимость, бит 2 - заблокирован
+        self.original_ids: List[str] = []  # Оригинальные ID уникальны - без интернирования
+        self.instances: Dict[int, Dict[str, Any]] = {}  # Строка экземпляра -> component_id и overrides
+        self.collapsed: Dict[int, int] = {}  # Строка свернутой иконки -> сколько нод в ней свернуто
+        
+        # Интернированные строки и записи (каждое уникальное значение - один раз)
+        self.types = InternTable()
+        self.strings = InternTable()
+        self.layouts = InternTable()
+        self.effect_lists = InternTable()
+        self.strings.intern("")           # Номер 0 - пустая строка
+        self.effect_lists.intern(None, [])  # Номер 0 - нет эффектов
+        
+        # Индекс детей в формате CSR: дети строки i - child_index[child_offsets[i]:child_offsets[i + 1]]
+        self.child_offsets = None
+        self.child_index = None
+    
+    def __len__(self) -> int:
+        return len(self.parent)
+    
+    def add(self, node: Dict[str, Any], parent: int, depth: int, number: int,
+            style_id: int, layout_id: int, effects_id: int) -> int:
+        """
+        Добавляет строку для ноды Figma и возвращает ее номер
+        Стили (style_id из StyleTable), лайаут и эффекты передаются уже интернированными
+        """
+        get = node.get
+        bounding_box = get("absoluteBoundingBox") or {}
+        width = bounding_box.get("width", 0)
+        height = bounding_box.get("height", 0)
+        x = bounding_box.get("x", 0)
+        y = bounding_box.get("y", 0)
+        
+        self.width.append(width)
+        self.height.append(height)
+        self.x.append(x)
+        self.y.append(y)
+        self.int_mask.append((WIDTH_INT if isinstance(width, int) else 0)
+                             | (HEIGHT_INT if isinstance(height, int) else 0)
+                             | (X_INT if isinstance(x, int) else 0)
+                             | (Y_INT if isinstance(y, int) else 0))
+        self.depth.append(depth)
+        self.parent.append(parent)
+        self.number.append(number)
+        
+        node_type = get("type", "")
+        self.type_code.append(self.types.intern(node_type))
+        self.name.append(self.strings.intern(get("name", "")))
+        self.text.append(self.strings.intern(get("characters", "")) if node_type == "TEXT" else 0)
+        self.description.append(self.strings.intern(get("description", "")))
+        self.style.append(style_id)
+        self.layout.append(layout_id)
+        self.effects.append(effects_id)
+        self.flags.append((1 if get("visible", True) else 0) | (2 if get("locked", False) else 0))
+        self.original_ids.append(get("id", ""))
+        return len(self.parent) - 1
+    
+    def freeze(self):
+        """
+        Завершает построение: колонки -> NumPy массивы, строится индекс детей
+        """
+        count = len(self.parent)
+        
+        if np is not None:
+            for column in ("x", "y", "width", "height"):
+                setattr(self, column, np.frombuffer(getattr(self, column), dtype=np.float64).copy())
+            for column in ("depth", "parent", "number", "type_code", "name", "text",
+                           "description", "style", "layout", "effects"):
+                setattr(self, column, np.frombuffer(getattr(self, column), dtype=np.int32).copy())
+            self.int_mask = np.frombuffer(self.int_mask, dtype=np.uint8).copy()
+            self.flags = np.frombuffer(self.flags, dtype=np.uint8).copy()
+            
+            # Устойчивая сортировка по родителю сохраняет порядок детей внутри родителя
+            has_parent = self.parent >= 0
+            rows = np.arange(count, dtype=np.int32)[has_parent]
+            parents = self.parent[has_parent]
+            order = np.argsort(parents, kind="stable")
+            self.child_index = rows[order]
+            counts = np.bincount(parents, minlength=count)
+            self.child_offsets = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(counts, out=self.child_offsets[1:])
+        else:
+            counts = [0] * (count + 1)
+            for parent in self.parent:
+                if parent >= 0:
+                    counts[parent + 1] += 1
+            for i in range(count):
+                counts[i + 1] += counts[i]
+            self.child_offsets = array("q", counts)
+            positions = list(counts[:count])
+            self.child_index = array("i", [0] * (count - sum(1 for p in self.parent if p < 0)))
+            for row, parent in enumerate(self.parent):
+                if parent >= 0:
+                    self.child_index[positions[parent]] = row
+                    positions[parent] += 1
+    
+    def children_of(self, row: int) -> List[int]:
+        return [int(child) for child in self.child_index[self.child_offsets[row]:self.child_offsets[row + 1]]]
+    
+    def element_id(self, row: int) -> str:
+        """
+        ID элемента в том же формате, что у DeepFigmaAnalyzer: <ID родителя>-<номер>
+        """
+        numbers = []
+        while row >= 0:
+            numbers.append(str(self.number[row]))
+            row = int(self.parent[row])
+        return self.root_prefix + "-" + "-".join(reversed(numbers))
+    
+    def _geometry(self, row: int, column: str, int_bit: int):
+        value = float(getattr(self, column)[row])
+        return int(value) if self.int_mask[row] & int_bit else value
+    
+    def field(self, row: int, key: str):
+        """
+        Значение поля элемента в том же виде, что в словаре от DeepFigmaAnalyzer
+        Записи стилей/лайаута общие для одинаковых элементов - их нельзя изменять
+        """
+        if key == "id":
+            return self.element_id(row)
+        if key == "original_id":
+            return self.original_ids[row]
+        if key == "name":
+            return self.strings.values[self.name[row]]
+        if key == "type":
+            return self.types.values[self.type_code[row]]
+        if key == "depth":
+            return int(self.depth[row])
+        if key == "size":
+            return {"width": self._geometry(row, "width", WIDTH_INT),
+                    "height": self._geometry(row, "height", HEIGHT_INT)}
+        if key == "position":
+            return {"x": self._geometry(row, "x", X_INT), "y": self._geometry(row, "y", Y_INT)}
+        if key == "layout":
+            return self.layouts.values[self.layout[row]]
+        if key == "styles":
+            return self.styles[self.style[row]]
+        if key == "style_id":
+            return int(self.style[row])
+        if key == "content":
+            return self._content(row)
+        if key == "effects":
+            return self.effect_lists.values[self.effects[row]]
+        if key == "visibility":
+            return bool(self.flags[row] & 1)
+        if key == "locked":
+            return bool(self.flags[row] & 2)
+        if key == "children":
+            return [NodeView(self, child) for child in self.children_of(row)]
+        if key in INSTANCE_FIELDS and row in self.instances:
+            return self.instances[row][key]
+        if key == "collapsed" and row in self.collapsed:
+            return self.collapsed[row]
+        raise KeyError(key)
+    
+    def fields(self, row: int) -> tuple:
+        """Поля элемента: у экземпляров компонентов к обычным добавляются INSTANCE_FIELDS, у свернутых иконок - collapsed"""
+        fields = ELEMENT_FIELDS + INSTANCE_FIELDS if row in self.instances else ELEMENT_FIELDS
+        return fields + ("collapsed",) if row in self.collapsed else fields
+    
+    def _content(self, row: int) -> Dict[str, Any]:
+        node_type = self.types.values[self.type_code[row]]
+        content = {
+            "type": node_type.lower(),
+            "text": self.strings.values[self.text[row]],
+            "name": self.strings.values[self.name[row]],
+            "description": self.strings.values[self.description[row]]
+        }
+        if node_type in SHAPE_TYPES:
+            content["shape_type"] = node_type
+            fills = self.styles[self.style[row]].get("fills")
+            if fills:
+                content["fill_type"] = fills[0]["type"]
+        return content
+    
+    def view(self, row: int = 0) -> "NodeView":
+        return NodeView(self, row)
+    
+    def nbytes(self) -> int:
+        """
+        Примерный размер колонок в байтах (без интернированных записей)
+        """
+        columns = (self.x, self.y, self.width, self.height, self.int_mask, self.depth, self.parent,
+                   self.number, self.type_code, self.name, self.text, self.description,
+                   self.style, self.layout, self.effects, self.flags)
+        total = 0
+        for column in columns:
+            total += column.nbytes if np is not None and isinstance(column, np.ndarray) else column.itemsize * len(column)
+        return total
+
+class NodeView(Mapping):
+    """
+    Ленивое словарное представление строки NodeTable
+    Поля вычисляются при обращении, поэтому потребители работают с ним как с обычным
+    элементом анализа, а в памяти не лежат сотни тысяч вложенных словарей
+    """
+    
+    __slots__ = ("table", "row")
+    
+    def __init__(self, table: NodeTable, row: int):
+        self.table = table
+        self.row = row
+    
+    def __getitem__(self, key: str):
+        return self.table.field(self.row, key)
+    
+    def __iter__(self):
+        return iter(self.table.fields(self.row))
+    
+    def __len__(self) -> int:
+        return len(self.table.fields(self.row))
+    
+    def __repr__(self) -> str:
+        return f"NodeView({self.table.element_id(self.row)!r})"
+    
+    def to_dict(self, deep: bool = False) -> Dict[str, Any]:
+        """
+        Материализует элемент в обычный словарь
+        deep=True - вместе со всеми потомками (дети тоже станут словарями)
+        """
+        element = {key: self.table.field(self.row, key) for key in self.table.fields(self.row)}
+        if deep:
+            # Явный стек вместо рекурсии - глубина не ограничена
+            stack = [element]
+            while stack:
+                current = stack.pop()
+                current["children"] = [child.to_dict() for child in current["children"]]
+                stack.extend(current["children"])
+        return element
+
+def json_default(value: Any) -> Any:
+    """
+    Хук default для json.dump: ленивые представления (NodeView, LazyElement)
+    превращаются в словари, остальное (как и раньше) - в строку
+    """
+    if isinstance(value, NodeView):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
@@ -0,0 +1,134 @@
+# pruning.py
+from typing import Dict, Any, Iterable, Iterator, Optional
+from config import Config
+
+# Иконка - группа (или булева операция, вектор) только из векторов: сворачивается в один лист
+# Фреймы и экземпляры не сворачиваются (аватар, разделитель, точки пейджера - это интерфейс)
+ICON_TYPES = frozenset(("GROUP", "BOOLEAN_OPERATION", "VECTOR"))
+ICON_MAX_NODES = 64    # Больше нод - иллюстрация, а не иконка
+ICON_MAX_SIDE = 128    # Больше по ширине или высоте (px) - тоже
+
+def empty_stats() -> Dict[str, int]:
+    """
+    Счетчики отсечения для statistics["pruning"]
+    """
+    return {
+        "hidden": 0,     # Скрытых поддеревьев (visible: false)
+        "by_type": 0,    # Поддеревьев, отброшенных списками типов
+        "by_limit": 0,   # Детей сверх лимита на одну ноду
+        "icons": 0,      # Иконок, свернутых в один лист
+        "nodes": 0       # Всего нод Figma, не ставших элементами
+    }
+
+def subtree_size(node: Dict[str, Any]) -> int:
+    size = 0
+    stack = [node]
+    while stack:  # Явный стек вместо рекурсии - глубина не ограничена
+        current = stack.pop()
+        size += 1
+        stack.extend(current.get("children") or ())
+    return size
+
+class PruningPolicy:
+    """
+    Политика отсечения нод до анализа: скрытые слои, списки разрешенных и запрещенных
+    типов, лимит детей у одной ноды и сворачивание иконок (поддерево из векторов -
+    один лист). Решение принимается по сырой ноде Figma, поэтому одинаково во всех
+    режимах анализатора (словари, NodeTable, процессы пула, ленивый)
+    """
+    
+    def __init__(self, hidden: bool = False, icons: bool = False, allow_types: Iterable[str] = (),
+                 deny_types: Iterable[str] = (), max_children: int = 0):
+        self.hidden = hidden                      # Отбрасывать ноды с visible: false
+        self.icons = icons                        # Сворачивать иконки в один лист
+        self.allow_types = frozenset(allow_types)  # Непустой - остаются только эти типы
+        self.deny_types = frozenset(deny_types)    # Эти типы отбрасываются вместе с поддеревом
+        self.max_children = max_children          # Лимит детей у одной ноды (0 - без лимита)
+        self.enabled = bool(hidden or icons or self.allow_types or self.deny_types or max_children)
+    
+    @classmethod
+    def from_config(cls) -> "PruningPolicy":
+        return cls(hidden=Config.PRUNE_HIDDEN, icons=Config.PRUNE_ICONS, allow_types=Config.PRUNE_ALLOW_TYPES,
+                   deny_types=Config.PRUNE_DENY_TYPES, max_children=Config.PRUNE_MAX_CHILDREN)
+    
+    def for_masters(self) -> "PruningPolicy":
+        """
+        Политика для мастеров компонентов: скрытые дети мастера остаются - экземпляр
+        может сделать их видимыми, и переопределение видимости сравнивается с ними
+        """
+        return PruningPolicy(hidden=False, icons=self.icons, allow_types=self.allow_types,
+                             deny_types=self.deny_types, max_children=self.max_children)
+    
+    def signature(self) -> str:
+        """
+        Настройки одной строкой - для версии формата инкрементального кэша
+        """
+        return (f"hidden={int(self.hidden)},icons={int(self.icons)},allow={'+'.join(sorted(self.allow_types))},"
+                f"deny={'+'.join(sorted(self.deny_types))},max={self.max_children}")
+    
+    def prune(self, node: Dict[str, Any], stats: Optional[Dict[str, int]] = None) -> tuple:
+        """
+        Дети ноды, которые станут элементами, и сколько нод свернуто (иконка - детей нет)
+        stats: куда учесть отсеченное (None - не учитывать: нода уже посчитана другим проходом)
+        """
+        children = node.get("children") or []
+        if not self.enabled or not children:
+            return children, 0
+        if self.icons and self._is_icon(node):
+            collapsed = subtree_size(node) - 1
+            if stats is not None:
+                stats["icons"] += 1
+                stats["nodes"] += collapsed
+            return [], collapsed
+        return list(self.filter_children(children, stats)), 0
+    
+    def filter_children(self, children: Iterable[Dict[str, Any]],
+                        stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Дети, прошедшие фильтры видимости и типов, не больше max_children
+        Работает и с итератором (дети корня в потоковом режиме)
+        """
+        kept = 0
+        for child in children:
+            if not self.enabled:
+                yield child
+                continue
+            
+            reason = None
+            if self.hidden and not child.get("visible", True):
+                reason = "hidden"
+            elif child.get("type") in self.deny_types or (self.allow_types and child.get("type") not in self.allow_types):
+                reason = "by_type"
+            elif self.max_children and kept >= self.max_children:
+                reason = "by_limit"
+            
+            if reason is None:
+                kept += 1
+                yield child
+            elif stats is not None:
+                stats[reason] += 1
+                stats["nodes"] += subtree_size(child)
+    
+    def _is_icon(self, node: Dict[str, Any]) -> bool:
+        """
+        Группа, булева операция или вектор не больше ICON_MAX_SIDE, все потомки - векторы
+        и группы из них, не больше ICON_MAX_NODES нод и ни одной заливки картинкой
+        (обход обрывается на первой неподходящей ноде)
+        """
+        if node.get("type") not in ICON_TYPES:
+            return False
+        box = node.get("absoluteBoundingBox") or {}
+        if max(box.get("width", 0), box.get("height", 0)) > ICON_MAX_SIDE:
+            return False
+        
+        count = 0
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            count += 1
+            if count > ICON_MAX_NODES or current.get("type") not in ICON_TYPES:
+                return False
+            if any(fill.get("type") == "IMAGE" for fill in current.get("fills") or ()):
+                return False
+            stack.extend(current.get("children") or ())
+        return True
@@ -0,0 +1,53 @@
+# rate_limiter.py
+import threading
+import time
+
+class TokenBucketRateLimiter:
+    """
+    Ограничитель частоты запросов по алгоритму token bucket
+    Токены копятся со скоростью rate в секунду (не больше burst),
+    каждый запрос забирает один токен или ждет его появления
+    rate <= 0 - частота не ограничивается (паузы после 429 остаются)
+    """
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate                  # Сколько запросов в секунду разрешено в среднем
+        self.burst = max(1, burst)        # Сколько запросов можно сделать разом
+        self.tokens = float(self.burst)   # Начинаем с полного ведра
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0           # До какого момента все запросы стоят (после 429)
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        Блокирует поток, пока не появится свободный токен
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                
+                # После 429 ждут все потоки, а не только тот, кто его получил
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    # Пополняем ведро за прошедшее время
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait)
+    
+    def pause(self, seconds: float):
+        """
+        Останавливает выдачу токенов на seconds секунд (например по Retry-After)
+        Ведро обнуляется, чтобы после паузы не было всплеска запросов
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated_at = self.paused_until
@@ -0,0 +1,228 @@
+# repeats.py
+import hashlib
+from collections.abc import Mapping
+from typing import Dict, Any, Iterable, List
+from node_table import NodeView
+
+# Сколько текстов экземпляра хранить в таблице повторов
+MAX_INSTANCE_TEXTS = 20
+
+def _preorder(root: Mapping) -> tuple:
+    """
+    Элементы поддерева в прямом порядке, номер родителя и структурная подпись
+    (тип, лайаут, style_id) каждого элемента
+    Поддерево элемента i в этом порядке - отрезок [i, i + размер)
+    """
+    if isinstance(root, NodeView) and root.row == 0:
+        return _table_preorder(root.table)
+    
+    elements = []
+    parents = []
+    signatures = []
+    stack = [(root, -1)]  # Явный стек вместо рекурсии - глубина не ограничена
+    while stack:
+        element, parent = stack.pop()
+        parents.append(parent)
+        index = len(elements)
+        elements.append(element)
+        signatures.append((element.get("type", ""), _layout_key(element.get("layout")), element.get("style_id")))
+        children = element.get("children")
+        if children:
+            stack.extend((child, index) for child in reversed(children))
+    return elements, parents, signatures
+
+def _table_preorder(table) -> tuple:
+    """
+    То же для NodeTable: строки и так записаны в прямом порядке, подписи берутся
+    из колонок (лайауты интернированы - ключ считается один раз на запись)
+    """
+    layout_keys = [_layout_key(layout) for layout in table.layouts.values]
+    types = table.types.values
+    elements = [NodeView(table, row) for row in range(len(table))]
+    signatures = [(types[type_code], layout_keys[layout], style_id) for type_code, layout, style_id
+                  in zip(table.type_code.tolist(), table.layout.tolist(), table.style.tolist())]
+    return elements, table.parent.tolist(), signatures
+
+def _layout_key(layout: Mapping) -> tuple:
+    """
+    Лайаут без координатных подробностей: режим, отступы, констрейнты и тип восстановленной раскладки
+    """
+    if not layout:
+        return ()
+    padding = layout.get("padding") or {}
+    inferred = layout.get("inferred") or {}
+    return (layout.get("mode"), layout.get("spacing"), padding.get("left"), padding.get("right"),
+            padding.get("top"), padding.get("bottom"), tuple((layout.get("constraints") or {}).items()),
+            inferred.get("type"))
+
+def structure_classes(signatures: List[tuple], parents: List[int]) -> tuple:
+    """
+    Класс структуры (номер) и размер поддерева каждого элемента
+    Класс определяется типом, лайаутом, style_id и классами детей по порядку; тексты, имена,
+    размеры и позиции не учитываются - одинаковые карточки с разным текстом совпадают
+    Дети в прямом порядке идут после родителя, поэтому обратный проход видит их первыми
+    Возвращает (классы элементов, размеры поддеревьев, ключи классов)
+    """
+    count = len(signatures)
+    classes = [0] * count
+    sizes = [1] * count
+    child_classes = [None] * count   # Классы детей (в обратном порядке, пока родитель не обработан)
+    class_ids = {}                   # Ключ структуры -> номер класса
+    keys = []                        # Номер класса -> ключ
+    for index in range(count - 1, -1, -1):
+        children = child_classes[index]
+        if children:
+            children.reverse()
+            children = tuple(children)
+        else:
+            children = ()
+        key = signatures[index] + (children,)
+        structure = class_ids.get(key)
+        if structure is None:
+            structure = class_ids[key] = len(keys)
+            keys.append(key)
+        classes[index] = structure
+        
+        parent = parents[index]
+        if parent >= 0:
+            sizes[parent] += sizes[index]
+            if child_classes[parent] is None:
+                child_classes[parent] = [structure]
+            else:
+                child_classes[parent].append(structure)
+    return classes, sizes, keys
+
+def structure_hashes(keys: List[tuple], wanted: List[int]) -> Dict[int, str]:
+    """
+    Устойчивые между запусками хэши нужных классов структуры (номера классов зависят
+    от порядка обхода). Дети всегда получают номер раньше родителя, поэтому хэши
+    считаются по возрастанию номеров без рекурсии
+    """
+    needed = set()
+    stack = list(wanted)
+    while stack:
+        structure = stack.pop()
+        if structure not in needed:
+            needed.add(structure)
+            stack.extend(keys[structure][3])
+    
+    hashes = {}
+    for structure in sorted(needed):
+        node_type, layout, style_id, children = keys[structure]
+        digest = hashlib.blake2b(repr((node_type, layout, style_id)).encode("utf-8"), digest_size=8)
+        for child in children:
+            digest.update(hashes[child].encode("ascii"))
+        hashes[structure] = digest.hexdigest()
+    return {structure: hashes[structure] for structure in wanted}
+
+def find_repeats(root: Mapping, min_elements: int = 2) -> List[Dict[str, Any]]:
+    """
+    Таблица повторяющихся поддеревьев (карточки, строки таблиц, пункты меню)
+    В группу попадают максимальные повторы: внутрь найденного экземпляра не заходим,
+    повторы внутри него видны в шаблоне (первом экземпляре). Для каждого экземпляра
+    хранится то, чем он может отличаться от шаблона: имя, позиция, размер и тексты
+    min_elements: минимальный размер поддерева (одиночные листья не группируем)
+    """
+    elements, parents, signatures = _preorder(root)
+    classes, sizes, keys = structure_classes(signatures, parents)
+    
+    occurrences = [0] * len(keys)
+    for structure in classes:
+        occurrences[structure] += 1
+    
+    groups = {}
+    index = 1  # Корень анализа сам себя не повторяет
+    while index < len(elements):
+        structure = classes[index]
+        if sizes[index] >= min_elements and occurrences[structure] > 1:
+            element = elements[index]
+            group = groups.get(structure)
+            if group is None:
+                group = groups[structure] = {
+                    "hash": None,               # Структурный хэш (ниже, только для итоговых групп)
+                    "type": element.get("type", ""),
+                    "name": element.get("name", ""),
+                    "elements": sizes[index],   # Элементов в одном экземпляре
+                    "count": 0,
+                    "exemplar": element.get("id", ""),
+                    "instances": []
+                }
+            group["count"] += 1
+            group["instances"].append(_instance(elements, index, sizes[index]))
+            index += sizes[index]  # Пропускаем поддерево экземпляра целиком
+        else:
+            index += 1
+    
+    # Повторы, встретившиеся один раз (остальные копии внутри других повторов), не нужны
+    groups = {structure: group for structure, group in groups.items() if group["count"] > 1}
+    hashes = structure_hashes(keys, list(groups))
+    for structure, group in groups.items():
+        group["hash"] = hashes[structure]
+    
+    repeats = list(groups.values())
+    repeats.sort(key=lambda group: -group["elements"] * (group["count"] - 1))
+    return repeats
+
+def _instance(elements: List[Mapping], index: int, size: int) -> Dict[str, Any]:
+    element = elements[index]
+    texts = []
+    for offset in range(index, index + size):
+        content = elements[offset].get("content") or {}
+        if content.get("text"):
+            texts.append(content["text"])
+            if len(texts) >= MAX_INSTANCE_TEXTS:
+                break
+    return {
+        "id": element.get("id", ""),
+        "original_id": element.get("original_id", ""),
+        "name": element.get("name", ""),
+        "position": element.get("position", {}),
+        "size": element.get("size", {}),
+        "texts": texts
+    }
+
+def frame_repeats(repeats: List[Dict[str, Any]], frame_element_id: str,
+                  member_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Повторы внутри одного фрейма: экземпляры с ID внутри фрейма (ID элементов
+    иерархические, поэтому это проверка префикса); шаблон - первый экземпляр во фрейме
+    member_ids: фрейм - пачка соседей (см. FrameSplitter): экземпляры - сами участники
+    пачки и элементы внутри них
+    """
+    member_ids = tuple(member_ids)
+    prefixes = tuple(member_id + "-" for member_id in member_ids) or (frame_element_id + "-",)
+    result = []
+    for group in repeats:
+        instances = [instance for instance in group["instances"]
+                     if instance["id"].startswith(prefixes) or instance["id"] in member_ids]
+        if len(instances) > 1:
+            result.append(dict(group, count=len(instances), exemplar=instances[0]["id"], instances=instances))
+    return result
+
+def collapse_repeats(elements: List[Mapping], repeats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Копия списка элементов для записи в JSON: экземпляры повторов, кроме шаблона,
+    заменяются ссылкой repeat_of на шаблон (их отличия - в таблице повторов)
+    """
+    stubs = {}
+    for group in repeats:
+        for instance in group["instances"]:
+            if instance["id"] != group["exemplar"]:
+                stubs[instance["id"]] = group["exemplar"]
+    
+    def copy(element: Mapping) -> Dict[str, Any]:
+        exemplar = stubs.get(element.get("id"))
+        if exemplar is not None:
+            return {"id": element.get("id"), "original_id": element.get("original_id", ""),
+                    "name": element.get("name", ""), "type": element.get("type", ""),
+                    "repeat_of": exemplar, "children": []}
+        return dict(element.items())
+    
+    collapsed = [copy(element) for element in elements]
+    stack = list(collapsed)  # Явный стек вместо рекурсии - глубина не ограничена
+    while stack:
+        current = stack.pop()
+        if current.get("children"):
+            current["children"] = [copy(child) for child in current["children"]]
+            stack.extend(current["children"])
+    return collapsed
@@ -0,0 +1,262 @@
+# serializer.py
+import json
+import re
+from json.decoder import scanstring
+from json.encoder import encode_basestring
+from json.scanner import NUMBER_RE
+from typing import Dict, Any, Callable
+from config import Config
+from node_table import json_default
+
+# orjson - быстрая сериализация JSON (сразу в UTF-8 байты, в разы быстрее стандартного модуля)
+# Если библиотеки нет, пишем через обычный json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_backend(pretty: bool, default: Callable) -> tuple:
+    """
+    Стандартный модуль json: компактно - без пробелов после разделителей, красиво - отступ 2
+    """
+    options = {"indent": 2} if pretty else {"separators": (",", ":")}
+    
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=default, **options).encode("utf-8")
+    return dumps, json.loads
+
+def _orjson_backend(pretty: bool, default: Callable) -> tuple:
+    """
+    orjson: NumPy-скаляры из NodeTable и нестроковые ключи - как в стандартном модуле
+    """
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+    
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=default, option=option)
+    return dumps, orjson.loads
+
+# Имя -> фабрика (pretty, default) -> (dumps в байты, loads); свою библиотеку - через register_backend
+BACKENDS: Dict[str, Callable] = {"json": _json_backend}
+if orjson is not None:
+    BACKENDS["orjson"] = _orjson_backend
+
+def register_backend(name: str, factory: Callable):
+    """
+    Подключает другую библиотеку JSON: factory(pretty, default) -> (dumps в байты, loads)
+    """
+    BACKENDS[name] = factory
+
+# Запасные кодировщик и разборщик без рекурсии. orjson пишет не больше 255 уровней вложенности,
+# а элемент - это два уровня (словарь и список детей), то есть ~127 элементов в глубину;
+# модуль json и пишет, и читает в пределах лимита рекурсии Python (~500 элементов)
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+LITERALS = (("null", None), ("true", True), ("false", False),
+            ("NaN", float("nan")), ("Infinity", float("inf")), ("-Infinity", float("-inf")))
+
+def _encode_scalar(value: Any) -> str:
+    """
+    Строка, число, bool или None - как в модуле json (для контейнеров и прочего - None)
+    """
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "Infinity" if value > 0 else "-Infinity"
+        return float.__repr__(value)
+    return None
+
+def _encode_key(key: Any) -> str:
+    """Ключ словаря: нестроковый ключ пишется строкой, как в модуле json"""
+    if isinstance(key, str):
+        return encode_basestring(key)
+    if hasattr(key, "dtype") and hasattr(key, "item"):
+        key = key.item()
+    scalar = _encode_scalar(key)
+    if scalar is None:
+        raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+    return encode_basestring(scalar)
+
+def iterative_dumps(value: Any, pretty: bool = False, default: Callable = None) -> bytes:
+    """
+    JSON любой глубины (явный стек вместо рекурсии)
+    Вывод - как у json.dumps(ensure_ascii=False): компактный или с отступом 2
+    """
+    parts = []
+    key_separator = ": " if pretty else ":"
+    stack = [(value, 0)]  # (значение, уровень) или готовый текст
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        current, level = item
+        scalar = _encode_scalar(current)
+        if scalar is not None:
+            parts.append(scalar)
+            continue
+        
+        if isinstance(current, dict):
+            entries, brackets = list(current.items()), "{}"
+        elif isinstance(current, (list, tuple)):
+            entries, brackets = list(current), "[]"
+        elif hasattr(current, "dtype") and hasattr(current, "item"):
+            stack.append((current.item(), level))  # Скаляр NumPy из NodeTable
+            continue
+        elif default is not None:
+            stack.append((default(current), level))
+            continue
+        else:
+            raise TypeError(f"Object of type {type(current).__name__} is not JSON serializable")
+        
+        if not entries:
+            parts.append(brackets)
+            continue
+        newline = "\n" + "  " * (level + 1) if pretty else ""
+        parts.append(brackets[0])
+        stack.append(("\n" + "  " * level if pretty else "") + brackets[1])
+        for i in range(len(entries) - 1, -1, -1):
+            prefix = ("," if i else "") + newline
+            if brackets == "{}":
+                key, entry = entries[i]
+                prefix += _encode_key(key) + key_separator
+            else:
+                entry = entries[i]
+            stack.append((entry, level + 1))
+            stack.append(prefix)
+    return "".join(parts).encode("utf-8")
+
+def _skip(text: str, pos: int) -> int:
+    return WHITESPACE.match(text, pos).end()
+
+def _parse_key(text: str, pos: int) -> tuple:
+    """Ключ словаря и позиция его значения"""
+    if text[pos:pos + 1] != '"':
+        raise ValueError(f"Ожидался ключ в кавычках на позиции {pos}")
+    key, pos = scanstring(text, pos + 1)
+    pos = _skip(text, pos)
+    if text[pos:pos + 1] != ":":
+        raise ValueError(f"Ожидалось ':' на позиции {pos}")
+    return key, _skip(text, pos + 1)
+
+def _parse_scalar(text: str, pos: int) -> tuple:
+    """Литерал или число и позиция за ним"""
+    for literal, value in LITERALS:
+        if text.startswith(literal, pos):
+            return value, pos + len(literal)
+    match = NUMBER_RE.match(text, pos)
+    if match is None:
+        raise ValueError(f"Неожиданный символ на позиции {pos}")
+    integer, fraction, exponent = match.groups()
+    if fraction or exponent:
+        return float(integer + (fraction or "") + (exponent or "")), match.end()
+    return int(integer), match.end()
+
+def iterative_loads(data) -> Any:
+    """
+    Разбор JSON любой глубины (явный стек открытых словарей и списков)
+    """
+    text = data if isinstance(data, str) else bytes(data).decode("utf-8")
+    containers = []  # Открытые словари и списки
+    keys = []        # Ключ текущего значения словаря (у списка - None)
+    pos = _skip(text, 0)
+    while True:
+        char = text[pos:pos + 1]
+        if char in ("{", "["):
+            container = {} if char == "{" else []
+            pos = _skip(text, pos + 1)
+            if text[pos:pos + 1] == ("}" if char == "{" else "]"):
+                value, pos = container, pos + 1
+            else:
+                containers.append(container)
+                key = None
+                if char == "{":
+                    key, pos = _parse_key(text, pos)
+                keys.append(key)
+                continue  # Разбираем первое значение контейнера
+        elif char == '"':
+            value, pos = scanstring(text, pos + 1)
+        else:
+            value, pos = _parse_scalar(text, pos)
+        
+        # Значение готово: кладем в контейнер и закрываем законченные контейнеры
+        while True:
+            if not containers:
+                if _skip(text, pos) != len(text):
+                    raise ValueError(f"Лишние данные на позиции {pos}")
+                return value
+            container = containers[-1]
+            if isinstance(container, dict):
+                container[keys[-1]] = value
+            else:
+                container.append(value)
+            pos = _skip(text, pos)
+            char = text[pos:pos + 1]
+            if char == ",":
+                pos = _skip(text, pos + 1)
+                if isinstance(container, dict):
+                    keys[-1], pos = _parse_key(text, pos)
+                break  # Разбираем следующее значение контейнера
+            closing = "}" if isinstance(container, dict) else "]"
+            if char != closing:
+                raise ValueError(f"Ожидалось ',' или '{closing}' на позиции {pos}")
+            containers.pop()
+            keys.pop()
+            value, pos = container, pos + 1
+
+def _too_deep(error: Exception) -> bool:
+    """Библиотека уперлась в лимит вложенности (а не в неподдерживаемый тип)"""
+    return isinstance(error, RecursionError) or "Recursion limit" in str(error)
+
+class JsonSerializer:
+    """
+    Запись и чтение JSON артефактов (фреймы, метаданные, полный анализ)
+    По умолчанию компактно и через orjson, если он установлен; pretty - с отступами для отладки
+    Ленивые представления (NodeView, LazyElement) превращаются в словари хуком json_default
+    Дерево глубже лимита вложенности библиотеки пишется и читается запасным кодом без рекурсии
+    """
+    
+    def __init__(self, backend: str = None, pretty: bool = None, default: Callable = json_default):
+        backend = backend or Config.JSON_BACKEND
+        if backend == "auto":
+            backend = "orjson" if "orjson" in BACKENDS else "json"
+        if backend not in BACKENDS:
+            print(f"⚠️  JSON библиотека '{backend}' недоступна - пишем стандартным модулем json")
+            backend = "json"
+        self.backend = backend
+        self.pretty = Config.JSON_PRETTY if pretty is None else pretty
+        self.default = default
+        self._dumps, self._loads = BACKENDS[backend](self.pretty, default)
+    
+    def dumps(self, value: Any) -> bytes:
+        try:
+            return self._dumps(value)
+        except (RecursionError, TypeError) as error:
+            if not _too_deep(error):
+                raise
+            return iterative_dumps(value, self.pretty, self.default)
+    
+    def dump(self, value: Any, path: str):
+        data = self.dumps(value)
+        with open(path, "wb") as f:
+            f.write(data)
+    
+    def loads(self, data: bytes) -> Any:
+        try:
+            return self._loads(data)
+        except RecursionError:
+            return iterative_loads(data)
+    
+    def load(self, path: str) -> Any:
+        with open(path, "rb") as f:
+            return self.loads(f.read())
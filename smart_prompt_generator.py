@@ -1,8 +1,12 @@
 # smart_prompt_generator.py
-import json
 import os
 from typing import Dict, Any, List
 from config import Config
+from serializer import JsonSerializer
+from frame_store import open_frame_store
+from style_table import pack_styles, unpack_styles
+from repeats import collapse_repeats
+from subtree_metrics import SubtreeMetrics
 
 class SmartPromptGenerator:
     """
@@ -18,6 +22,11 @@ class SmartPromptGenerator:
         # Папка для промптов
         self.prompts_dir = os.path.join(self.output_dir, "smart_prompts")
         os.makedirs(self.prompts_dir, exist_ok=True)
+        
+        self.metrics = SubtreeMetrics()  # Размеры поддеревьев (общий с FrameSplitter индекс)
+        self.serializer = JsonSerializer()  # Запись JSON (компактно, orjson - если установлен)
+        self.store = open_frame_store(self.output_dir)  # Откуда читаются фреймы (общее с FrameSplitter)
+        self.log = print  # Куда писать ход работы (run_pipeline подменяет на время запуска)
     
     def generate_smart_prompts(self, analysis: Dict[str, Any], frames_data: Dict[str, Any] = None):
         """
@@ -25,10 +34,16 @@ class SmartPromptGenerator:
         analysis: результат глубокого анализа
         frames_data: разделенные фреймы
         """
-        print("🧠 Генерируем умные промпты для родительских фреймов...")
+        self.log("🧠 Генерируем умные промпты для родительских фреймов...")
+        
+        # Индекс метрик уже построен при разделении на фреймы - поддеревья заново не обходим
+        self.metrics = (frames_data or {}).get("metrics") or SubtreeMetrics()
+        self.store = (frames_data or {}).get("store") or self.store
         
         # Сохраняем полный анализ в JSON для отладки
-        self._save_full_analysis(analysis)
+        # (ленивый анализ не сохраняется - запись разобрала бы весь макет)
+        if not analysis.get("lazy"):
+            self._save_full_analysis(analysis)
         
         if frames_data:
             # Новая логика: генерируем промпты для каждого родительского фрейма
@@ -40,7 +55,7 @@ class SmartPromptGenerator:
         # Создаем общую инструкцию по использованию промптов
         self._create_smart_instructions(analysis, frames_data)
         
-        print(f"✅ Умные промпты сохранены в: {self.prompts_dir}")
+        self.log(f"✅ Умные промпты сохранены в: {self.prompts_dir}")
     
     def _generate_parent_frames_prompts(self, frames_data: Dict[str, Any]):
         """
@@ -52,17 +67,34 @@ class SmartPromptGenerator:
         os.makedirs(frames_prompts_dir, exist_ok=True)
         
         # Промпт для корневого фрейма (основа всего макета)
-        self._generate_root_frame_prompt(frames_data["root_frame"])
+        # В инкрементальном режиме неизменившийся макет не перегенерируем
+        root_prompt_path = os.path.join(self.prompts_dir, "root_frame_prompt.txt")
+        if not (frames_data["root_frame"].get("unchanged") and os.path.exists(root_prompt_path)):
+            self._generate_root_frame_prompt(frames_data["root_frame"])
         
         # Промпты для каждого родительского фрейма первого уровня
         for frame_info in frames_data["parent_frames"]:
-            frame_file = os.path.join(self.output_dir, frame_info["file"])
-            if os.path.exists(frame_file):
-                # Читаем данные фрейма из JSON файла
-                with open(frame_file, "r", encoding="utf-8") as f:
-                    frame_data = json.load(f)
-                # Генерируем промпт для этого фрейма
-                self._generate_parent_frame_prompt(frame_data, frame_info)
+            # Фрейм не изменился и промпт уже есть - оставляем как есть
+            prompt_path = os.path.join(self.prompts_dir, self.parent_frame_prompt_filename(frame_info))
+            if frame_info.get("unchanged") and os.path.exists(prompt_path):
+                continue
+            # Отложенный фрейм еще не разобран - промпт появится после FrameSplitter.extract_parent_frame
+            if frame_info.get("deferred"):
+                continue
+            self.generate_frame_prompt(frame_info)
+    
+    def generate_frame_prompt(self, frame_info: Dict[str, Any]) -> bool:
+        """
+        Промпт одного родительского фрейма по его JSON из хранилища (False - фрейма там нет)
+        """
+        frame_data = self.store.read(frame_info["id"], frame_info["file"])
+        if frame_data is None:
+            return False
+        
+        frame_data = unpack_styles(frame_data, ("children", "components"))  # Стили из общего style_table
+        # Генерируем промпт для этого фрейма
+        self._generate_parent_frame_prompt(frame_data, frame_info)
+        return True
     
     def _generate_root_frame_prompt(self, root_frame: Dict[str, Any]):
         """
@@ -132,8 +164,7 @@ class SmartPromptGenerator:
 {self._format_frame_layout(frame_data.get('layout', {}))}
 
 ## ПОЛНАЯ СТРУКТУРА ФРЕЙМА (все вложенные элементы):
-{self._format_complete_frame_structure(frame_data.get('children', []))}
-
+{self._format_complete_frame_structure(frame_data.get('children', []), repeats=self._index_repeats(frame_data.get('repeats', [])), components=self._index_components(frame_data.get('components', [])))}{self._format_repeats_summary(frame_data.get('repeats', []))}{self._format_components_summary(frame_data.get('components', []))}{self._format_frame_relations(frame_data)}
 ## ДИЗАЙН-ТОКЕНЫ ФРЕЙМА:
 {self._format_frame_design_tokens(frame_data.get('design_tokens', {}))}
 
@@ -160,9 +191,13 @@ class SmartPromptGenerator:
 """
         
         # Создаем имя файла для промпта
-        filename = f"parent_frames/{frame_data['id']}_{self._sanitize_name(frame_data['name'])}_prompt.txt"
+        filename = self.parent_frame_prompt_filename(frame_data)
         self._save_prompt(filename, prompt)
     
+    def parent_frame_prompt_filename(self, frame: Dict[str, Any]) -> str:
+        """Имя файла промпта родительского фрейма (относительно папки промптов)"""
+        return f"parent_frames/{frame['id']}_{self._sanitize_name(frame['name'])}_prompt.txt"
+    
     def _format_frame_styles(self, styles: Dict[str, Any]) -> str:
         """Форматирование стилей фрейма в читаемый текст"""
         lines = []
@@ -208,8 +243,39 @@ class SmartPromptGenerator:
         if constraints:
             lines.append(f"- **Констрейнты**: {constraints}")
         
+        # Раскладка, восстановленная по координатам детей (фрейм без auto-layout)
+        inferred = layout.get('inferred')
+        if inferred:
+            lines.append(f"- **Восстановленная раскладка**: {self._describe_inferred_layout(inferred)}")
+            padding = inferred.get('padding')
+            if padding:
+                lines.append(f"- **Отступы детей от краев**: L:{padding['left']} R:{padding['right']} T:{padding['top']} B:{padding['bottom']}px")
+            if inferred.get('overlaps'):
+                lines.append(f"- **Пересечения детей**: {inferred['overlaps']} пар")
+            if inferred.get('backgrounds'):
+                lines.append(f"- **Подложки**: {', '.join(inferred['backgrounds'])}")
+            lines.append(f"- **CSS**: `{inferred['css']}`")
+        
         return "\n".join(lines) if lines else "Базовый лайаут"
     
+    def _describe_inferred_layout(self, inferred: Dict[str, Any]) -> str:
+        """Краткое описание восстановленной раскладки: тип, размеры и отступы"""
+        layout_type = inferred.get('type')
+        if layout_type == 'row':
+            text = f"ряд из {inferred['columns']}, gap {inferred['gap_x']}px"
+        elif layout_type == 'column':
+            text = f"колонка из {inferred['rows']}, gap {inferred['gap_y']}px"
+        elif layout_type == 'grid':
+            text = f"сетка {inferred['rows']}×{inferred['columns']}, gap {inferred['gap_y']}/{inferred['gap_x']}px"
+        else:
+            return "абсолютное позиционирование"
+        
+        if not inferred.get('uniform_gap', True):
+            text += " (отступы неравные)"
+        if inferred.get('align'):
+            text += f", выравнивание {inferred['align']}"
+        return text
+    
     def _format_parent_frames_overview(self, children: List[Dict[str, Any]]) -> str:
         """Форматирование обзора родительских фреймов"""
         # Фильтруем только FRAME элементы первого уровня
@@ -220,11 +286,15 @@ class SmartPromptGenerator:
         
         lines = ["**Основные секции макета:**"]
         for i, frame in enumerate(parent_frames):
-            # Считаем общее количество элементов в этом фрейме
-            total_elements = self._count_total_elements(frame)
+            # Метрики поддерева фрейма - из индекса, без обхода
+            metrics = self.metrics.summary(frame)
             lines.append(f"{i+1}. **{frame.get('name', 'Unnamed')}**")
             lines.append(f"   - Размер: {frame.get('size', {}).get('width', 0)}×{frame.get('size', {}).get('height', 0)}px")
-            lines.append(f"   - Элементов: {total_elements} (включая вложенные)")
+            lines.append(f"   - Элементов: {metrics['total_elements']} (включая вложенные)")
+            if metrics['depth'] is not None:
+                lines.append(f"   - Уровней вложенности: {metrics['depth']}, ≈{metrics['bytes'] / 1024:.1f} КБ JSON")
+            types = ", ".join(f"{node_type} {count}" for node_type, count in list(metrics['type_counts'].items())[:4])
+            lines.append(f"   - Типы: {types}")
             lines.append(f"   - Позиция: X:{frame.get('position', {}).get('x', 0)}, Y:{frame.get('position', {}).get('y', 0)}")
         
         return "\n".join(lines)
@@ -240,16 +310,27 @@ class SmartPromptGenerator:
         names = [f"- {frame.get('name', 'Unnamed')}" for frame in parent_frames]
         return "\n".join(names)
     
-    def _format_complete_frame_structure(self, children: List[Dict[str, Any]], depth: int = 1) -> str:
+    def _format_complete_frame_structure(self, children: List[Dict[str, Any]], depth: int = 1,
+                                         repeats: Dict[str, tuple] = None,
+                                         components: Dict[str, Dict[str, Any]] = None) -> str:
         """
         Форматирование ПОЛНОЙ структуры фрейма с отступами
         Показывает всю иерархию элементов с их характеристиками
+        repeats: ID экземпляра повтора -> (группа, номер экземпляра); шаблон (номер 0)
+        описывается целиком, остальные экземпляры - одной строкой с отличиями
+        components: ID компонента -> мастер; экземпляр - одна строка со ссылкой и переопределениями
+        Обход - явным стеком в прямом порядке, глубина вложенности не ограничена
         """
         if not children:
             return "Нет дочерних элементов"
         
+        repeats = repeats or {}
+        components = components or {}
         lines = []
-        for child in children:
+        stack = [(child, depth) for child in reversed(children)]
+        while stack:
+            child, depth = stack.pop()
+            
             # Создаем отступы для визуализации вложенности
             indent = "  " * depth
             
@@ -257,6 +338,13 @@ class SmartPromptGenerator:
             child_type = child.get('type', 'UNKNOWN')
             child_name = child.get('name', 'Unnamed')
             child_size = child.get('size', {})
+            
+            # Копия повторяющегося блока - только отличия от шаблона
+            group, number = repeats.get(child.get('id'), (None, 0))
+            if number > 0:
+                lines.append(f"{indent}- **{child_type}**: {child_name} 🔁 повтор «{group['name']}»"
+                             f"{self._describe_repeat_delta(group, number)}")
+                continue
             child_children_count = len(child.get('children', []))
             
             # Формируем строку с основной информацией
@@ -277,15 +365,131 @@ class SmartPromptGenerator:
             if typography and typography.get('font_size'):
                 line += f" | Текст: {typography.get('font_family', 'Inter')} {typography.get('font_size')}px"
             
+            # Раскладка детей у контейнеров без auto-layout
+            inferred = child.get('layout', {}).get('inferred')
+            if inferred:
+                line += f" | Раскладка: {self._describe_inferred_layout(inferred)}"
+            
+            if group is not None:
+                line += f" | 🔁 Шаблон повтора ×{group['count']}"
+            
+            # Экземпляр компонента: структура описана один раз в разделе компонентов
+            component_id = child.get('component_id')
+            if component_id is not None:
+                master = components.get(component_id)
+                component_name = master['component_info']['name'] if master else component_id
+                line += f" | 🧩 Экземпляр «{component_name}»{self._describe_overrides(child.get('overrides', []))}"
+            
+            # Иконка, свернутая при отсечении: векторы внутри не описываются
+            if child.get('collapsed'):
+                line += f" | 🖼 иконка (свернуто {child['collapsed']})"
+            
+            # Заглушка: поддерево вынесено в отдельные фреймы (большой фрейм разделен на части)
+            if child.get('frames'):
+                frames = ", ".join(f"`{frame_id}`" for frame_id in child['frames'])
+                line += f" | ↪ во фреймах {frames} ({child.get('total_elements', 0)} элементов)"
+            
             lines.append(line)
             
-            # Рекурсивно добавляем всех детей (ПОЛНАЯ ВЛОЖЕННОСТЬ)
-            if child.get('children'):
-                child_structure = self._format_complete_frame_structure(child.get('children', []), depth + 1)
-                lines.append(child_structure)
+            # Следом описываем всех детей (ПОЛНАЯ ВЛОЖЕННОСТЬ)
+            stack.extend((grandchild, depth + 1) for grandchild in reversed(child.get('children') or []))
         
         return "\n".join(lines)
     
+    def _index_repeats(self, repeats: List[Dict[str, Any]]) -> Dict[str, tuple]:
+        """ID экземпляра повтора -> (группа, номер экземпляра в группе)"""
+        return {instance['id']: (group, number)
+                for group in repeats for number, instance in enumerate(group['instances'])}
+    
+    def _describe_repeat_delta(self, group: Dict[str, Any], number: int) -> str:
+        """Чем экземпляр повтора отличается от шаблона: позиция, размер и тексты"""
+        exemplar = group['instances'][0]
+        instance = group['instances'][number]
+        
+        position = instance.get('position', {})
+        parts = [f"X: {position.get('x', 0)}, Y: {position.get('y', 0)}"]
+        size = instance.get('size', {})
+        if size != exemplar.get('size', {}):
+            parts.append(f"размер {size.get('width', 0)}×{size.get('height', 0)}px")
+        if instance.get('texts') != exemplar.get('texts'):
+            parts.append("тексты: " + " / ".join(f"\"{text}\"" for text in instance.get('texts', [])))
+        return " (" + "; ".join(parts) + ")"
+    
+    def _format_repeats_summary(self, repeats: List[Dict[str, Any]]) -> str:
+        """Список повторяющихся блоков фрейма (пусто, если повторов нет)"""
+        if not repeats:
+            return ""
+        
+        lines = ["\n\n## ПОВТОРЯЮЩИЕСЯ БЛОКИ (реализуй каждый как один переиспользуемый компонент):"]
+        for group in repeats:
+            lines.append(f"- «{group['name']}» ({group['type']}): {group['count']} экземпляров "
+                         f"по {group['elements']} элементов, шаблон - первый экземпляр")
+        return "\n".join(lines)
+    
+    def _format_frame_relations(self, frame_data: Dict[str, Any]) -> str:
+        """Связи части большого фрейма с другими частями (пусто, если фрейм не делился)"""
+        parent = frame_data.get('parent', 'root')
+        child_frames = frame_data.get('child_frames', [])
+        if parent == 'root' and not child_frames:
+            return ""
+        
+        lines = ["\n\n## СВЯЗИ С ДРУГИМИ ФРЕЙМАМИ (большой фрейм разделен на части):"]
+        if parent != 'root':
+            lines.append(f"- Вставляется во фрейм `{parent}` на место заглушки ↪")
+        if child_frames:
+            lines.append(f"- Элементы с ↪ реализуются отдельно во фреймах: {', '.join(f'`{frame_id}`' for frame_id in child_frames)}")
+        return "\n".join(lines)
+    
+    def _index_components(self, components: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """ID компонента -> мастер"""
+        return {master['component_info']['id']: master for master in components}
+    
+    def _describe_overrides(self, overrides: List[Dict[str, Any]], limit: int = 5) -> str:
+        """Переопределения экземпляра одной строкой (первые limit элементов)"""
+        if not overrides:
+            return ""
+        
+        parts = []
+        for override in overrides[:limit]:
+            changes = []
+            if 'text' in override:
+                changes.append(f"текст \"{override['text']}\"")
+            if 'visibility' in override:
+                changes.append("показан" if override['visibility'] else "скрыт")
+            styles = override.get('styles', {})
+            if styles.get('background'):
+                changes.append(f"фон {styles['background']}")
+            if styles.get('typography', {}).get('color'):
+                changes.append(f"цвет текста {styles['typography']['color']}")
+            if 'size' in override:
+                changes.append(f"размер {override['size'].get('width', 0)}×{override['size'].get('height', 0)}px")
+            labels = {'renamed': f"имя \"{override.get('renamed')}\"", 'effects': "эффекты",
+                      'layout': "лайаут", 'position': "позиция"}
+            changes.extend(label for key, label in labels.items() if key in override)
+            if styles and not changes:
+                changes.append("стили")
+            parts.append(f"{override['name']}: {', '.join(changes)}")
+        
+        more = f"; еще {len(overrides) - limit}" if len(overrides) > limit else ""
+        return " (переопределено - " + "; ".join(parts) + more + ")"
+    
+    def _format_components_summary(self, components: List[Dict[str, Any]]) -> str:
+        """Мастера компонентов фрейма со структурой (пусто, если экземпляров нет)"""
+        if not components:
+            return ""
+        
+        index = self._index_components(components)
+        lines = ["\n\n## КОМПОНЕНТЫ (реализуй каждый один раз, экземпляры - с переопределениями):"]
+        for master in components:
+            info = master['component_info']
+            size = master.get('size', {})
+            description = f" - {info['description']}" if info.get('description') else ""
+            lines.append(f"\n### «{info['name']}»{description}")
+            lines.append(f"- Экземпляров: {info['instances']}, элементов в мастере: {info['elements']}, "
+                         f"размер {size.get('width', 0)}×{size.get('height', 0)}px")
+            lines.append(self._format_complete_frame_structure(master.get('children', []), components=index))
+        return "\n".join(lines)
+    
     def _format_frame_design_tokens(self, tokens: Dict[str, Any]) -> str:
         """
         Форматирование дизайн-токенов, используемых в этом фрейме
@@ -363,27 +567,20 @@ class SmartPromptGenerator:
         
         return "\n".join(lines) if lines else "Глобальные токены не определены"
     
-    def _count_total_elements(self, element: Dict[str, Any]) -> int:
-        """
-        Рекурсивно считает общее количество элементов включая всех детей
-        Используется для оценки сложности каждого фрейма
-        """
-        count = 1  # Начинаем с текущего элемента
-        
-        # Рекурсивно добавляем счетчики всех детей
-        for child in element.get("children", []):
-            count += self._count_total_elements(child)
-        
-        return count
-    
     def _save_full_analysis(self, analysis: Dict[str, Any]):
         """
         Сохраняет полный анализ в JSON файл для отладки и reference
         """
         json_file = os.path.join(self.output_dir, "complete_analysis_full.json")
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(analysis, f, indent=2, ensure_ascii=False, default=str)
-        print(f"📊 Полный анализ сохранен: {json_file}")
+        if Config.COLLAPSE_REPEATS_IN_JSON and analysis.get("repeats"):
+            # Копии повторяющихся поддеревьев - ссылкой на шаблон (отличия - в таблице repeats)
+            target_node, = collapse_repeats([analysis["target_node"]], analysis["repeats"])
+            analysis = dict(analysis, target_node=target_node, full_hierarchy=target_node.get("children", []))
+        if Config.STYLE_TABLE_IN_JSON:
+            # Стили элементов - один раз в style_table, у элементов только style_id
+            analysis = pack_styles(analysis, ("target_node", "full_hierarchy", "components"))
+        self.serializer.dump(analysis, json_file)
+        self.log(f"📊 Полный анализ сохранен: {json_file}")
     
     def _save_prompt(self, filename: str, content: str):
         """
@@ -494,7 +691,7 @@ class SmartPromptGenerator:
         Старая логика генерации промптов для обратной совместимости
         Используется если не переданы frames_data
         """
-        print("⚠️  Используется устаревшая логика генерации промптов")
+        self.log("⚠️  Используется устаревшая логика генерации промптов")
         
         # Простая реализация одного общего промпта
         prompt = f"""
@@ -512,17 +709,19 @@ class SmartPromptGenerator:
     def _format_simple_structure(self, element: Dict[str, Any], depth: int = 0) -> str:
         """
         Простое форматирование структуры для старой системы
-        Показывает только первые 10 элементов каждого уровня для читаемости
+        Показывает только первые 10 элементов каждого уровня для читаемости (обход - явным стеком)
         """
-        indent = "  " * depth
         lines = []
-        
-        # Добавляем текущий элемент
-        lines.append(f"{indent}- {element.get('type')}: {element.get('name')}")
-        
-        # Рекурсивно добавляем детей (ограничиваем количество для читаемости)
-        for child in element.get('children', [])[:10]:
-            lines.append(self._format_simple_structure(child, depth + 1))
+        stack = [(element, depth)]
+        while stack:
+            element, depth = stack.pop()
+            indent = "  " * depth
+            
+            # Добавляем текущий элемент
+            lines.append(f"{indent}- {element.get('type')}: {element.get('name')}")
+            
+            # Следом - дети (ограничиваем количество для читаемости)
+            stack.extend((child, depth + 1) for child in reversed(element.get('children', [])[:10]))
         
         return "\n".join(lines)
 
@@ -0,0 +1,107 @@
+# style_table.py
+import json
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional
+
+class StyleTable:
+    """
+    Таблица интернированных стилей
+    Каждая уникальная комбинация сырых стилевых полей Figma разбирается один раз,
+    элементы ссылаются на каноническую запись по style_id
+    Записи общие для всех элементов с этим стилем - их нельзя изменять
+    """
+    
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []  # style_id -> каноническая запись стилей
+        self._raw_ids = {}        # Ключ сырых полей ноды -> style_id
+        self._canonical_ids = {}  # JSON записи -> style_id (одинаковые записи с разных ключей)
+    
+    def lookup(self, raw_key: tuple) -> Optional[int]:
+        """
+        style_id для уже встречавшейся комбинации сырых полей (None - еще не было)
+        """
+        return self._raw_ids.get(raw_key)
+    
+    def add(self, raw_key: tuple, record: Dict[str, Any]) -> int:
+        """
+        Регистрирует разобранные стили для новой комбинации сырых полей
+        """
+        style_id = self.intern_record(record)
+        self._raw_ids[raw_key] = style_id
+        return style_id
+    
+    def intern_record(self, record: Dict[str, Any]) -> int:
+        """
+        style_id готовой записи стилей (например из кэша инкрементальной обработки)
+        """
+        canonical = json.dumps(record, sort_keys=True, default=str)
+        style_id = self._canonical_ids.get(canonical)
+        if style_id is None:
+            style_id = len(self.records)
+            self.records.append(record)
+            self._canonical_ids[canonical] = style_id
+        return style_id
+    
+    def __getitem__(self, style_id: int) -> Dict[str, Any]:
+        return self.records[style_id]
+    
+    def __len__(self) -> int:
+        return len(self.records)
+
+def detach_styles(element: Mapping, used_styles: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Копия дерева элементов для записи в JSON: вместо словаря styles у элементов
+    остается только style_id, а сами стили собираются в used_styles (style_id -> запись)
+    """
+    def detach(current: Mapping) -> Dict[str, Any]:
+        copy = {key: value for key, value in current.items() if key != "styles"}
+        if "style_id" in copy:
+            used_styles[str(copy["style_id"])] = current["styles"]
+        elif "styles" in current:
+            copy["styles"] = current["styles"]  # Элемент без style_id пишем как есть
+        return copy
+    
+    root = detach(element)
+    stack = [root]  # Явный стек вместо рекурсии - глубина не ограничена
+    while stack:
+        current = stack.pop()
+        current["children"] = [detach(child) for child in current.get("children", [])]
+        stack.extend(current["children"])
+    return root
+
+def pack_styles(data: Dict[str, Any], keys: tuple) -> Dict[str, Any]:
+    """
+    Компактная форма документа (фрейм, полный анализ) для записи в JSON:
+    у элементов под ключами keys стили заменяются на style_id, а все
+    использованные стили один раз записываются в общий style_table
+    """
+    used_styles = {}
+    packed = dict(data)
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, Mapping):
+            packed[key] = detach_styles(value, used_styles)
+        elif isinstance(value, list):
+            packed[key] = [detach_styles(element, used_styles) for element in value]
+    packed["style_table"] = dict(sorted(used_styles.items(), key=lambda item: int(item[0])))
+    return packed
+
+def unpack_styles(data: Dict[str, Any], keys: tuple) -> Dict[str, Any]:
+    """
+    Обратно к pack_styles: элементам под ключами keys возвращаются словари styles
+    из style_table (документ без style_table возвращается как есть)
+    """
+    style_table = data.get("style_table")
+    if style_table is None:
+        return data
+    
+    stack = []
+    for key in keys:
+        value = data.get(key)
+        stack.extend(value if isinstance(value, list) else [value] if isinstance(value, dict) else [])
+    while stack:  # Явный стек вместо рекурсии - глубина не ограничена
+        element = stack.pop()
+        if "styles" not in element and "style_id" in element:
+            element["styles"] = style_table.get(str(element["style_id"]), {})
+        stack.extend(element.get("children", []))
+    return data
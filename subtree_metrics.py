@@ -0,0 +1,241 @@
+# subtree_metrics.py
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Iterable
+from lazy_tree import LazyElement
+from node_table import InternTable
+from design_tokens import TypographyRegistry
+
+PADDING_SIDES = ("left", "right", "top", "bottom")
+
+# Оценка размера элемента в JSON без детей: поля, лайаут и style_id (стили - в общем style_table)
+# Среднее по фреймам синтетических макетов; имя входит дважды (name и content.name), плюс текст
+ELEMENT_BYTES = 480
+
+def estimate_bytes(element: Mapping) -> int:
+    """
+    Примерный размер элемента в компактном JSON (без детей) - без сериализации
+    """
+    size = ELEMENT_BYTES + 2 * len(element.get("name") or "")
+    if element.get("type") == "TEXT":
+        size += len((element.get("content") or {}).get("text") or "")
+    return size
+
+class SubtreeMetrics:
+    """
+    Индекс метрик поддеревьев: для каждого элемента (по ID) - сколько в поддереве элементов,
+    его глубина, примерный размер в JSON и гистограмма типов. Строится одним обратным обходом
+    (явный стек) при первом обращении к поддереву, дальше ответы без обхода
+    Гистограмма не хранится в каждом элементе: элементы нумеруются в прямом порядке, поддерево -
+    отрезок номеров, а число элементов типа в отрезке - два бинарных поиска по номерам этого типа
+    Тем же обходом собираются дизайн-токены: каждое значение (цвет, стиль типографики, отступ,
+    скругление) - бит в таблице интернирования, у поддерева - маска (int) всех его битов, поэтому
+    токены фрейма - готовая маска, а объединение фреймов - побитовое ИЛИ. Частота стиля
+    типографики во фрейме - тоже бинарным поиском по номерам элементов с этим стилем
+    Неразобранный LazyElement - один "непрозрачный" элемент: размер и типы - из его сводки,
+    глубина, размер в байтах и токены неизвестны (None, пустая маска); после разбора поддерево
+    индексируется заново
+    """
+    
+    def __init__(self):
+        self.records = {}          # ID -> (начало, конец отрезка, элементов, глубина, байт, маска токенов)
+        self.positions = {}        # Тип -> номера элементов этого типа (по возрастанию)
+        self.opaque_positions = []  # Номера неразобранных ленивых элементов
+        self.opaque_types = []      # ... и их гистограммы типов из сводки
+        self.opaque_ids = set()
+        self.size = 0              # Сколько номеров выдано
+        
+        self.tokens = InternTable()       # (вид, ключ) -> номер бита; значение - (вид, значение)
+        self.style_tokens = {}            # style_id -> (маска, бит типографики): стили общие у многих элементов
+        self.typography_positions = {}    # Бит стиля типографики -> номера элементов с ним
+    
+    def record(self, element: Mapping) -> tuple:
+        element_id = element.get("id")
+        record = self.records.get(element_id)
+        # Ленивый элемент разобран после индексации - индексируем его поддерево
+        stale = element_id in self.opaque_ids and not (isinstance(element, LazyElement) and not element.materialized)
+        if record is None or stale:
+            record = self._index(element)
+        return record
+    
+    def total(self, element: Mapping) -> int:
+        """Элементов в поддереве вместе с самим элементом"""
+        return self.record(element)[2]
+    
+    def depth(self, element: Mapping) -> Optional[int]:
+        """Уровней в поддереве (лист - 1); None - внутри есть неразобранные ленивые элементы"""
+        return self.record(element)[3]
+    
+    def bytes(self, element: Mapping) -> Optional[int]:
+        """Примерный размер поддерева в JSON; None - внутри есть неразобранные ленивые элементы"""
+        return self.record(element)[4]
+    
+    def types(self, element: Mapping) -> Dict[str, int]:
+        """Количество элементов поддерева по типам, самые частые первыми (при равенстве - по имени)"""
+        start, end = self.record(element)[:2]
+        counts = {}
+        for node_type, positions in self.positions.items():
+            count = bisect_left(positions, end) - bisect_left(positions, start)
+            if count:
+                counts[node_type] = count
+        for i in range(bisect_left(self.opaque_positions, start), bisect_left(self.opaque_positions, end)):
+            for node_type, count in self.opaque_types[i].items():
+                counts[node_type] = counts.get(node_type, 0) + count
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+    
+    def token_mask(self, element: Mapping) -> int:
+        """Биты всех токенов поддерева"""
+        return self.record(element)[5]
+    
+    def summary(self, element: Mapping) -> Dict[str, Any]:
+        _, _, total, depth, size, _ = self.record(element)
+        return {"total_elements": total, "depth": depth, "bytes": size, "type_counts": self.types(element)}
+    
+    def _index(self, element: Mapping) -> tuple:
+        """
+        Один обратный обход поддерева: номера - при входе, метрики - при выходе из элемента
+        """
+        records = self.records
+        stack = [(element, None)]
+        while stack:
+            current, children = stack.pop()
+            if children is not None:
+                # Все дети разобраны - собираем метрики элемента
+                start, mask = records[current.get("id")]
+                total, depth, size = 1, 0, estimate_bytes(current)
+                for child in children:
+                    _, _, child_total, child_depth, child_size, child_mask = records[child.get("id")]
+                    total += child_total
+                    depth = None if depth is None or child_depth is None else max(depth, child_depth)
+                    size = None if size is None or child_size is None else size + child_size
+                    mask |= child_mask
+                records[current.get("id")] = (start, self.size, total, None if depth is None else depth + 1, size, mask)
+                continue
+            
+            position = self.size
+            self.size += 1
+            if isinstance(current, LazyElement) and not current.materialized:
+                # Без разбора: сводка из предварительного прохода анализатора
+                self.opaque_positions.append(position)
+                self.opaque_types.append(current.summary["type_counts"])
+                self.opaque_ids.add(current["id"])
+                records[current["id"]] = (position, position + 1, current.total_elements, None, None, 0)
+                continue
+            
+            self.opaque_ids.discard(current.get("id"))
+            self.positions.setdefault(current.get("type", ""), []).append(position)
+            children = current.get("children", [])  # Один раз: у NodeView список создается заново
+            mask, typography_bit = self._element_tokens(current)
+            if typography_bit is not None:
+                self.typography_positions.setdefault(typography_bit, []).append(position)
+            records[current.get("id")] = (position, mask)
+            stack.append((current, children))
+            stack.extend((child, None) for child in reversed(children))
+        return records[element.get("id")]
+    
+    def design_tokens(self, roots: Iterable[Mapping], flat: Iterable[Mapping] = ()) -> Dict[str, Any]:
+        """
+        Дизайн-токены фрейма по маскам поддеревьев roots (фрейм и мастера его компонентов)
+        flat: элементы, которые учитываются сами по себе, без поддерева (оболочка и заглушки)
+        Цвета - в порядке первого появления в макете, стили типографики - самые частые первыми
+        (при равенстве - в порядке первого появления: сначала flat, затем roots по порядку)
+        """
+        mask = 0
+        flat_typography = {}  # Бит стиля -> [количество, первое появление] среди flat
+        for i, element in enumerate(flat):
+            element_mask, typography_bit = self._element_tokens(element)
+            mask |= element_mask
+            if typography_bit is not None:
+                usage = flat_typography.setdefault(typography_bit, [0, (0, i)])
+                usage[0] += 1
+        ranges = []
+        for root in roots:
+            if isinstance(root, LazyElement):
+                root.materialize()  # Токенам нужно все поддерево
+            record = self.record(root)
+            mask |= record[5]
+            ranges.append(record[:2])
+        
+        colors, typography, spacing, radius = [], [], set(), set()
+        while mask:
+            lowest = mask & -mask  # Биты по возрастанию: младший установленный
+            mask ^= lowest
+            bit = lowest.bit_length() - 1
+            kind, value = self.tokens.values[bit]
+            if kind == "color":
+                colors.append(value)
+            elif kind == "spacing":
+                spacing.add(value)
+            elif kind == "radius":
+                radius.add(value)
+            else:
+                count, first = self._typography_usage(bit, ranges)
+                flat_count, flat_first = flat_typography.get(bit, (0, None))
+                typography.append((-(count + flat_count), flat_first or first, value))
+        typography.sort(key=lambda item: item[:2])
+        return {
+            "colors": colors,                                 # Уникальные цвета в этом фрейме
+            "typography": [style for _, _, style in typography],  # Уникальные стили шрифтов, самые частые первыми
+            "spacing": sorted(spacing),                       # Отсортированные значения отступов
+            "border_radius": sorted(radius)                   # Отсортированные значения скруглений
+        }
+    
+    def _typography_usage(self, bit: int, ranges: List[tuple]) -> tuple:
+        """
+        Сколько элементов в отрезках ranges используют стиль и где он встретился впервые
+        """
+        positions = self.typography_positions.get(bit, [])
+        count = 0
+        first = None
+        for group, (start, end) in enumerate(ranges, 1):
+            low = bisect_left(positions, start)
+            high = bisect_left(positions, end)
+            if high > low:
+                count += high - low
+                if first is None:
+                    first = (group, positions[low])
+        return count, first
+    
+    def _element_tokens(self, element: Mapping) -> tuple:
+        """
+        Маска токенов самого элемента и бит его стиля типографики (None - текста нет)
+        Стили разбираются один раз на style_id, отступы лайаута - у каждого элемента
+        """
+        style_id = element.get("style_id")
+        cached = self.style_tokens.get(style_id) if style_id is not None else None
+        if cached is None:
+            cached = self._style_tokens(element.get("styles") or {})
+            if style_id is not None:
+                self.style_tokens[style_id] = cached
+        mask, typography_bit = cached
+        
+        layout = element.get("layout") or {}
+        spacing = layout.get("spacing", 0)  # Расстояние между элементами
+        if spacing > 0:
+            mask |= 1 << self.tokens.intern(("spacing", spacing))
+        padding = layout.get("padding") or {}
+        for side in PADDING_SIDES:
+            value = padding.get(side, 0)
+            if value > 0:
+                mask |= 1 << self.tokens.intern(("spacing", value))
+        return mask, typography_bit
+    
+    def _style_tokens(self, styles: Mapping) -> tuple:
+        mask = 0
+        border = styles.get("border") or {}
+        typography = styles.get("typography") or {}
+        for color in (styles.get("background"), border.get("color"), typography.get("color")):
+            if color:
+                mask |= 1 << self.tokens.intern(("color", color))
+        
+        radius = border.get("radius", 0)
+        if radius > 0:
+            mask |= 1 << self.tokens.intern(("radius", radius))
+        
+        typography_bit = None
+        if typography and any(typography.values()):
+            # Стиль хранится один раз - по нормализованному ключу, как в TypographyRegistry
+            typography_bit = self.tokens.intern(("typography", TypographyRegistry.style_key(typography)),
+                                                ("typography", typography))
+            mask |= 1 << typography_bit
+        return mask, typography_bit
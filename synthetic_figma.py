@@ -0,0 +1,253 @@
+# synthetic_figma.py
+import argparse
+import copy
+import json
+import random
+from typing import Dict, Any, List
+
+# Типы листовых элементов (без детей), кроме TEXT и VECTOR
+SHAPE_TYPES = ["RECTANGLE", "ELLIPSE", "LINE"]
+
+class SyntheticFigmaGenerator:
+    """
+    Генератор синтетических Figma документов для бенчмарков и нагрузочных тестов
+    Структура повторяет ответ GET /v1/files/{key}: DOCUMENT -> CANVAS -> целевой FRAME
+    Все параметры (размер, глубина, ветвление, доля TEXT/VECTOR, компоненты)
+    задаются явно, а seed делает результат воспроизводимым
+    """
+    
+    def __init__(self, node_count: int = 1000, max_depth: int = 6, fan_out: int = 5,
+                 text_ratio: float = 0.3, vector_ratio: float = 0.2, instance_ratio: float = 0.1,
+                 component_count: int = 5, component_size: int = 8, seed: int = 42):
+        self.node_count = node_count            # Сколько нод в целевом фрейме (примерно)
+        self.max_depth = max_depth              # Максимальная вложенность
+        self.fan_out = fan_out                  # Максимум детей у контейнера
+        self.text_ratio = text_ratio            # Доля TEXT среди новых нод
+        self.vector_ratio = vector_ratio        # Доля VECTOR среди новых нод
+        self.instance_ratio = instance_ratio    # Доля INSTANCE (копий компонентов)
+        self.component_count = component_count  # Сколько мастер-компонентов
+        self.component_size = component_size    # Нод в одном компоненте
+        self.random = random.Random(seed)
+        self.counter = 0
+    
+    def generate(self, target_node_id: str = "1:1") -> Dict[str, Any]:
+        """
+        Строит весь документ и возвращает его в формате ответа /files/{key}
+        """
+        self.counter = 0
+        components = [self._make_component(i) for i in range(self.component_count)]
+        
+        target = self._make_frame("Synthetic Page")
+        target["id"] = target_node_id
+        target["absoluteBoundingBox"] = {"x": 0.0, "y": 0.0, "width": 1440.0, "height": 4000.0}
+        self._grow(target, components)
+        
+        return {
+            "name": "Synthetic document",
+            "lastModified": "2024-01-01T00:00:00Z",
+            "version": f"synthetic-{self.node_count}-{self.random.random():.8f}",
+            "document": {
+                "id": "0:0",
+                "name": "Document",
+                "type": "DOCUMENT",
+                "children": [
+                    {"id": "0:1", "name": "Page 1", "type": "CANVAS", "children": [target]},
+                    {"id": "0:2", "name": "Components", "type": "CANVAS", "children": components}
+                ]
+            },
+            "components": {
+                component["id"]: {"key": f"key-{component['id']}", "name": component["name"], "description": ""}
+                for component in components
+            },
+            "styles": {}
+        }
+    
+    def _grow(self, root: Dict[str, Any], components: List[Dict[str, Any]]):
+        """
+        Наращивает дерево в ширину, пока не наберется нужное количество нод
+        """
+        created = 1
+        queue = [(root, 0)]  # Контейнеры, которым еще можно добавить детей
+        position = 0
+        
+        while created < self.node_count:
+            if position >= len(queue):
+                # Все контейнеры заполнены (уперлись в глубину) - добавляем детей корню
+                queue.append((root, 0))
+            parent, depth = queue[position]
+            position += 1
+            if depth >= self.max_depth:
+                continue
+            
+            for _ in range(self.random.randint(1, self.fan_out)):
+                if created >= self.node_count:
+                    break
+                child = self._make_child(components)
+                parent.setdefault("children", []).append(child)
+                created += self._count(child)
+                if child["type"] == "FRAME":
+                    queue.append((child, depth + 1))
+    
+    def _make_child(self, components: List[Dict[str, Any]]) -> Dict[str, Any]:
+        roll = self.random.random()
+        if roll < self.text_ratio:
+            return self._make_text()
+        roll -= self.text_ratio
+        if roll < self.vector_ratio:
+            return self._make_vector()
+        roll -= self.vector_ratio
+        if roll < self.instance_ratio and components:
+            return self._make_instance(self.random.choice(components))
+        if self.random.random() < 0.5:
+            return self._make_shape()
+        return self._make_frame(f"Frame {self.counter + 1}")
+    
+    def _next_id(self) -> str:
+        self.counter += 1
+        return f"{2 + self.counter // 10000}:{self.counter}"
+    
+    def _bounding_box(self) -> Dict[str, float]:
+        return {
+            "x": float(self.random.randint(0, 1400)),
+            "y": float(self.random.randint(0, 4000)),
+            "width": float(self.random.choice([16, 24, 32, 48, 120, 240, 320])),
+            "height": float(self.random.choice([16, 24, 32, 48, 64, 120]))
+        }
+    
+    def _solid_fill(self) -> Dict[str, Any]:
+        # Небольшая палитра + иногда легкий шум (почти одинаковые цвета, как в реальных макетах)
+        base = self.random.choice([(0.1, 0.1, 0.1), (1, 1, 1), (0.2, 0.4, 0.9), (0.95, 0.3, 0.3)])
+        if self.random.random() < 0.2:
+            base = tuple(min(1.0, max(0.0, channel + self.random.uniform(-0.004, 0.004))) for channel in base)
+        return {
+            "type": "SOLID",
+            "color": {"r": base[0], "g": base[1], "b": base[2], "a": self.random.choice([1, 1, 1, 0.5])}
+        }
+    
+    def _make_frame(self, name: str) -> Dict[str, Any]:
+        layout_mode = self.random.choice(["NONE", "NONE", "HORIZONTAL", "VERTICAL"])
+        frame = {
+            "id": self._next_id(),
+            "name": name,
+            "type": "FRAME",
+            "absoluteBoundingBox": self._bounding_box(),
+            "fills": [self._solid_fill()],
+            "strokes": [],
+            "cornerRadius": self.random.choice([0, 0, 4, 8, 12, 16]),
+            "layoutMode": layout_mode,
+            "children": []
+        }
+        if layout_mode != "NONE":
+            frame["itemSpacing"] = self.random.choice([4, 8, 12, 16, 24])
+            padding = self.random.choice([0, 8, 16, 24])
+            frame.update({"paddingLeft": padding, "paddingRight": padding,
+                          "paddingTop": padding, "paddingBottom": padding})
+        return frame
+    
+    def _make_text(self) -> Dict[str, Any]:
+        return {
+            "id": self._next_id(),
+            "name": "Text",
+            "type": "TEXT",
+            "absoluteBoundingBox": self._bounding_box(),
+            "fills": [self._solid_fill()],
+            "characters": self.random.choice(["Заголовок", "Кнопка", "Описание товара", "Lorem ipsum"]),
+            "style": {
+                "fontFamily": self.random.choice(["Inter", "Inter", "Roboto"]),
+                "fontSize": self.random.choice([12, 14, 16, 16, 18, 24, 32]),
+                "fontWeight": self.random.choice([400, 400, 500, 700]),
+                "textAlignHorizontal": "LEFT"
+            }
+        }
+    
+    def _make_vector(self) -> Dict[str, Any]:
+        return {
+            "id": self._next_id(),
+            "name": "Vector",
+            "type": "VECTOR",
+            "absoluteBoundingBox": self._bounding_box(),
+            "fills": [self._solid_fill()],
+            "strokes": []
+        }
+    
+    def _make_shape(self) -> Dict[str, Any]:
+        return {
+            "id": self._next_id(),
+            "name": "Shape",
+            "type": self.random.choice(SHAPE_TYPES),
+            "absoluteBoundingBox": self._bounding_box(),
+            "fills": [self._solid_fill()],
+            "strokes": [{"type": "SOLID", "color": {"r": 0, "g": 0, "b": 0, "a": 1}, "strokeWeight": 1}],
+            "cornerRadius": self.random.choice([0, 4, 8])
+        }
+    
+    def _make_component(self, index: int) -> Dict[str, Any]:
+        """
+        Мастер-компонент: небольшое дерево (иконка, кнопка, карточка)
+        """
+        component = self._make_frame(f"Component {index + 1}")
+        component["type"] = "COMPONENT"
+        for _ in range(self.component_size - 1):
+            child = self.random.choice([self._make_text, self._make_vector, self._make_shape])()
+            component["children"].append(child)
+        return component
+    
+    def _make_instance(self, component: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Экземпляр компонента: копия структуры мастера с ID вида I<instance>;<master child>
+        """
+        instance = copy.deepcopy(component)
+        instance_id = self._next_id()
+        instance["id"] = instance_id
+        instance["type"] = "INSTANCE"
+        instance["componentId"] = component["id"]
+        instance["absoluteBoundingBox"] = self._bounding_box()
+        
+        # Дети экземпляра сдвигаются вместе с ним (координаты в Figma абсолютные)
+        master_box = component["absoluteBoundingBox"]
+        dx = instance["absoluteBoundingBox"]["x"] - master_box["x"]
+        dy = instance["absoluteBoundingBox"]["y"] - master_box["y"]
+        
+        stack = list(instance.get("children", []))
+        while stack:
+            node = stack.pop()
+            node["id"] = f"I{instance_id};{node['id']}"
+            node["absoluteBoundingBox"] = dict(node["absoluteBoundingBox"], x=node["absoluteBoundingBox"]["x"] + dx,
+                                               y=node["absoluteBoundingBox"]["y"] + dy)
+            stack.extend(node.get("children", []))
+        return instance
+    
+    def _count(self, node: Dict[str, Any]) -> int:
+        count = 0
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            count += 1
+            stack.extend(current.get("children", []))
+        return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических Figma документов")
+    parser.add_argument("--nodes", type=int, default=1000, help="Количество нод")
+    parser.add_argument("--depth", type=int, default=6, help="Максимальная глубина")
+    parser.add_argument("--fan-out", type=int, default=5, help="Максимум детей у контейнера")
+    parser.add_argument("--text-ratio", type=float, default=0.3, help="Доля TEXT нод")
+    parser.add_argument("--vector-ratio", type=float, default=0.2, help="Доля VECTOR нод")
+    parser.add_argument("--instance-ratio", type=float, default=0.1, help="Доля INSTANCE нод")
+    parser.add_argument("--components", type=int, default=5, help="Количество компонентов")
+    parser.add_argument("--seed", type=int, default=42, help="Seed для воспроизводимости")
+    parser.add_argument("--out", default="synthetic_file.json", help="Куда сохранить документ")
+    args = parser.parse_args()
+    
+    generator = SyntheticFigmaGenerator(
+        node_count=args.nodes, max_depth=args.depth, fan_out=args.fan_out,
+        text_ratio=args.text_ratio, vector_ratio=args.vector_ratio,
+        instance_ratio=args.instance_ratio, component_count=args.components, seed=args.seed
+    )
+    document = generator.generate()
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False)
+    print(f"✅ Синтетический документ ({args.nodes} нод) сохранен: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# token_clustering.py
+import bisect
+import math
+import re
+from typing import Dict, Any, Iterable, List, Tuple
+
+# NumPy - векторная кластеризация цветов и привязка отступов к сетке
+# Без библиотеки цвета не объединяются (каждое значение - свой токен), отступы привязываются в цикле
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Вес прозрачности в расстоянии между цветами: разница альфы 0.01 ~ 1 единица ΔE
+ALPHA_WEIGHT = 100.0
+
+RGBA_PATTERN = re.compile(r"rgba?\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*(?:,\s*([\d.]+)\s*)?\)")
+
+def parse_css_color(value: str) -> Tuple[float, float, float, float]:
+    """
+    #RRGGBB или rgba(r, g, b, a) (формат DeepFigmaAnalyzer._extract_color) -> (r, g, b, a)
+    None - строка не похожа на цвет
+    """
+    if value.startswith("#") and len(value) == 7:
+        try:
+            return int(value[1:3], 16), int(value[3:5], 16), int(value[5:7], 16), 1.0
+        except ValueError:
+            return None
+    match = RGBA_PATTERN.fullmatch(value.strip())
+    if match:
+        r, g, b, a = match.groups()
+        return int(r), int(g), int(b), float(a) if a is not None else 1.0
+    return None
+
+def _parse_colors(colors: List[str]):
+    """
+    Массив (n, 4) RGBA для отсортированного списка CSS-цветов: hex-цвета разбираются
+    одним вызовом bytes.fromhex, остальное (rgba) - по одному
+    Второй результат - маска разобранных (остальное - не цвета, например градиенты)
+    """
+    rgba = np.zeros((len(colors), 4), dtype=np.float64)
+    parsed = np.zeros(len(colors), dtype=bool)
+    
+    # Список отсортирован, а "#" меньше любых букв - hex-цвета идут первыми
+    hex_count = bisect.bisect_left(colors, "$")
+    hex_text = "".join(colors[:hex_count]).replace("#", "")
+    if len(hex_text) == 6 * hex_count:
+        try:
+            rgba[:hex_count, :3] = np.frombuffer(bytes.fromhex(hex_text), dtype=np.uint8).reshape(-1, 3)
+            rgba[:hex_count, 3] = 1.0
+            parsed[:hex_count] = True
+        except ValueError:
+            pass  # Битый hex - разбираем все по одному ниже
+    
+    rows, values = [], []
+    for row in np.flatnonzero(~parsed).tolist():
+        value = parse_css_color(colors[row])
+        if value is not None:
+            rows.append(row)
+            values.append(value)
+    if rows:
+        rgba[rows] = values
+        parsed[rows] = True
+    return rgba, parsed
+
+def srgb_to_lab(rgb):
+    """
+    sRGB (0-255, массив (n, 3)) -> CIE Lab (D65): расстояние в Lab близко к
+    воспринимаемой разнице цветов (ΔE 2-3 - порог заметности)
+    """
+    linear = rgb / 255.0
+    linear = np.where(linear > 0.04045, ((linear + 0.055) / 1.055) ** 2.4, linear / 12.92)
+    xyz = linear @ np.array([[0.4124564, 0.2126729, 0.0193339],
+                             [0.3575761, 0.7151522, 0.1191920],
+                             [0.1804375, 0.0721750, 0.9503041]])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+def cluster_colors(colors: Iterable[str], max_distance: float) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Объединяет близкие цвета: расстояние - ΔE в Lab плюс разница прозрачности
+    1. Цвета раскладываются по мелкой сетке (ячейка - половина порога), дальше работаем с ячейками
+    2. Жадная кластеризация ячеек: самая населенная ячейка забирает все ячейки ближе порога
+    3. Представитель кластера - реальный цвет макета, ближайший к центру кластера
+    Возвращает (представители от самого большого кластера к меньшему, сырой цвет -> представитель)
+    """
+    raw = sorted(set(colors))
+    if np is None or max_distance <= 0 or len(raw) < 2:
+        return raw, {color: color for color in raw}
+    
+    rgba, parsed = _parse_colors(raw)
+    points = np.column_stack([srgb_to_lab(rgba[:, :3]), rgba[:, 3] * ALPHA_WEIGHT])
+    
+    # Мелкая сетка: одинаковые и почти одинаковые цвета схлопываются в одну ячейку
+    # (координаты ячейки упакованы в одно int64 - unique по одномерному массиву быстрее)
+    grid = np.floor(points / (max_distance / 2)).astype(np.int64)
+    grid -= grid.min(axis=0)
+    span = grid.max(axis=0) + 1
+    packed = ((grid[:, 0] * span[1] + grid[:, 1]) * span[2] + grid[:, 2]) * span[3] + grid[:, 3]
+    _, cell_of, cell_sizes = np.unique(packed, return_inverse=True, return_counts=True)
+    cell_of = cell_of.reshape(-1)
+    centers = np.column_stack([np.bincount(cell_of, weights=points[:, axis]) for axis in range(4)])
+    centers /= cell_sizes[:, None]
+    
+    # Жадная кластеризация ячеек; кандидаты - окно по светлоте L (ячейки отсортированы по ней)
+    cell_count = len(cell_sizes)
+    by_lightness = np.argsort(centers[:, 0], kind="stable")
+    lightness = centers[by_lightness, 0]
+    limit = max_distance * max_distance
+    cluster_of_cell = np.full(cell_count, -1)
+    for leader in np.lexsort((np.arange(cell_count), -cell_sizes)).tolist():
+        if cluster_of_cell[leader] >= 0:
+            continue
+        center = centers[leader]
+        low, high = np.searchsorted(lightness, (center[0] - max_distance, center[0] + max_distance))
+        window = by_lightness[low:high]
+        window = window[cluster_of_cell[window] < 0]
+        difference = centers[window] - center
+        cluster_of_cell[window[np.einsum("ij,ij->i", difference, difference) <= limit]] = leader
+        cluster_of_cell[leader] = leader
+    
+    # Неразобранные строки (не цвета) - каждая свой кластер
+    cluster = np.where(parsed, cluster_of_cell[cell_of], cell_count + np.arange(len(raw)))
+    _, cluster, sizes = np.unique(cluster, return_inverse=True, return_counts=True)
+    cluster = cluster.reshape(-1)
+    
+    # Представитель - цвет, ближайший к среднему своего кластера
+    means = np.column_stack([np.bincount(cluster, weights=points[:, axis]) for axis in range(4)])
+    means /= sizes[:, None]
+    difference = points - means[cluster]
+    order = np.lexsort((np.einsum("ij,ij->i", difference, difference), cluster))
+    first = np.searchsorted(cluster[order], np.arange(len(sizes)))
+    representatives = np.array(raw, dtype=object)[order[first]]
+    
+    mapping = dict(zip(raw, representatives[cluster].tolist()))
+    ranked = np.lexsort((np.arange(len(sizes)), -sizes))  # По размеру кластера, затем по цвету
+    return representatives[ranked].tolist(), mapping
+
+def snap_values(values: Iterable[float], base: float) -> Tuple[List[float], Dict[float, float]]:
+    """
+    Привязка отступов/скруглений к сетке: значения от base и выше - к ближайшему кратному base,
+    меньшие - к целому пикселю (не меньше 1px), поэтому 15.999 и 16 дают один токен
+    Возвращает (уникальные привязанные значения по возрастанию, сырое значение -> привязанное)
+    """
+    raw = sorted(set(values))
+    if not raw:
+        return [], {}
+    
+    if np is not None:
+        array = np.asarray(raw, dtype=np.float64)
+        # floor(x + 0.5), а не round: round округляет половины к четному (20 при шаге 8 дал бы 16)
+        snapped = np.where(array >= base, np.floor(array / base + 0.5) * base, np.maximum(np.floor(array + 0.5), 1.0))
+        snapped = snapped.tolist()
+    else:
+        snapped = [math.floor(value / base + 0.5) * base if value >= base else max(math.floor(value + 0.5), 1)
+                   for value in raw]
+    
+    snapped = [int(value) if float(value).is_integer() else value for value in snapped]
+    mapping = dict(zip(raw, snapped))
+    return sorted(set(snapped)), mapping
+
+def token_map(mapping: Dict[Any, Any], names: Dict[Any, str]) -> Dict[str, str]:
+    """
+    Сырое значение -> имя токена (ключи строками, как они попадут в JSON)
+    """
+    return {str(raw): names[value] for raw, value in mapping.items()}